@@ -22,6 +22,30 @@ TINKOFF_REAL_TOKEN = os.getenv("TINKOFF_REAL_TOKEN")
 # Выбор токена в зависимости от режима
 TINKOFF_TOKEN = TINKOFF_SANDBOX_TOKEN if USE_SANDBOX else TINKOFF_REAL_TOKEN
 
+# Количество долгоживущих gRPC-каналов на один токен
+TINKOFF_CHANNEL_POOL_SIZE = int(os.getenv("TINKOFF_CHANNEL_POOL_SIZE", 1))
+
+# Каталог memory-mapped файлов свечей для бэктестов
+CANDLE_DATA_DIR = os.getenv("CANDLE_DATA_DIR", "./data/candles")
+
+# Оптимизатор параметров стратегий: число процессов (0 — по числу ядер) и бюджет времени
+OPTIMIZER_WORKERS = int(os.getenv("OPTIMIZER_WORKERS", 0))
+OPTIMIZER_BUDGET_SECONDS = float(os.getenv("OPTIMIZER_BUDGET_SECONDS", 60))
+
+# Очередь бэктестов: процессы-исполнители, задач на пользователя, длина очереди
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", 2))
+BACKTEST_USER_JOBS = int(os.getenv("BACKTEST_USER_JOBS", 2))
+BACKTEST_QUEUE_SIZE = int(os.getenv("BACKTEST_QUEUE_SIZE", 100))
+# Как часто писать в лог статистику очереди бэктестов (0 — только при остановке)
+BACKTEST_STATS_LOG_SECONDS = float(os.getenv("BACKTEST_STATS_LOG_SECONDS", 600))
+
+# Живые сигналы стратегий (/watch): инструментов на пользователя
+LIVE_SIGNALS_PER_USER = int(os.getenv("LIVE_SIGNALS_PER_USER", 5))
+
+# Отрисовка графиков: процессы-рендереры и число PNG в кэше
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 1))
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", 256))
+
 # Webhook settings
 WEBHOOK_URL = os.getenv("WEBHOOK_URL", "https://your-domain.com")
 WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
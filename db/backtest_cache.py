@@ -0,0 +1,174 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from db.models import BacktestResult
+from db.session import async_session
+from strategies.base import ENGINE_VERSION
+from utils.logger import logger
+
+# Сколько результатов держать в памяти процесса
+BACKTEST_CACHE_SIZE = 128
+# Кривая капитала сохраняется прореженной: для графика больше точек не нужно
+EQUITY_POINTS = 2000
+
+
+def strategy_params(strategy) -> dict:
+    return {name: value for name, value in sorted(vars(strategy).items()) if not name.startswith("_")}
+
+
+def dataset_identity(df: pd.DataFrame) -> tuple[str, str]:
+    """
+    (dataset_id, версия) набора свечей. load_history кладёт их в df.attrs
+    по метаданным хранилища; для прочих данных версия — хеш цен закрытия.
+    """
+    if "dataset_id" in df.attrs:
+        return df.attrs["dataset_id"], str(df.attrs["dataset_version"])
+    close = np.ascontiguousarray(df["close"].to_numpy(dtype=np.float64))
+    digest = hashlib.sha256(close.tobytes()).hexdigest()[:16]
+    return f"frame:{digest}", digest
+
+
+def cache_key(strategy, dataset_id: str, dataset_version: str) -> str:
+    """Адрес результата: одинаковый прогон на тех же данных даёт тот же ключ"""
+    payload = {
+        "strategy": f"{type(strategy).__module__}.{type(strategy).__qualname__}",
+        "params": strategy_params(strategy),
+        "dataset": [dataset_id, dataset_version],
+        "engine": ENGINE_VERSION,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def thin_equity(equity: pd.Series, points: int = EQUITY_POINTS) -> list[float]:
+    values = equity.to_numpy(dtype=np.float64)
+    if len(values) > points:
+        values = values[np.linspace(0, len(values) - 1, points).astype(np.int64)]
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def summarize(strategy, results: dict) -> dict:
+    """Что сохраняется о прогоне: параметры, метрики и прореженная кривая капитала"""
+    equity = results["equity_curve"]
+    return {
+        "params": strategy_params(strategy),
+        "returns": float(results["returns"]),
+        "total_return": float(equity.iloc[-1] - 1) if len(equity) else 0.0,
+        "bars": len(equity),
+        "equity": thin_equity(equity),
+    }
+
+
+class BacktestCache:
+    """
+    Двухуровневый кэш результатов бэктеста: LRU в памяти процесса и строки
+    backtest_results в БД (метрики, прореженная кривая капитала, PNG).
+
+    Ключ включает версию набора данных, поэтому после дозагрузки свечей
+    старые результаты не находятся; при первой записи новой версии они
+    удаляются из обоих уровней.
+    """
+    _instance = None
+    _entries: OrderedDict = OrderedDict()
+    _stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "invalidated": 0}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def stats(self) -> dict:
+        return {**self._stats, "entries": len(self._entries)}
+
+    async def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return entry
+
+        async with async_session() as session:
+            result = await session.execute(select(BacktestResult).where(BacktestResult.cache_key == key))
+            row = result.scalar_one_or_none()
+        if row is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["db_hits"] += 1
+        entry = {
+            **json.loads(row.result_json),
+            "chart": row.chart,
+            "dataset_id": row.dataset_id,
+            "dataset_version": row.dataset_version,
+        }
+        self._remember(key, entry)
+        return entry
+
+    async def put(
+        self,
+        key: str,
+        user_id: int,
+        strategy,
+        dataset_id: str,
+        dataset_version: str,
+        payload: dict,
+        chart: bytes
+    ) -> dict:
+        """
+        payload — результат summarize(). Запись best-effort: одинаковые прогоны,
+        досчитавшиеся одновременно, пишут один ключ (вторая вставка
+        пропускается), а ошибка БД только логируется — кэш не должен мешать
+        отдать результат.
+        """
+        try:
+            await self.invalidate(dataset_id, keep_version=dataset_version)
+            async with async_session() as session:
+                await session.execute(
+                    insert(BacktestResult).values(
+                        user_id=user_id,
+                        strategy=str(strategy),
+                        result_json=json.dumps(payload),
+                        cache_key=key,
+                        dataset_id=dataset_id,
+                        dataset_version=dataset_version,
+                        chart=chart
+                    ).on_conflict_do_nothing(index_elements=["cache_key"])
+                )
+                await session.commit()
+        except SQLAlchemyError as e:
+            logger.error(f"Backtest cache: failed to store {key[:12]}: {e}")
+        entry = {**payload, "chart": chart, "dataset_id": dataset_id, "dataset_version": dataset_version}
+        self._remember(key, entry)
+        return entry
+
+    async def invalidate(self, dataset_id: str, keep_version: str | None = None) -> int:
+        """Удаляет результаты по набору данных, кроме версии keep_version"""
+        stale = [
+            key for key, entry in self._entries.items()
+            if entry["dataset_id"] == dataset_id and entry.get("dataset_version") != keep_version
+        ]
+        for key in stale:
+            del self._entries[key]
+
+        stmt = delete(BacktestResult).where(BacktestResult.dataset_id == dataset_id)
+        if keep_version is not None:
+            stmt = stmt.where(BacktestResult.dataset_version != keep_version)
+        async with async_session() as session:
+            result = await session.execute(stmt)
+            await session.commit()
+        removed = result.rowcount or 0
+        if removed:
+            self._stats["invalidated"] += removed
+            logger.info(f"Backtest cache: dropped {removed} stale result(s) for {dataset_id}")
+        return removed
+
+    def _remember(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > BACKTEST_CACHE_SIZE:
+            self._entries.popitem(last=False)
@@ -0,0 +1,170 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from config import CANDLE_DATA_DIR
+from tinkoff_api.candle_codec import CandleArrays
+
+# Колонки и их типы на диске (little-endian, без заголовков)
+COLUMNS = {
+    "time": np.dtype("<i8"),
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+    "volume": np.dtype("<i8"),
+}
+# Шаг разреженного индекса: время каждой BLOCK_ROWS-й свечи
+BLOCK_ROWS = 4096
+META_FILE = "meta.json"
+INDEX_FILE = "index.i8"
+FORMAT_VERSION = 1
+
+
+class CandleFileStore:
+    """
+    Локальное колоночное хранилище свечей на memory-mapped файлах.
+
+    Для каждой пары (figi, interval) — каталог с отдельным файлом на колонку
+    и разреженным индексом по времени. Чтение возвращает np.memmap-срезы:
+    в память попадают только страницы запрошенного диапазона. Новые свечи
+    дописываются в конец файлов; число строк фиксируется в meta.json последним
+    шагом, поэтому оборванная запись не портит уже сохранённые данные.
+    """
+
+    def __init__(self, root: str = CANDLE_DATA_DIR):
+        self.root = root
+
+    def _path(self, figi: str, interval) -> str:
+        return os.path.join(self.root, figi, str(int(interval)))
+
+    def info(self, figi: str, interval) -> dict | None:
+        """Метаданные ряда: count и внешние границы covered_from/covered_to"""
+        try:
+            with open(os.path.join(self._path(figi, interval), META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def read(self, figi: str, interval, start: int | None = None, stop: int | None = None) -> CandleArrays:
+        """Свечи за [start, stop) в unix-секундах — без копирования данных"""
+        path = self._path(figi, interval)
+        meta = self.info(figi, interval)
+        if not meta or not meta["count"]:
+            return CandleArrays.empty()
+
+        count = meta["count"]
+        columns = {
+            name: np.memmap(os.path.join(path, name), dtype=dtype, mode="r", shape=(count,))
+            for name, dtype in COLUMNS.items()
+        }
+        index = np.fromfile(os.path.join(path, INDEX_FILE), dtype="<i8", count=-(-count // BLOCK_ROWS))
+        lo = 0 if start is None else self._locate(columns["time"], index, start)
+        hi = count if stop is None else self._locate(columns["time"], index, stop)
+        return CandleArrays(*(columns[name][lo:hi] for name in COLUMNS))
+
+    @staticmethod
+    def _locate(times: np.ndarray, index: np.ndarray, ts: int) -> int:
+        """Позиция первой свечи с time >= ts: сначала по индексу, затем внутри блока"""
+        block = max(int(np.searchsorted(index, ts, side="left")) - 1, 0)
+        lo = block * BLOCK_ROWS
+        hi = min(lo + 2 * BLOCK_ROWS, len(times))
+        return lo + int(np.searchsorted(times[lo:hi], ts, side="left"))
+
+    def append(self, figi: str, interval, arrays: CandleArrays, covered_to: int | None = None) -> int:
+        """
+        Дописывает свечи после последней сохранённой. Более ранние строки
+        пропускаются. Возвращает число записанных свечей.
+        """
+        path = self._path(figi, interval)
+        meta = self.info(figi, interval)
+        if meta is None:
+            os.makedirs(path, exist_ok=True)
+            first = int(arrays.time[0]) if len(arrays) else covered_to
+            meta = {"version": FORMAT_VERSION, "count": 0, "covered_from": first, "covered_to": first}
+        elif meta["count"]:
+            last = int(np.memmap(os.path.join(path, "time"), dtype="<i8", mode="r", shape=(meta["count"],))[-1])
+            arrays = arrays.slice(last + 1)
+
+        count = meta["count"]
+        if len(arrays):
+            for name, dtype in COLUMNS.items():
+                self._write_tail(os.path.join(path, name), count * dtype.itemsize, getattr(arrays, name), dtype)
+            # Индекс дописывается для блоков, начавшихся в новой части
+            new_blocks = np.arange(-(-count // BLOCK_ROWS) * BLOCK_ROWS, count + len(arrays), BLOCK_ROWS)
+            index_offset = (-(-count // BLOCK_ROWS)) * 8
+            self._write_tail(
+                os.path.join(path, INDEX_FILE), index_offset, arrays.time[new_blocks - count], np.dtype("<i8")
+            )
+            meta["covered_to"] = int(arrays.time[-1])
+
+        meta["count"] = count + len(arrays)
+        if covered_to is not None:
+            meta["covered_to"] = max(meta["covered_to"], covered_to)
+        self._write_meta(path, meta)
+        return len(arrays)
+
+    def replace(self, figi: str, interval, arrays: CandleArrays, covered_from: int, covered_to: int):
+        """Полностью переписывает ряд (редкий путь: данные старше сохранённых)"""
+        path = self._path(figi, interval)
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, dtype in COLUMNS.items():
+            np.ascontiguousarray(getattr(arrays, name), dtype=dtype).tofile(os.path.join(tmp, name))
+        np.ascontiguousarray(arrays.time[::BLOCK_ROWS], dtype="<i8").tofile(os.path.join(tmp, INDEX_FILE))
+        self._write_meta(tmp, {
+            "version": FORMAT_VERSION,
+            "count": len(arrays),
+            "covered_from": covered_from,
+            "covered_to": covered_to,
+        })
+        # Каталог подменяется целиком: уже открытые memmap старых файлов
+        # остаются валидными, а читатель не увидит колонки от разных версий
+        old = path + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old)
+        os.rename(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def write(self, figi: str, interval, arrays: CandleArrays, covered_from: int, covered_to: int) -> int:
+        """
+        Записывает закрытые свечи за [covered_from, covered_to). Диапазон после
+        сохранённого дописывается в конец, более ранний — вливается с перезаписью.
+        """
+        meta = self.info(figi, interval)
+        if meta is None or not meta["count"]:
+            self.replace(figi, interval, arrays, covered_from, covered_to)
+            return len(arrays)
+        if covered_from >= meta["covered_to"]:
+            return self.append(figi, interval, arrays, covered_to)
+
+        stored = self.read(figi, interval)
+        merged = stored.slice(0, covered_from).concat(arrays).concat(stored.slice(covered_to))
+        self.replace(
+            figi, interval, merged,
+            min(meta["covered_from"], covered_from),
+            max(meta["covered_to"], covered_to)
+        )
+        return len(arrays)
+
+    @staticmethod
+    def _write_tail(filename: str, offset: int, values: np.ndarray, dtype: np.dtype):
+        with open(filename, "ab") as f:
+            # Отбрасываем хвост оборванной записи, если он есть
+            f.truncate(offset)
+        with open(filename, "r+b") as f:
+            f.seek(offset)
+            f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _write_meta(path: str, meta: dict):
+        tmp = os.path.join(path, META_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, META_FILE))
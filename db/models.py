@@ -1,6 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import String, Integer, Float, DateTime, Boolean, ForeignKey, Index, UniqueConstraint, LargeBinary
 import datetime
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -22,6 +22,8 @@ class OrderHistory(Base):
     price: Mapped[float] = mapped_column(Float)
     status: Mapped[str] = mapped_column(String)
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow)
+    # Ключ идемпотентности заявки: повторная отправка обновляет ту же строку
+    client_order_id: Mapped[str] = mapped_column(String, nullable=True, unique=True, index=True)
 
 class Order(Base):
     __tablename__ = "orders"
@@ -34,6 +36,72 @@ class Order(Base):
     status: Mapped[str] = mapped_column(String, default="NEW")  # NEW / FILLED / CANCELLED
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow)
 
+class BrokerOrder(Base):
+    """Заявка на стороне брокера и её последнее известное состояние"""
+    __tablename__ = "broker_orders"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    account_id: Mapped[str] = mapped_column(String, index=True)
+    broker_order_id: Mapped[str] = mapped_column(String, unique=True, nullable=True)
+    client_order_id: Mapped[str] = mapped_column(String, unique=True, nullable=True)  # ключ идемпотентности
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), nullable=True)  # локальный Order
+    user_id: Mapped[int] = mapped_column(Integer, nullable=True)  # Telegram ID для уведомлений
+    figi: Mapped[str] = mapped_column(String)
+    direction: Mapped[str] = mapped_column(String)  # BUY / SELL
+    lots_requested: Mapped[int] = mapped_column(Integer)
+    lots_executed: Mapped[int] = mapped_column(Integer, default=0)
+    price: Mapped[float] = mapped_column(Float, nullable=True)
+    status: Mapped[str] = mapped_column(String, default="NEW")  # NEW / PARTIALLYFILL / FILL / CANCELLED / REJECTED
+    last_trade_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class BrokerTrade(Base):
+    """Учтённая сделка по заявке: повтор стрима после переподключения не считается дважды"""
+    __tablename__ = "broker_trades"
+    __table_args__ = (UniqueConstraint("broker_order_id", "trade_key"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    broker_order_id: Mapped[str] = mapped_column(String, index=True)
+    trade_key: Mapped[str] = mapped_column(String)  # trade_id или время:количество:цена
+    date_time: Mapped[datetime.datetime] = mapped_column(DateTime)
+    quantity: Mapped[int] = mapped_column(Integer)
+    price: Mapped[float] = mapped_column(Float, nullable=True)
+
+class Operation(Base):
+    """Операция брокера по счёту (сделка, комиссия, купон, пополнение...)"""
+    __tablename__ = "operations"
+    __table_args__ = (
+        Index("ix_operations_account_date", "account_id", "date"),
+        Index("ix_operations_account_figi_date", "account_id", "figi", "date"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    account_id: Mapped[str] = mapped_column(String)
+    operation_id: Mapped[str] = mapped_column(String, unique=True)
+    parent_operation_id: Mapped[str] = mapped_column(String, nullable=True)
+    type: Mapped[str] = mapped_column(String)  # OperationType.name
+    state: Mapped[str] = mapped_column(String)  # OperationState.name
+    figi: Mapped[str] = mapped_column(String, nullable=True)
+    instrument_type: Mapped[str] = mapped_column(String, nullable=True)
+    currency: Mapped[str] = mapped_column(String, nullable=True)
+    payment: Mapped[float] = mapped_column(Float, default=0.0)
+    price: Mapped[float] = mapped_column(Float, nullable=True)
+    commission: Mapped[float] = mapped_column(Float, default=0.0)
+    quantity: Mapped[int] = mapped_column(Integer, default=0)
+    quantity_done: Mapped[int] = mapped_column(Integer, default=0)
+    description: Mapped[str] = mapped_column(String, nullable=True)
+    date: Mapped[datetime.datetime] = mapped_column(DateTime)
+
+class SyncCursor(Base):
+    """Докуда синхронизирован поток данных счёта (операции и т.п.)"""
+    __tablename__ = "sync_cursors"
+    __table_args__ = (UniqueConstraint("account_id", "kind"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    account_id: Mapped[str] = mapped_column(String)
+    kind: Mapped[str] = mapped_column(String)
+    cursor: Mapped[str] = mapped_column(String, nullable=True)  # страница незавершённого прохода
+    window_end: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True)  # его правая граница
+    synced_until: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow)
+
 class BacktestResult(Base):
     __tablename__ = "backtest_results"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -41,6 +109,11 @@ class BacktestResult(Base):
     strategy: Mapped[str] = mapped_column(String)
     result_json: Mapped[str] = mapped_column(String)
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow)
+    # Кэш результатов: хеш (стратегия, параметры, данные и их версия, версия движка)
+    cache_key: Mapped[str] = mapped_column(String, nullable=True, unique=True, index=True)
+    dataset_id: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    dataset_version: Mapped[str] = mapped_column(String, nullable=True)
+    chart: Mapped[bytes] = mapped_column(LargeBinary, nullable=True)  # PNG графика
 
 class ActionLog(Base):
     __tablename__ = "action_logs"
@@ -0,0 +1,95 @@
+import datetime
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from db.models import Operation
+from db.session import async_session
+
+# Типы операций-сделок (OperationType.name)
+BUY_TYPES = (
+    "OPERATION_TYPE_BUY",
+    "OPERATION_TYPE_BUY_CARD",
+    "OPERATION_TYPE_BUY_MARGIN",
+    "OPERATION_TYPE_DELIVERY_BUY",
+)
+SELL_TYPES = (
+    "OPERATION_TYPE_SELL",
+    "OPERATION_TYPE_SELL_CARD",
+    "OPERATION_TYPE_SELL_MARGIN",
+    "OPERATION_TYPE_DELIVERY_SELL",
+)
+TRADE_TYPES = BUY_TYPES + SELL_TYPES
+FEE_TYPES = ("OPERATION_TYPE_BROKER_FEE", "OPERATION_TYPE_SERVICE_FEE")
+EXECUTED = "OPERATION_STATE_EXECUTED"
+
+
+async def trade_history(
+    account_id: str,
+    figi: str | None = None,
+    days: int | None = None,
+    limit: int | None = 20
+) -> list[Operation]:
+    """Исполненные сделки по счёту, новые первыми"""
+    stmt = select(Operation).where(
+        Operation.account_id == account_id,
+        Operation.type.in_(TRADE_TYPES),
+        Operation.state == EXECUTED
+    )
+    if figi is not None:
+        stmt = stmt.where(Operation.figi == figi)
+    if days is not None:
+        stmt = stmt.where(Operation.date >= datetime.datetime.utcnow() - datetime.timedelta(days=days))
+    stmt = stmt.order_by(Operation.date.desc()).limit(limit)
+    async with async_session() as session:
+        result = await session.execute(stmt)
+        return result.scalars().all()
+
+
+async def account_pnl(account_id: str) -> dict[str, float]:
+    """Реализованный результат по инструментам за всю синхронизированную историю"""
+    stmt = select(Operation).where(
+        Operation.account_id == account_id,
+        Operation.type.in_(TRADE_TYPES + FEE_TYPES),
+        Operation.state == EXECUTED,
+        Operation.figi.is_not(None)
+    ).order_by(Operation.date)
+    async with async_session() as session:
+        result = await session.execute(stmt)
+        return realized_pnl(result.scalars().all())
+
+
+def realized_pnl(operations) -> dict[str, float]:
+    """
+    Реализованный P&L по средней цене позиции.
+
+    Покупки увеличивают позицию и её стоимость, продажи фиксируют разницу
+    между выручкой и средней ценой проданного. Комиссии берутся из отдельных
+    операций BROKER_FEE, поле commission сделки не учитывается, чтобы не
+    списать их дважды.
+    Операции должны идти по возрастанию даты.
+    """
+    quantity = defaultdict(int)
+    cost = defaultdict(float)
+    pnl = {}
+
+    for op in operations:
+        pnl.setdefault(op.figi, 0.0)
+        if op.type in FEE_TYPES:
+            pnl[op.figi] += op.payment
+            continue
+        qty = op.quantity_done or op.quantity
+        if not qty:
+            continue
+        if op.type in BUY_TYPES:
+            quantity[op.figi] += qty
+            cost[op.figi] += -op.payment
+        else:
+            held = quantity[op.figi]
+            closed = min(qty, held)
+            if closed:
+                average = cost[op.figi] / held
+                pnl[op.figi] += op.payment * closed / qty - average * closed
+                quantity[op.figi] -= closed
+                cost[op.figi] -= average * closed
+    return pnl
@@ -1,4 +1,5 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import sessionmaker
 from config import DB_URL
 from db.models import Base
@@ -12,9 +13,27 @@ async_session = sessionmaker(
 
 _redis = None
 
+def add_missing_columns(connection):
+    """
+    create_all не меняет существующие таблицы: добавляем новые (nullable)
+    колонки моделей и их индексы в уже созданную базу.
+    """
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
 
 async def get_db_session():
     async with async_session() as session:
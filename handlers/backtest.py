@@ -1,35 +1,37 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from strategies.ma import MovingAverageStrategy
-from strategies.rsi import RSIStrategy
-from strategies.bollinger import BollingerBandsStrategy
+from strategies.registry import make_strategy
 from utils.mocks import generate_mock_candles
+from db.backtest_cache import BacktestCache, cache_key, dataset_identity, strategy_params
+from db.candle_files import CandleFileStore
+from tinkoff_api.historical import INTERVAL_MAPPING
+from tinkoff_api.instruments import InstrumentCache
 from utils.rate_limit import rate_limit
 from utils.logger import log_action
-import asyncio
-import matplotlib
-import matplotlib.pyplot as plt
-import io
-from concurrent.futures import ThreadPoolExecutor
+from utils.backtest_jobs import BacktestJob, enqueue
+import pandas as pd
 
-# Используем неинтерактивный бэкенд
-matplotlib.use('Agg')
-
-def plot_equity_curve(results):
-    """Синхронная функция построения графика"""
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.plot(results['equity_curve'], label='Equity')
-    ax.set_title('Backtest Results')
-    ax.set_xlabel('Period')
-    ax.set_ylabel('Value')
-    ax.legend()
-    ax.grid(True)
-    
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=100)
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+async def load_history(ticker: str, interval_key: str) -> pd.DataFrame | None:
+    """История из локального хранилища свечей (наполняется scripts/backfill.py)"""
+    figi = await InstrumentCache().get_figi(ticker)
+    if not figi or interval_key not in INTERVAL_MAPPING:
+        return None
+    store = CandleFileStore()
+    meta = store.info(figi, INTERVAL_MAPPING[interval_key])
+    arrays = store.read(figi, INTERVAL_MAPPING[interval_key])
+    if not meta or not len(arrays):
+        return None
+    # Колонки — memmap-срезы файлов, целиком в память не читаются
+    df = pd.DataFrame(
+        {name: getattr(arrays, name) for name in ("open", "high", "low", "close", "volume")},
+        copy=False
+    )
+    # Версия набора меняется при каждой дозагрузке свечей — по ней сбрасывается кэш бэктестов
+    df.attrs["dataset_id"] = f"{figi}:{interval_key}"
+    df.attrs["dataset_version"] = f"{len(arrays)}:{meta['covered_to']}"
+    # Воркер очереди бэктестов читает файлы сам, а не получает кадр через pickle
+    df.attrs["source"] = ("store", figi, int(INTERVAL_MAPPING[interval_key]))
+    return df
 
 @rate_limit()
 async def backtest(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -40,32 +42,45 @@ async def backtest(update: Update, context: ContextTypes.DEFAULT_TYPE):
     params = context.user_data.get("strategy_params", {})
     
     # Выбираем стратегию
-    if strategy_key == "MA":
-        strategy = MovingAverageStrategy(**params)
-    elif strategy_key == "RSI":
-        strategy = RSIStrategy(**params)
-    elif strategy_key == "Bollinger":
-        strategy = BollingerBandsStrategy(**params)
-    else:
-        strategy = MovingAverageStrategy()
-    
-    # Генерируем тестовые данные
-    df = generate_mock_candles(200)
-    
-    # Запускаем бэктест
-    results = strategy.backtest(df)
+    strategy = make_strategy(strategy_key, params)
     
-    # Асинхронное построение графика
-    loop = asyncio.get_running_loop()
-    with ThreadPoolExecutor() as pool:
-        buf = await loop.run_in_executor(pool, plot_equity_curve, results)
-    
-    # Отправляем результат
-    await update.effective_message.reply_photo(
-        photo=buf,
-        caption=f"📈 Результаты бэктеста {strategy_key}\n"
-                f"Доходность: {results['returns']:.2%}"
+    # /backtest SBER [day] — реальная история, иначе тестовые данные
+    args = context.args or []
+    df, source = None, "тестовые данные"
+    if args:
+        interval_key = args[1] if len(args) > 1 else "day"
+        df = await load_history(args[0], interval_key)
+        if df is not None:
+            source = f"{args[0].upper()}, {interval_key}, {len(df)} свечей"
+    if df is None:
+        df = generate_mock_candles(200)
+        df.attrs["source"] = ("mock", 200)
+
+    # Повторный прогон той же стратегии на тех же данных — из кэша
+    cache = BacktestCache()
+    dataset_id, dataset_version = dataset_identity(df)
+    key = cache_key(strategy, dataset_id, dataset_version)
+    cached = await cache.get(key)
+    if cached is not None:
+        await update.effective_message.reply_photo(
+            photo=cached["chart"],
+            caption=f"📈 Результаты бэктеста {strategy_key} ({source})\n"
+                    f"Доходность: {cached['returns']:.2%}"
+        )
+        return
+
+    # Сам прогон и график — в очереди на пуле процессов, event loop не блокируется
+    message = await update.effective_message.reply_text(f"⏳ Бэктест {strategy_key} поставлен в очередь")
+    job = BacktestJob(
+        user_id=update.effective_user.id,
+        chat_id=message.chat_id,
+        message_id=message.message_id,
+        strategy_key=strategy_key,
+        params=strategy_params(strategy),
+        source=df.attrs.get("source", ("frame", df)),
+        label=source,
+        cache_key=key,
+        dataset_id=dataset_id,
+        dataset_version=dataset_version
     )
-    
-    # Закрываем буфер
-    buf.close()
\ No newline at end of file
+    await enqueue(message, job)
@@ -0,0 +1,75 @@
+from functools import partial
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from strategies.portfolio import CandleSource, portfolio_backtest
+from tinkoff_api.historical import INTERVAL_MAPPING
+from tinkoff_api.instruments import InstrumentCache
+from utils.backtest_jobs import ComputeJob, enqueue
+from utils.charts import plot_equity_curve
+from utils.logger import log_action
+from utils.rate_limit import rate_limit
+
+# Псевдонимы правила распределения в аргументах команды
+ALLOCATION_ALIASES = {"equal": "equal", "vol": "volatility", "volatility": "volatility"}
+
+
+def run_basket(strategy_key: str, params: dict, sources: dict, allocation: str):
+    """Инструменты корзины по очереди в процессе очереди задач, без своего пула"""
+    result = portfolio_backtest(strategy_key, sources, params=params, allocation=allocation, workers=1)
+    return result, plot_equity_curve(result).getvalue()
+
+
+async def _send_basket(bot, job: ComputeJob, outcome, missing: list):
+    result, chart = outcome
+    strategy_key, _, _, allocation = job.args
+    lines = [
+        f"🧺 Корзина {strategy_key} ({allocation}, {len(result['assets'])} инстр.)",
+        f"Доходность: {result['equity_curve'].iloc[-1] - 1:.2%}",
+    ]
+    for row in result["assets"].head(5).itertuples():
+        lines.append(f"{row.asset}: {row.total_return:+.2%}, вес {row.weight:.0%}")
+    if missing:
+        lines.append(f"Не найдены: {', '.join(missing)}")
+    await bot.send_photo(chat_id=job.chat_id, photo=chart, caption="\n".join(lines), reply_to_message_id=job.message_id)
+
+
+@rate_limit()
+async def basket(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/basket SBER GAZP LKOH [vol] — бэктест выбранной стратегии на корзине (дневные свечи)"""
+    await log_action("basket_command", "User requested portfolio backtest", update.effective_user.id)
+    args = list(context.args or [])
+    allocation = "equal"
+    if args and args[-1].lower() in ALLOCATION_ALIASES:
+        allocation = ALLOCATION_ALIASES[args.pop().lower()]
+    if len(args) < 2:
+        await update.effective_message.reply_text("Использование: /basket SBER GAZP LKOH [equal|vol]")
+        return
+
+    cache = InstrumentCache()
+    interval = int(INTERVAL_MAPPING["day"])
+    sources, missing = {}, []
+    for ticker in args:
+        figi = await cache.get_figi(ticker)
+        if figi:
+            sources[ticker.upper()] = CandleSource(figi, interval)
+        else:
+            missing.append(ticker.upper())
+    if len(sources) < 2:
+        await update.effective_message.reply_text("❌ Нужно хотя бы два инструмента с загруженной историей")
+        return
+
+    strategy_key = context.user_data.get("selected_strategy", "MA")
+    params = context.user_data.get("strategy_params", {})
+    message = await update.effective_message.reply_text(f"⏳ Корзина {strategy_key} поставлена в очередь")
+    await enqueue(message, ComputeJob(
+        user_id=update.effective_user.id,
+        chat_id=message.chat_id,
+        message_id=message.message_id,
+        title=f"Корзина {strategy_key}",
+        label=f"{allocation}, {', '.join(sources)}",
+        task=run_basket,
+        args=(strategy_key, params, sources, allocation),
+        on_done=partial(_send_basket, missing=missing)
+    ))
@@ -0,0 +1,49 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from db.operations import account_pnl, trade_history, BUY_TYPES
+from tinkoff_api.accounts import resolve_account_id
+from tinkoff_api.instruments import InstrumentCache
+from utils.rate_limit import rate_limit
+from utils.logger import log_action
+from tinkoff_api.resilience import with_deadline
+
+@rate_limit()
+@with_deadline()
+async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """История сделок и реализованный результат из локальной копии операций"""
+    await log_action("history_command", "User requested trade history", update.effective_user.id)
+    account_id = await resolve_account_id()
+    cache = InstrumentCache()
+
+    # /history SBER — только по одному инструменту
+    figi = None
+    if context.args:
+        figi = await cache.get_figi(context.args[0])
+        if not figi:
+            await update.effective_message.reply_text(f"❌ Инструмент {context.args[0].upper()} не найден")
+            return
+
+    trades = await trade_history(account_id, figi=figi, limit=10)
+    pnl = await account_pnl(account_id)
+
+    async def ticker(figi):
+        instrument = await cache.get_by_figi(figi)
+        return instrument["ticker"] if instrument else figi
+
+    lines = ["📜 *Последние сделки:*"]
+    for op in trades:
+        action = "📤 Покупка" if op.type in BUY_TYPES else "📥 Продажа"
+        lines.append(
+            f"{op.date.strftime('%d.%m.%Y %H:%M')} {action} {op.quantity_done or op.quantity} шт "
+            f"{await ticker(op.figi)} по {op.price:,.2f} {op.currency or ''}"
+        )
+    if not trades:
+        lines.append("Сделок пока нет")
+
+    selected = {figi: pnl.get(figi, 0.0)} if figi else pnl
+    if selected:
+        lines.append("\n💰 *Реализованный результат:*")
+        for item_figi, value in sorted(selected.items(), key=lambda kv: kv[1]):
+            lines.append(f"{await ticker(item_figi)}: {value:+,.2f}")
+
+    await update.effective_message.reply_text("\n".join(lines), parse_mode="Markdown")
@@ -0,0 +1,52 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import LIVE_SIGNALS_PER_USER
+from tinkoff_api.instruments import InstrumentCache
+from tinkoff_api.live_signals import LiveSignalRunner
+from utils.logger import log_action
+from utils.rate_limit import rate_limit
+
+
+@rate_limit()
+async def watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/watch TICKER — живые сигналы выбранной стратегии по минутным свечам"""
+    await log_action("watch_command", "User requested live signals", update.effective_user.id)
+    user_id = update.effective_user.id
+    runner = LiveSignalRunner()
+    if not context.args:
+        watching = runner.watching(user_id)
+        text = f"📶 Отслеживаются: {', '.join(watching)}" if watching else "📶 Сигналы не отслеживаются"
+        await update.effective_message.reply_text(f"{text}\n\nИспользование: /watch SBER, отключить: /unwatch SBER")
+        return
+
+    ticker = context.args[0].upper()
+    figi = await InstrumentCache().get_figi(ticker)
+    if not figi:
+        await update.effective_message.reply_text(f"❌ Инструмент {ticker} не найден")
+        return
+    if len(runner.watching(user_id)) >= LIVE_SIGNALS_PER_USER:
+        await update.effective_message.reply_text(f"⚠️ Не больше {LIVE_SIGNALS_PER_USER} инструментов одновременно")
+        return
+
+    strategy_key = context.user_data.get("selected_strategy", "MA")
+    if not await runner.watch(user_id, ticker, figi, strategy_key, context.user_data.get("strategy_params", {})):
+        await update.effective_message.reply_text(f"📶 {ticker} уже отслеживается")
+        return
+    await update.effective_message.reply_text(
+        f"📶 Сигналы {strategy_key} по {ticker}: пришлю сообщение при смене позиции (минутные свечи)"
+    )
+
+
+@rate_limit()
+async def unwatch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/unwatch [TICKER] — отключить живые сигналы по инструменту или все"""
+    await log_action("unwatch_command", "User stopped live signals", update.effective_user.id)
+    figi = None
+    if context.args:
+        figi = await InstrumentCache().get_figi(context.args[0])
+        if not figi:
+            await update.effective_message.reply_text(f"❌ Инструмент {context.args[0].upper()} не найден")
+            return
+    stopped = await LiveSignalRunner().unwatch(update.effective_user.id, figi)
+    await update.effective_message.reply_text(f"📴 Отключено сигналов: {stopped}")
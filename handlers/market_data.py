@@ -1,7 +1,9 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler
 from tinkoff_api.historical import HistoricalData, INTERVAL_MAPPING  # Импортируем INTERVAL_MAPPING напрямую
+from utils.charts import ChartRenderer
 from utils.logger import logger
+from tinkoff_api.resilience import with_deadline
 
 SELECT_TICKER, SELECT_INTERVAL = range(2)
 
@@ -11,15 +13,16 @@ INTERVALS = ["1min", "5min", "15min", "hour", "day"]
 async def candles_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         keyboard = [[InlineKeyboardButton(t, callback_data=f"candles_ticker_{t}")] for t in TICKERS]
+        text = "Выберите тикер или найдите другой: /quotes <тикер или название>"
         query = update.callback_query
         if query:
             await query.edit_message_text(
-                "Выберите тикер:",
+                text,
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
         else:
             await update.effective_message.reply_text(
-                "Выберите тикер:",
+                text,
                 reply_markup=InlineKeyboardMarkup(keyboard))
         return SELECT_TICKER
     except Exception as e:
@@ -51,6 +54,7 @@ async def select_ticker(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text(f"Ошибка при выборе тикера")
         return ConversationHandler.END
 
+@with_deadline()
 async def select_interval(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -84,12 +88,7 @@ async def select_interval(update: Update, context: ContextTypes.DEFAULT_TYPE):
             formatted = [historical.format_candle(c) for c in candles_data]
             text = f"📊 Свечи {ticker} ({interval}):\n" + "\n".join(formatted[-10:])
             
-            # Создаем кнопку обновления
-            refresh_button = InlineKeyboardButton(
-                "🔄 Обновить", 
-                callback_data=f"rcandles_{ticker}_{interval}_7" 
-            )
-            reply_markup = InlineKeyboardMarkup([[refresh_button]])
+            reply_markup = candles_markup(ticker, interval, 7)
             
             await query.edit_message_text(
                 text=text,
@@ -105,8 +104,32 @@ async def select_interval(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text(f"Ошибка при выборе интервала")
         return ConversationHandler.END
 
+def candles_markup(ticker: str, interval: str, days: int) -> InlineKeyboardMarkup:
+    """Кнопки под списком свечей: обновить и показать график"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 Обновить", callback_data=f"rcandles_{ticker}_{interval}_{days}"),
+        InlineKeyboardButton("📈 График", callback_data=f"chcandles_{ticker}_{interval}_{days}"),
+    ]])
+
+async def send_candles_chart(update: Update, ticker: str, interval: str, days: int):
+    """Свечной график: массивы свечей сразу идут в рендерер, без объектов на каждую свечу"""
+    interval_enum = INTERVAL_MAPPING.get(interval)
+    if not interval_enum:
+        await update.effective_message.reply_text("❌ Неверный интервал")
+        return
+    arrays = await HistoricalData().get_candle_arrays(ticker, interval_enum, days)
+    if not len(arrays):
+        await update.effective_message.reply_text(f"❌ Не удалось получить данные для {ticker}")
+        return
+    png = await ChartRenderer().candles(arrays, f"{ticker} ({interval}, {days} дн.)")
+    await update.effective_message.reply_photo(photo=png, caption=f"📈 {ticker}, {interval}: {len(arrays)} свечей")
+
 candles_conv_handler = ConversationHandler(
-    entry_points=[CallbackQueryHandler(candles_start, pattern="^candles_start$")],
+    entry_points=[
+        CallbackQueryHandler(candles_start, pattern="^candles_start$"),
+        # Кнопки из результатов поиска /quotes сразу открывают выбор интервала
+        CallbackQueryHandler(select_ticker, pattern="^candles_ticker_.*"),
+    ],
     states={
         SELECT_TICKER: [CallbackQueryHandler(select_ticker, pattern="^candles_ticker_.*")],
         SELECT_INTERVAL: [CallbackQueryHandler(select_interval, pattern="^candles_interval_.*")],
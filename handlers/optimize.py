@@ -0,0 +1,111 @@
+from tabulate import tabulate
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from handlers.backtest import load_history
+from strategies.optimizer import DEFAULT_SPACES, ParameterOptimizer
+from strategies.walkforward import walk_forward
+from utils.backtest_jobs import ComputeJob, enqueue, load_source
+from utils.charts import plot_equity_curve
+from utils.logger import log_action
+from utils.mocks import generate_mock_candles
+from utils.rate_limit import rate_limit
+
+TOP_RESULTS = 5
+
+
+def run_grid(strategy_key: str, source: tuple):
+    """Перебор сетки по умолчанию (в процессе очереди задач, без своего пула)"""
+    close = load_source(source)["close"].to_numpy()
+    with ParameterOptimizer(strategy_key, close, workers=1) as optimizer:
+        return optimizer.grid(DEFAULT_SPACES[strategy_key])
+
+
+async def _load_series(args: list) -> tuple:
+    """История по тикеру из аргументов команды или тестовые данные"""
+    if args:
+        interval_key = args[1] if len(args) > 1 else "day"
+        df = await load_history(args[0], interval_key)
+        if df is not None:
+            return df, f"{args[0].upper()}, {interval_key}, {len(df)} свечей"
+    df = generate_mock_candles(500)
+    df.attrs["source"] = ("mock", 500)
+    return df, "тестовые данные"
+
+
+async def _send_grid(bot, job: ComputeJob, table):
+    strategy_key = job.args[0]
+    top = table.head(TOP_RESULTS)
+    columns = [name for name in DEFAULT_SPACES[strategy_key]] + ["sharpe", "total_return", "max_drawdown", "trades"]
+    text = tabulate(top[columns], headers="keys", tablefmt="simple", floatfmt=".3f", showindex=False)
+    note = " (прервано по времени)" if table.attrs["timed_out"] else ""
+    await bot.send_message(
+        chat_id=job.chat_id,
+        text=f"🏆 Лучшие параметры {strategy_key} ({job.label})\n"
+             f"Прогонов: {table.attrs['completed']}/{table.attrs['requested']}{note}\n\n"
+             f"```\n{text}\n```\n"
+             f"Применить: /strategy",
+        parse_mode="Markdown",
+        reply_to_message_id=job.message_id
+    )
+
+
+@rate_limit()
+async def optimize(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/optimize [TICKER [interval]] — подбор параметров выбранной стратегии"""
+    await log_action("optimize_command", "User requested parameter optimization", update.effective_user.id)
+    strategy_key = context.user_data.get("selected_strategy", "MA")
+
+    df, source = await _load_series(context.args or [])
+    message = await update.effective_message.reply_text(f"⏳ Подбор параметров {strategy_key} поставлен в очередь")
+    # Перебор идёт в общей очереди расчётов — с её лимитами на пользователя и на бота
+    await enqueue(message, ComputeJob(
+        user_id=update.effective_user.id,
+        chat_id=message.chat_id,
+        message_id=message.message_id,
+        title=f"Подбор параметров {strategy_key}",
+        label=source,
+        task=run_grid,
+        args=(strategy_key, df.attrs.get("source", ("frame", df))),
+        on_done=_send_grid
+    ))
+
+
+def run_walk_forward(strategy_key: str, source: tuple):
+    df = load_source(source)
+    result = walk_forward(strategy_key, df["close"].to_numpy(), index=df.index, workers=1)
+    return result, plot_equity_curve(result).getvalue()
+
+
+async def _send_walk_forward(bot, job: ComputeJob, outcome):
+    result, chart = outcome
+    windows = result["windows"].drop(columns=["train_start"])
+    text = tabulate(windows, headers="keys", tablefmt="simple", floatfmt=".2f", showindex=False)
+    await bot.send_photo(
+        chat_id=job.chat_id,
+        photo=chart,
+        caption=f"🔁 Walk-forward {job.args[0]} ({job.label})\n"
+                f"Доходность вне выборки: {result['equity_curve'].iloc[-1] - 1:.2%}",
+        reply_to_message_id=job.message_id
+    )
+    await bot.send_message(chat_id=job.chat_id, text=f"```\n{text}\n```", parse_mode="Markdown")
+
+
+@rate_limit()
+async def walkforward(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/walkforward [TICKER [interval]] — проверка стратегии вне обучающей выборки"""
+    await log_action("walkforward_command", "User requested walk-forward validation", update.effective_user.id)
+    strategy_key = context.user_data.get("selected_strategy", "MA")
+    df, source = await _load_series(context.args or [])
+
+    message = await update.effective_message.reply_text(f"⏳ Walk-forward {strategy_key} поставлен в очередь")
+    await enqueue(message, ComputeJob(
+        user_id=update.effective_user.id,
+        chat_id=message.chat_id,
+        message_id=message.message_id,
+        title=f"Walk-forward {strategy_key}",
+        label=source,
+        task=run_walk_forward,
+        args=(strategy_key, df.attrs.get("source", ("frame", df))),
+        on_done=_send_walk_forward
+    ))
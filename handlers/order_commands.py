@@ -162,17 +162,15 @@ async def cancel_order_button(update: Update, context: ContextTypes.DEFAULT_TYPE
         await log_action("cancel_error", str(e), user_id)
 
 async def api_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает активные и исполненные ордера через API Tinkoff"""
+    """Показывает активные и исполненные заявки у брокера (локальное состояние трекера)"""
     try:
-        from config import USE_SANDBOX, PRIMARY_ACCOUNT_ID
-        from tinkoff_api.client import TinkoffClient
-        from utils.formatters import format_orders
-        from tinkoff_api.accounts import get_or_create_sandbox_account
-
-        account_id = await get_or_create_sandbox_account() if USE_SANDBOX else PRIMARY_ACCOUNT_ID
-        client = TinkoffClient(sandbox=USE_SANDBOX)
-        active_orders, executed_orders = await client.get_orders(account_id)
-        text = format_orders(active_orders, executed_orders)
+        from utils.formatters import format_tracked_orders
+        from tinkoff_api.accounts import resolve_account_id
+        from tinkoff_api.order_state import tracked_orders
+
+        account_id = await resolve_account_id()
+        active_orders, executed_orders = await tracked_orders(account_id)
+        text = format_tracked_orders(active_orders, executed_orders)
         
         keyboard = [
             [InlineKeyboardButton("🔄 Обновить", callback_data="api_orders")],
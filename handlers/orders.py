@@ -1,22 +1,20 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from tinkoff_api.client import TinkoffClient
-from tinkoff_api.accounts import get_or_create_sandbox_account
-from utils.formatters import format_orders
-from config import USE_SANDBOX, PRIMARY_ACCOUNT_ID
+from tinkoff_api.accounts import resolve_account_id
+from tinkoff_api.order_state import tracked_orders
+from utils.formatters import format_tracked_orders
 from utils.logger import log_action
 
 async def orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /orders"""
     try:
-        account_id = await get_or_create_sandbox_account() if USE_SANDBOX else PRIMARY_ACCOUNT_ID
-        client = TinkoffClient(sandbox=USE_SANDBOX)
-        
-        # Получаем активные и завершённые ордера
-        active_orders, executed_orders = await client.get_orders(account_id)
-        
+        account_id = await resolve_account_id()
+
+        # Активные и завершённые ордера из локального состояния трекера
+        active_orders, executed_orders = await tracked_orders(account_id)
+
         # Форматируем вывод
-        text = format_orders(active_orders, executed_orders)
+        text = format_tracked_orders(active_orders, executed_orders)
         await update.message.reply_text(text)
         
         await log_action("orders_command", "Fetched orders", update.effective_user.id)
@@ -1,19 +1,18 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
-from tinkoff_api.accounts import get_or_create_sandbox_account
+from tinkoff_api.accounts import resolve_account_id
 from tinkoff_api.client import TinkoffClient
 from utils.formatters import format_portfolio
-from config import USE_SANDBOX, PRIMARY_ACCOUNT_ID
+from config import USE_SANDBOX
 from utils.rate_limit import rate_limit
 from utils.logger import log_action
+from tinkoff_api.resilience import with_deadline
 
 @rate_limit()
+@with_deadline()
 async def portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await log_action("portfolio_command", "User requested portfolio", update.effective_user.id)
-    if USE_SANDBOX:
-        account_id = await get_or_create_sandbox_account()
-    else:
-        account_id = PRIMARY_ACCOUNT_ID
+    account_id = await resolve_account_id()
     client = TinkoffClient(sandbox=USE_SANDBOX)
     portfolio_data = await client.get_portfolio(account_id)
     text = format_portfolio(portfolio_data)
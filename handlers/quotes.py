@@ -1,24 +1,49 @@
-from telegram import Update
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 from tinkoff_api.instruments import InstrumentCache
 from utils.rate_limit import rate_limit
+from tinkoff_api.resilience import with_deadline
 
 @rate_limit()
+@with_deadline()
 async def quotes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from utils.logger import log_action
     await log_action("quotes_command", "User requested quotes", update.effective_user.id)
-    
+
     # Используем кэш инструментов
     cache = InstrumentCache()
-    instruments = await cache.get_instruments()
-    
-    # Формируем список инструментов
-    text_lines = []
-    count = 0
-    for ticker, data in instruments.items():
-        if count >= 10:
-            break
-        text_lines.append(f"{ticker}: {data['name']}")
-        count += 1
-    
-    await update.message.reply_text(f"Доступные инструменты (пример):\n" + "\n".join(text_lines))
\ No newline at end of file
+    query = " ".join(context.args or [])
+
+    if not query:
+        instruments = await cache.get_instruments()
+
+        # Формируем список инструментов
+        text_lines = []
+        count = 0
+        for ticker, data in instruments.items():
+            if count >= 10:
+                break
+            text_lines.append(f"{ticker}: {data['name']}")
+            count += 1
+
+        await update.message.reply_text(
+            f"Доступные инструменты (пример):\n" + "\n".join(text_lines) +
+            "\n\n🔍 Поиск: /quotes <тикер или название>, например /quotes сбер"
+        )
+        return
+
+    # Поиск по части тикера или названия (кириллица и латиница)
+    found = await cache.search(query, limit=8)
+    if not found:
+        await update.message.reply_text(f"🔍 По запросу «{query}» ничего не найдено")
+        return
+
+    text_lines = [f"{item['ticker']}: {item['name']} ({item['type']})" for item in found]
+    keyboard = [
+        [InlineKeyboardButton(f"📈 {item['ticker']}", callback_data=f"candles_ticker_{item['ticker']}")]
+        for item in found
+    ]
+    await update.message.reply_text(
+        f"🔍 Результаты по запросу «{query}»:\n" + "\n".join(text_lines),
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
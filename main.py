@@ -6,7 +6,7 @@ logging.basicConfig(level=logging.DEBUG)
 from contextlib import suppress
 from functools import partial
 from redis.asyncio import Redis
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -21,6 +21,13 @@ from handlers.common import start
 from handlers.portfolio import portfolio
 from handlers.quotes import quotes
 from handlers.backtest import backtest
+from handlers.history import history
+from handlers.optimize import optimize, walkforward
+from handlers.basket import basket
+from handlers.live import watch, unwatch
+from db.backtest_cache import BacktestCache
+from utils.backtest_jobs import BacktestJobs
+from utils.charts import ChartRenderer
 from handlers.order_commands import api_orders, create_order, list_orders, cancel_order, cancel_order_button
 from handlers.strategy import (
     strategy,
@@ -29,15 +36,23 @@ from handlers.strategy import (
     strategy_selection,
     strategy_configuration
 )
-from handlers.market_data import candles_conv_handler
+from handlers.market_data import candles_conv_handler, candles_markup, send_candles_chart
 from utils.ptb_persistence import RedisPersistence
-from utils.formatters import format_balance, format_portfolio, format_orders, format_candles
+from utils.formatters import format_balance, format_portfolio, format_tracked_orders, format_candles
 from utils.logger import log_action
 from utils.rate_limit import rate_limit
 from utils.error_handlers import global_error_handler
-from tinkoff_api.accounts import get_or_create_sandbox_account
+from utils.singleflight import singleflight_stats
+from tinkoff_api.quota import quota
+from tinkoff_api.accounts import AccountRegistry, resolve_account_id
 from tinkoff_api.client import TinkoffClient
-from config import USE_SANDBOX, PRIMARY_ACCOUNT_ID
+from tinkoff_api.connection import TinkoffConnectionManager
+from tinkoff_api.live_signals import LiveSignalRunner
+from tinkoff_api.market_data_hub import MarketDataHub
+from tinkoff_api.order_state import OrderStateTracker, tracked_orders
+from tinkoff_api.operations_sync import OperationsSync
+from tinkoff_api.resilience import resilience_stats, with_deadline
+from config import USE_SANDBOX
 from tinkoff_api.historical import HistoricalData
 from tinkoff_api.historical import INTERVAL_MAPPING
 
@@ -57,10 +72,46 @@ redis = Redis(
 )
 persistence = RedisPersistence(redis)
 
+
+async def on_startup(application):
+    """Открываем каналы Tinkoff API и резолвим счета до первого запроса"""
+    try:
+        await TinkoffConnectionManager().start()
+        await AccountRegistry().warm_up()
+        await MarketDataHub().start()
+        await LiveSignalRunner().start(application.bot)
+        await OrderStateTracker().start(application.bot)
+        await OperationsSync().start()
+    except Exception as e:
+        logger.error(f"Failed to warm up Tinkoff API: {e}", exc_info=True)
+    await BacktestJobs().start(application.bot)
+    ChartRenderer().start()
+
+
+async def on_shutdown(application):
+    """Останавливаем стримы и корректно закрываем каналы Tinkoff API"""
+    await LiveSignalRunner().stop()
+    await MarketDataHub().stop()
+    await OrderStateTracker().stop()
+    await OperationsSync().stop()
+    await BacktestJobs().stop()
+    ChartRenderer().stop()
+    await TinkoffConnectionManager().close()
+    logger.info(f"Request coalescing: {singleflight_stats()}")
+    logger.info(f"API quota: {quota.stats()}")
+    logger.info(f"API resilience: {resilience_stats()}")
+    logger.info(f"Backtest cache: {BacktestCache().stats()}")
+    logger.info(f"Backtest jobs: {BacktestJobs().stats()}")
+    logger.info(f"Live signals: {LiveSignalRunner().stats()}")
+    logger.info(f"Chart renderer: {ChartRenderer().stats()}")
+
+
 # Создание приложения
 application = ApplicationBuilder() \
     .token(TELEGRAM_TOKEN) \
     .persistence(persistence) \
+    .post_init(on_startup) \
+    .post_shutdown(on_shutdown) \
     .build()
 
 # Регистрация обработчиков команд
@@ -73,6 +124,12 @@ application.add_handler(CommandHandler("api_orders", api_orders))
 application.add_handler(CommandHandler("order", create_order))
 application.add_handler(CommandHandler("orders", list_orders))
 application.add_handler(CommandHandler("cancelorder", cancel_order))
+application.add_handler(CommandHandler("history", history))
+application.add_handler(CommandHandler("optimize", optimize))
+application.add_handler(CommandHandler("walkforward", walkforward))
+application.add_handler(CommandHandler("basket", basket))
+application.add_handler(CommandHandler("watch", watch))
+application.add_handler(CommandHandler("unwatch", unwatch))
 
 # Добавляем ConversationHandler для свечей ПЕРЕД общим обработчиком кнопок
 application.add_handler(candles_conv_handler)
@@ -99,6 +156,7 @@ application.add_error_handler(global_error_handler)
 
 # Обработчик inline-кнопок
 @rate_limit()
+@with_deadline()
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -109,14 +167,14 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
             
         if query.data == "balance":
-            account_id = await get_or_create_sandbox_account() if USE_SANDBOX else PRIMARY_ACCOUNT_ID
+            account_id = await resolve_account_id()
             client = TinkoffClient(sandbox=USE_SANDBOX)
             portfolio_data = await client.get_portfolio(account_id)
             text = format_balance(portfolio_data)
             await query.edit_message_text(text)
             
         elif query.data == "portfolio":
-            account_id = await get_or_create_sandbox_account() if USE_SANDBOX else PRIMARY_ACCOUNT_ID
+            account_id = await resolve_account_id()
             client = TinkoffClient(sandbox=USE_SANDBOX)
             portfolio_data = await client.get_portfolio(account_id)
             text = format_portfolio(portfolio_data)
@@ -132,12 +190,16 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await list_orders(update, context)
             
         elif query.data == "api_orders":
-            account_id = await get_or_create_sandbox_account() if USE_SANDBOX else PRIMARY_ACCOUNT_ID
-            client = TinkoffClient(sandbox=USE_SANDBOX)
-            active_orders, executed_orders = await client.get_orders(account_id)
-            text = format_orders(active_orders, executed_orders)
+            account_id = await resolve_account_id()
+            active_orders, executed_orders = await tracked_orders(account_id)
+            text = format_tracked_orders(active_orders, executed_orders)
             await query.edit_message_text(text)
             
+        elif query.data.startswith("btcancel:"):
+            job_id = query.data.split(":", 1)[1]
+            if not await BacktestJobs().cancel(job_id, update.effective_user.id):
+                await query.edit_message_text("⚠️ Бэктест уже завершён")
+            
         elif query.data.startswith("cancel_"):
             order_id = int(query.data.split("_")[1])
             await cancel_order_button(update, context, order_id)
@@ -151,6 +213,14 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif query.data == "show_forest":
             await query.edit_message_text("🌲 Ваш лес: 1 дерево! (геймификация)")
             
+        elif query.data.startswith("chcandles_"):
+            parts = query.data.split('_')
+            if len(parts) < 4 or not parts[3].isdigit():
+                logger.error(f"Invalid candles chart format: {query.data}")
+                await query.message.reply_text("⚠️ Ошибка формата запроса")
+                return
+            await send_candles_chart(update, parts[1], parts[2], int(parts[3]))
+            
         # Обработка обновления свечей с новым форматом
         elif query.data.startswith("rcandles_"):
             parts = query.data.split('_')
@@ -193,13 +263,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 text = format_candles(ticker, interval, formatted)
                 
                 # Обновляем сообщение
-                keyboard = [
-                    [InlineKeyboardButton(
-                        "🔄 Обновить", 
-                        callback_data=f"rcandles_{ticker}_{interval}_{days}"
-                    )]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = candles_markup(ticker, interval, days)
                 
                 await query.edit_message_text(
                     text=text,
@@ -0,0 +1,79 @@
+"""
+Массовая загрузка истории свечей до открытия рынка.
+
+Примеры:
+    python scripts/backfill.py --tickers SBER GAZP --interval 1min --from 2021-01-01
+    python scripts/backfill.py --type share --currency rub --interval day --from 2015-01-01
+
+Повторный запуск с теми же параметрами продолжает прерванную загрузку.
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import asyncio
+from datetime import datetime, time, timezone
+
+from db.candle_files import CandleFileStore
+from tinkoff_api.backfill import BACKFILL_CONCURRENCY, Backfill, select_figis
+from tinkoff_api.candle_store import INTERVAL_MAX_SPAN, file_sink
+from tinkoff_api.connection import TinkoffConnectionManager
+from tinkoff_api.historical import INTERVAL_MAPPING, HistoricalData
+from tinkoff_api.instruments import INSTRUMENT_TYPES
+
+
+def parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill historical candles")
+    parser.add_argument("--tickers", nargs="*", help="тикеры; без них — фильтр по каталогу")
+    parser.add_argument("--type", choices=list(INSTRUMENT_TYPES), help="тип инструментов")
+    parser.add_argument("--currency", help="валюта инструментов, например rub")
+    parser.add_argument("--class-code", help="режим торгов, например TQBR")
+    parser.add_argument("--interval", choices=list(INTERVAL_MAPPING), default="day")
+    parser.add_argument("--from", dest="from_", type=parse_date, required=True)
+    # По умолчанию — до начала текущих суток: так задача за день одна и та же
+    parser.add_argument(
+        "--to", type=parse_date,
+        default=datetime.combine(datetime.now(timezone.utc).date(), time(), tzinfo=timezone.utc)
+    )
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    # files — локальные файлы для бэктестов, redis — кэш свечей бота
+    parser.add_argument("--sink", choices=["files", "redis"], default="files")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    interval = INTERVAL_MAPPING[args.interval]
+    historical = HistoricalData()
+
+    figis = await select_figis(
+        historical.instrument_cache,
+        tickers=args.tickers,
+        instrument_type=args.type,
+        currency=args.currency,
+        class_code=args.class_code
+    )
+    backfill = Backfill(
+        figis,
+        interval,
+        args.from_,
+        args.to,
+        fetcher=historical.fetch_backfill_chunk,
+        sink=file_sink(CandleFileStore()) if args.sink == "files" else historical.store.merge,
+        span=INTERVAL_MAX_SPAN[interval],
+        concurrency=args.concurrency
+    )
+    try:
+        summary = await backfill.run()
+    finally:
+        await TinkoffConnectionManager().close()
+    print(summary)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Сравнение движка бэктеста на массивах с прежней реализацией на DataFrame.
+
+Запуск: python scripts/bench_backtest_engine.py [количество_свечей]
+
+Прежние стратегии воспроизведены здесь дословно: они добавляли колонки
+во входной DataFrame, поэтому каждый прогон получает свою копию
+(копирование в замер не входит). В конце печатается, достигнута ли цель
+TARGET на всех стратегиях.
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from strategies.bollinger import BollingerBandsStrategy
+from strategies.ma import MovingAverageStrategy
+from strategies.rsi import RSIStrategy
+
+warnings.simplefilter("ignore", FutureWarning)
+
+# Целевое ускорение относительно прежней реализации
+TARGET = 10.0
+
+
+def legacy_ma(df, window=20):
+    df['ma'] = df['close'].rolling(window).mean()
+    df['signal'] = np.where(df['close'] > df['ma'], 1, 0)
+    df['position'] = df['signal'].shift(1)
+    df['returns'] = df['close'].pct_change() * df['position']
+    df['equity'] = (1 + df['returns']).cumprod()
+    return df['returns'].sum()
+
+
+def legacy_positions(df):
+    df['position'] = df['signal'].replace(0, method='ffill').fillna(0)
+    df['returns'] = df['close'].pct_change() * df['position'].shift(1)
+    df['equity'] = (1 + df['returns']).cumprod()
+    return df['returns'].sum()
+
+
+def legacy_rsi(df, period=14, oversold=30, overbought=70):
+    delta = df['close'].diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.ewm(alpha=1/period, adjust=False).mean()
+    avg_loss = loss.ewm(alpha=1/period, adjust=False).mean()
+    df['rsi'] = 100 - (100 / (1 + avg_gain / avg_loss))
+    df['signal'] = 0
+    df['position'] = 0
+    df.loc[(df['rsi'] < oversold) & (df['rsi'].shift(1) < df['rsi']), 'signal'] = 1
+    df.loc[(df['rsi'] > overbought) & (df['rsi'].shift(1) > df['rsi']), 'signal'] = -1
+    return legacy_positions(df)
+
+
+def legacy_bollinger(df, period=20, deviation=2.0):
+    df['sma'] = df['close'].rolling(period).mean()
+    df['std'] = df['close'].rolling(period).std()
+    df['upper'] = df['sma'] + (df['std'] * deviation)
+    df['lower'] = df['sma'] - (df['std'] * deviation)
+    df['signal'] = 0
+    df['position'] = 0
+    df.loc[df['close'] < df['lower'], 'signal'] = 1
+    df.loc[df['close'] > df['upper'], 'signal'] = -1
+    return legacy_positions(df)
+
+
+def best_of(func, df, copy: bool, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        data = df.copy() if copy else df
+        started = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(42)
+    close = 250 + np.cumsum(rng.normal(0, 0.1, count))
+    df = pd.DataFrame({'open': close, 'high': close + 0.1, 'low': close - 0.1, 'close': close})
+
+    cases = [
+        ("MA", legacy_ma, MovingAverageStrategy().backtest),
+        ("RSI", legacy_rsi, RSIStrategy().backtest),
+        ("Bollinger", legacy_bollinger, BollingerBandsStrategy().backtest),
+        ("MA, arrays", legacy_ma, lambda data: MovingAverageStrategy().backtest_arrays(close)),
+    ]
+
+    print(f"{count} candles")
+    print(f"{'strategy':<12} {'legacy, ms':>11} {'engine, ms':>11} {'speedup':>8}")
+    speedups = []
+    for name, legacy, engine in cases:
+        old = best_of(legacy, df, copy=True)
+        new = best_of(engine, df, copy=False)
+        speedups.append(old / new)
+        print(f"{name:<12} {old * 1000:>11.1f} {new * 1000:>11.1f} {old / new:>7.1f}x")
+    status = "достигнута" if min(speedups) >= TARGET else "НЕ достигнута"
+    print(f"цель {TARGET:.0f}x {status}: минимум {min(speedups):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
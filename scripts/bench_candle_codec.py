@@ -0,0 +1,97 @@
+"""
+Сравнение форматов кэша свечей: JSON (старый) и колоночный бинарный.
+
+Запуск: python scripts/bench_candle_codec.py [количество_свечей]
+
+JSON-путь измеряется без построения HistoricCandle/Quotation, то есть
+это нижняя граница его реальной стоимости.
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from tinkoff_api.candle_codec import CandleArrays, decode_candles, encode_candles
+
+
+def make_candles(count: int) -> CandleArrays:
+    rng = np.random.default_rng(42)
+    close = np.round(250 + np.cumsum(rng.normal(0, 0.1, count)), 2)
+    return CandleArrays(
+        1_700_000_000 + np.arange(count, dtype=np.int64) * 60,
+        close + np.round(rng.uniform(-0.05, 0.05, count), 2),
+        close + 0.1,
+        close - 0.1,
+        close,
+        rng.integers(1, 10_000, count)
+    )
+
+
+def to_json(arrays: CandleArrays) -> bytes:
+    def quotation(value):
+        units = int(value)
+        return {"units": units, "nano": int(round((value - units) * 1e9))}
+
+    return json.dumps([
+        {
+            "time": datetime.fromtimestamp(int(t), tz=timezone.utc).isoformat(),
+            "open": quotation(o),
+            "high": quotation(h),
+            "low": quotation(l),
+            "close": quotation(c),
+            "volume": int(v)
+        }
+        for t, o, h, l, c, v in zip(*arrays)
+    ]).encode()
+
+
+def from_json(payload: bytes):
+    return [
+        (
+            datetime.fromisoformat(row["time"]),
+            row["open"]["units"] + row["open"]["nano"] / 1e9,
+            row["high"]["units"] + row["high"]["nano"] / 1e9,
+            row["low"]["units"] + row["low"]["nano"] / 1e9,
+            row["close"]["units"] + row["close"]["nano"] / 1e9,
+            row["volume"]
+        )
+        for row in json.loads(payload)
+    ]
+
+
+def best_of(func, *args, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30 * 24 * 60
+    arrays = make_candles(count)
+
+    json_payload = to_json(arrays)
+    binary_raw = encode_candles(arrays, compress=False)
+    binary_zlib = encode_candles(arrays, compress=True)
+
+    rows = [
+        ("json", len(json_payload), best_of(from_json, json_payload)),
+        ("binary", len(binary_raw), best_of(decode_candles, binary_raw)),
+        ("binary+zlib", len(binary_zlib), best_of(decode_candles, binary_zlib)),
+    ]
+
+    print(f"{count} candles")
+    print(f"{'format':<12} {'size, KiB':>10} {'decode, ms':>11}")
+    for name, size, seconds in rows:
+        print(f"{name:<12} {size / 1024:>10.1f} {seconds * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
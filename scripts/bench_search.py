@@ -0,0 +1,69 @@
+"""
+Время поиска инструментов на синтетическом каталоге.
+
+Запуск: python scripts/bench_search.py [количество_инструментов]
+
+Названия собраны из 25 слов, поэтому у каждой триграммы слова тысячи
+инструментов — худший случай для нечёткого поиска. Цель — меньше 1 мс
+на запрос.
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import random
+import string
+import time
+
+from tinkoff_api.search import InstrumentSearchIndex
+
+WORDS = [
+    "газпром", "сбербанк", "нефть", "капитал", "финанс", "энерго", "транс", "металл", "россия",
+    "холдинг", "инвест", "групп", "банк", "девелопмент", "сталь", "телеком", "ритейл", "фарм",
+    "агро", "золото", "полюс", "лукойл", "новатэк", "мтс", "аэрофлот",
+]
+PREFIX_QUERIES = ["sber", "газп", "нефть капитал", "AB"]
+FUZZY_QUERIES = ["газпрм", "сбербнак", "нефт капитл", "металлл", "телекомм ритейл", "полюс золто"]
+TARGET_MS = 1.0
+
+
+def make_catalog(count: int) -> dict[str, dict]:
+    rng = random.Random(1)
+    catalog = {}
+    for i in range(count):
+        ticker = "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 6)))
+        name = " ".join(rng.sample(WORDS, rng.randint(1, 4))) + f" выпуск {rng.randint(1, 40)}"
+        catalog[f"FIGI{i}"] = {
+            "figi": f"FIGI{i}", "ticker": ticker, "name": name, "type": rng.choice(["share", "bond", "etf"])
+        }
+    return catalog
+
+
+def per_query(index: InstrumentSearchIndex, query: str, repeat: int = 50) -> float:
+    index.search(query)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        index.search(query)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 25_000
+    index = InstrumentSearchIndex()
+    started = time.perf_counter()
+    index.update(make_catalog(count))
+    print(f"{count} instruments, index built in {time.perf_counter() - started:.2f} s")
+
+    worst = 0.0
+    print(f"{'query':<18} {'kind':<6} {'ms':>6}")
+    for kind, queries in (("prefix", PREFIX_QUERIES), ("fuzzy", FUZZY_QUERIES)):
+        for query in queries:
+            seconds = per_query(index, query)
+            worst = max(worst, seconds)
+            print(f"{query:<18} {kind:<6} {seconds * 1000:>6.2f}")
+    status = "достигнута" if worst * 1000 < TARGET_MS else "НЕ достигнута"
+    print(f"цель {TARGET_MS:.0f} мс {status}: максимум {worst * 1000:.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
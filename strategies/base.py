@@ -1,12 +1,263 @@
-import pandas as pd  # Добавить в начало файла
+import numpy as np
+import pandas as pd
+
+# Версия движка бэктеста: меняется вместе с правилами расчёта и
+# сбрасывает кэш сохранённых результатов
+ENGINE_VERSION = 3
+
+
+# Размер порции: промежуточные массивы порции остаются в кэше, а в
+# скользящих окнах значения порции сдвигаются к её опорной точке
+_SEGMENT = 8192
+# Разброс степеней затухания внутри блока экспоненциального среднего
+_EWM_RANGE = 1e3
+# Наибольшая длина блока экспоненциального среднего
+_EWM_BLOCK = 256
+
+
+def _segments(values: np.ndarray, window: int):
+    """Порции окон: (срез результата, значения порции за вычетом опорной точки, опорная точка)"""
+    count = len(values) - window + 1
+    buffer = np.empty(min(_SEGMENT, count) + window - 1)
+    for start in range(0, count, _SEGMENT):
+        stop = min(start + _SEGMENT, count)
+        part = values[start:stop + window - 1]
+        # Опорная точка — значение из середины порции
+        reference = part[len(part) // 2]
+        shifted = np.subtract(part, reference, out=buffer[:len(part)])
+        yield slice(start + window - 1, stop + window - 1), shifted, reference
+
+
+def _window_sums(values: np.ndarray, window: int, out: np.ndarray, scratch: np.ndarray) -> None:
+    """
+    out[i] = sum(values[i:i + window]) попарным сложением, без накопленной
+    суммы: частичные суммы длины 2^k удваиваются, окно собирается из них
+    по двоичной записи window.
+    """
+    count = len(values) - window + 1
+    partial, size, offset = values, 1, 0
+    while True:
+        if window & size:
+            if offset:
+                out += partial[offset:offset + count]
+            else:
+                out[:] = partial[:count]
+            offset += size
+        if size * 2 > window:
+            break
+        length = len(partial) - size
+        partial = np.add(partial[:length], partial[size:size + length], out=scratch[:length])
+        size *= 2
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Скользящее среднее; первые window-1 значений — NaN"""
+    out = np.empty(len(values))
+    if window <= 0 or len(values) < window:
+        out[:] = np.nan
+        return out
+    out[:window - 1] = np.nan
+    scratch = np.empty(min(_SEGMENT, len(values) - window + 1) + window - 1)
+    for rows, shifted, reference in _segments(values, window):
+        mean = out[rows]
+        _window_sums(shifted, window, mean, scratch)
+        mean /= window
+        mean += reference
+    return out
+
+
+def rolling_mean_std(values: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """Скользящие среднее и стандартное отклонение (ddof=1) за один проход"""
+    std = np.empty(len(values))
+    if window <= 1 or len(values) < window:
+        std[:] = np.nan
+        return rolling_mean(values, window), std
+    mean = np.empty(len(values))
+    mean[:window - 1] = np.nan
+    std[:window - 1] = np.nan
+    size = min(_SEGMENT, len(values) - window + 1) + window - 1
+    squares, scratch = np.empty(size), np.empty(size)
+    for rows, shifted, reference in _segments(values, window):
+        part_mean, part_std = mean[rows], std[rows]
+        _window_sums(shifted, window, part_mean, scratch)
+        _window_sums(np.multiply(shifted, shifted, out=squares[:len(shifted)]), window, part_std, scratch)
+        part_mean /= window
+        # sum((x - m)^2) = sum(x^2) - w * m^2 для значений, сдвинутых к опорной
+        # точке порции: суммы малы, и вычитание не теряет точность
+        centered = np.multiply(part_mean, part_mean, out=scratch[:len(part_mean)])
+        centered *= window
+        part_std -= centered
+        np.maximum(part_std, 0.0, out=part_std)
+        part_std /= window - 1
+        np.sqrt(part_std, out=part_std)
+        part_mean += reference
+    return mean, std
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """Скользящее стандартное отклонение (ddof=1, как rolling().std() в pandas)"""
+    return rolling_mean_std(values, window)[1]
+
+
+def _linear_scan(values: np.ndarray, factor: float) -> None:
+    """На месте: values[i] += factor * values[i-1] по последней оси (удвоением шага)"""
+    step = 1
+    while step < values.shape[-1] and factor > 0.0:
+        values[..., step:] += factor * values[..., :-step]
+        factor *= factor
+        step *= 2
+
+
+def ewm_mean(values: np.ndarray, alpha: float, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Экспоненциальное среднее по последней оси, как ewm(alpha, adjust=False).mean().
+
+    Рекурсия y[t] = (1 - alpha) * y[t-1] + alpha * x[t] считается блоками:
+    внутри блока — накопленной суммой со степенями затухания, между блоками
+    переносится только значение на конце предыдущего блока. out может
+    совпадать с values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if out is None:
+        out = np.empty(values.shape)
+    count = values.shape[-1]
+    decay = 1.0 - alpha
+    if count == 0 or decay <= 0.0:
+        out[...] = values
+        return out
+    block = int(min(max(np.log(_EWM_RANGE) / -np.log(decay), 1), _EWM_BLOCK))
+    lead = values.shape[:-1]
+    buffer = np.empty(lead + (max(1, _SEGMENT // block), block))
+    flat = buffer.reshape(lead + (-1,))
+    powers = decay ** np.arange(1, block + 1)
+    weights = alpha * powers[::-1] / decay
+    # Значение перед первым: y[-1] = x[0], тогда y[0] = x[0]
+    state = values[..., 0].copy()
+
+    for start in range(0, count, flat.shape[-1]):
+        stop = min(start + flat.shape[-1], count)
+        blocks = -(-(stop - start) // block)
+        grid = buffer[..., :blocks, :]
+        flat[..., :stop - start] = values[..., start:stop]
+        flat[..., stop - start:] = 0.0
+
+        # Значения на концах блоков: вклад самого блока плюс перенос из предыдущих
+        ends = grid @ weights
+        ends[..., 0] += powers[-1] * state
+        _linear_scan(ends, powers[-1])
+
+        # y[j] = alpha * decay^(j+1) * sum(x[i] / decay^(i+1)) + decay^(j+1) * y[-1]
+        grid /= powers
+        grid[..., 0, 0] += state / alpha
+        grid[..., 1:, 0] += ends[..., :-1] / alpha
+        np.cumsum(grid, axis=-1, out=grid)
+        grid *= alpha * powers
+        out[..., start:stop] = flat[..., :stop - start]
+        state = out[..., stop - 1].copy()
+    return out
+
+
+def run_engine(close: np.ndarray, signal: np.ndarray, hold: bool, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Ядро бэктеста над массивами float64.
+
+    signal: 1 — покупка, -1 — продажа, 0 — нет сигнала. При hold=True позиция
+    держится до противоположного сигнала, иначе позиция равна сигналу бара.
+    Позиция, открытая по закрытию бара i, приносит доходность бара i+1.
+
+    Возвращает массив (3, n): position, returns, equity. Первые значения
+    returns и equity — NaN. out позволяет переиспользовать буфер между прогонами.
+    """
+    n = len(close)
+    if out is None:
+        out = np.empty((3, n))
+    position, returns, equity = out
+    if n == 0:
+        return out
+
+    returns[0] = np.nan
+    equity[0] = np.nan
+    # Бары идут порциями: позиция, доходность и капитал порции считаются,
+    # пока её массивы в кэше; между порциями переносятся позиция и капитал
+    index = np.arange(min(_SEGMENT, n))
+    last = np.empty_like(index)
+    level, capital = 0.0, 1.0
+    for start in range(0, n, _SEGMENT):
+        stop = min(start + _SEGMENT, n)
+        if hold:
+            level = _hold(signal[start:stop], level, position[start:stop], index, last)
+        else:
+            position[start:stop] = signal[start:stop]
+        first = max(start, 1)
+        tail = returns[first:stop]
+        np.divide(close[first:stop], close[first - 1:stop - 1], out=tail)
+        tail -= 1.0
+        tail *= position[first - 1:stop - 1]
+        curve = equity[first:stop]
+        np.add(tail, 1.0, out=curve)
+        if len(curve):
+            curve[0] *= capital
+            np.multiply.accumulate(curve, out=curve)
+            capital = curve[-1]
+    return out
+
+
+def _hold(signal: np.ndarray, level: float, out: np.ndarray, index: np.ndarray, last: np.ndarray) -> float:
+    """
+    Протягивает последний ненулевой сигнал порции в out: индекс последнего
+    сигнала через накопленный максимум. До первого сигнала держится level —
+    позиция на конце прошлой порции. Возвращает позицию на конце порции.
+    """
+    held = np.multiply(index[:len(signal)], signal != 0, out=last[:len(signal)])
+    np.maximum.accumulate(held, out=held)
+    np.take(signal, held, out=out)
+    if signal[0] == 0:
+        out[:np.searchsorted(held, 1)] = level
+    return out[-1]
+
 
 class BaseStrategy:
-    """Базовый класс для торговых стратегий"""
-    
+    """
+    Базовый класс для торговых стратегий.
+
+    Стратегия описывает только ядро сигналов над массивом цен закрытия;
+    позиции, доходность и кривая капитала считаются общим движком.
+    """
+    # Держать позицию до противоположного сигнала (иначе позиция = сигнал бара)
+    hold_position = True
+
+    def signal_kernel(self, close: np.ndarray) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        """Возвращает массив сигналов и индикаторы для отчёта (должен быть переопределен)"""
+        raise NotImplementedError("Метод signal_kernel должен быть реализован в дочерних классах")
+
+    def streaming_indicator(self):
+        """Инкрементальный индикатор для живых сигналов (strategies.indicators)"""
+        raise NotImplementedError("Метод streaming_indicator должен быть реализован в дочерних классах")
+
+    def stream_signal(self, close: float, value, previous) -> float:
+        """Сигнал бара по значению индикатора и его значению на прошлом баре"""
+        raise NotImplementedError("Метод stream_signal должен быть реализован в дочерних классах")
+
+    def backtest_arrays(self, close: np.ndarray, out: np.ndarray | None = None) -> tuple[np.ndarray, dict]:
+        """Бэктест без pandas: (position/returns/equity, индикаторы)"""
+        close = np.ascontiguousarray(close, dtype=np.float64)
+        signal, indicators = self.signal_kernel(close)
+        result = run_engine(close, signal, self.hold_position, out)
+        return result, {**indicators, "signal": signal}
+
     def backtest(self, df: pd.DataFrame) -> dict:
-        """Базовый метод для бэктестирования (должен быть переопределен)"""
-        raise NotImplementedError("Метод backtest должен быть реализован в дочерних классах")
-    
+        """Бэктест на исторических данных; входной DataFrame не изменяется"""
+        close = np.ascontiguousarray(df['close'].to_numpy(dtype=np.float64))
+        (position, returns, equity), indicators = self.backtest_arrays(close)
+        signals = {'close': close, **indicators, 'position': position}
+        # Первая доходность всегда NaN; nansum (с копией массива) — только если NaN есть дальше
+        total = returns[1:].sum()
+        return {
+            'returns': float(total if not np.isnan(total) else np.nansum(returns)),
+            'equity_curve': pd.Series(equity, index=df.index, name='equity', copy=False),
+            'signals': pd.DataFrame(signals, index=df.index, copy=False)
+        }
+
     def __str__(self):
         """Строковое представление стратегии"""
-        return self.__class__.__name__
\ No newline at end of file
+        return self.__class__.__name__
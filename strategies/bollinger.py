@@ -1,6 +1,6 @@
-import pandas as pd
 import numpy as np
-from .base import BaseStrategy
+from .base import BaseStrategy, rolling_mean_std
+from .indicators import StreamingBands
 
 class BollingerBandsStrategy(BaseStrategy):
     """
@@ -19,44 +19,30 @@ class BollingerBandsStrategy(BaseStrategy):
         self.period = period
         self.deviation = deviation
         
-    def calculate_bands(self, df: pd.DataFrame) -> pd.DataFrame:
+    def calculate_bands(self, close: np.ndarray) -> dict[str, np.ndarray]:
         """Расчет полос Боллинджера"""
-        df['sma'] = df['close'].rolling(self.period).mean()
-        df['std'] = df['close'].rolling(self.period).std()
-        df['upper'] = df['sma'] + (df['std'] * self.deviation)
-        df['lower'] = df['sma'] - (df['std'] * self.deviation)
-        return df
-    
-    def backtest(self, df: pd.DataFrame) -> dict:
-        """Запуск бэктеста на исторических данных"""
-        # Рассчитываем полосы
-        df = self.calculate_bands(df)
-        
-        # Генерируем сигналы
-        df['signal'] = 0
-        df['position'] = 0
-        
-        # Условия для покупки (цена ниже нижней полосы)
-        buy_condition = df['close'] < df['lower']
-        
-        # Условия для продажи (цена выше верхней полосы)
-        sell_condition = df['close'] > df['upper']
-        
-        df.loc[buy_condition, 'signal'] = 1
-        df.loc[sell_condition, 'signal'] = -1
-        
-        # Рассчитываем позиции
-        df['position'] = df['signal'].replace(0, method='ffill').fillna(0)
-        
-        # Рассчитываем доходность
-        df['returns'] = df['close'].pct_change() * df['position'].shift(1)
-        df['equity'] = (1 + df['returns']).cumprod()
-        
-        return {
-            'returns': df['returns'].sum(),
-            'equity_curve': df['equity'],
-            'signals': df[['close', 'sma', 'upper', 'lower', 'signal', 'position']]
-        }
-    
+        sma, width = rolling_mean_std(close, self.period)
+        width *= self.deviation
+        return {'sma': sma, 'upper': sma + width, 'lower': sma - width}
+
+    def signal_kernel(self, close: np.ndarray) -> tuple[np.ndarray, dict]:
+        bands = self.calculate_bands(close)
+        signal = np.zeros(len(close))
+        # Покупка — закрытие ниже нижней полосы, продажа — выше верхней
+        np.copyto(signal, 1.0, where=close < bands['lower'])
+        np.copyto(signal, -1.0, where=close > bands['upper'])
+        return signal, bands
+
+    def streaming_indicator(self) -> StreamingBands:
+        return StreamingBands(self.period, self.deviation)
+
+    def stream_signal(self, close: float, bands: tuple, previous) -> float:
+        _, upper, lower = bands
+        if close > upper:
+            return -1.0
+        if close < lower:
+            return 1.0
+        return 0.0
+
     def __str__(self):
         return f"Bollinger Bands (period={self.period}, deviation={self.deviation})"
\ No newline at end of file
@@ -0,0 +1,198 @@
+import math
+
+import numpy as np
+
+# Инкрементальные индикаторы для живых сигналов: O(1) времени и памяти
+# на новую свечу. Совпадают с пакетными версиями из strategies.base с
+# точностью до округления.
+
+
+class StreamingSMA:
+    """
+    Скользящее среднее по кольцевому буферу последних значений.
+
+    Среднее и сумма квадратов отклонений окна (M2, для дисперсии) ведутся
+    по Уэлфорду: новое значение добавляется, выпавшее из окна — убирается.
+    Раз в window свечей оба пересчитываются по буферу заново, чтобы ошибка
+    округления не накапливалась.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ring = np.zeros(max(window, 1))
+        self.value = math.nan
+
+    def update(self, value: float) -> float:
+        slot = self.count % self.window
+        if self.count < self.window:
+            delta = value - self.mean
+            self.mean += delta / (self.count + 1)
+            self.m2 += delta * (value - self.mean)
+        else:
+            dropped = float(self.ring[slot])
+            mean = self.mean + (value - dropped) / self.window
+            self.m2 += (value - dropped) * (value - mean + dropped - self.mean)
+            self.mean = mean
+        self.ring[slot] = value
+        self.count += 1
+        if self.count < self.window:
+            return math.nan
+        if slot == self.window - 1:
+            self.mean = float(self.ring.mean())
+            centered = self.ring - self.mean
+            self.m2 = float(centered @ centered)
+        self.value = self.mean
+        return self.value
+
+    def variance(self) -> float:
+        """Дисперсия окна (ddof=1)"""
+        return max(self.m2, 0.0) / (self.window - 1)
+
+    def snapshot(self) -> dict:
+        return {
+            "window": self.window,
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "ring": self.ring.tolist(),
+            "value": self.value,
+        }
+
+    @classmethod
+    def restore(cls, state: dict) -> "StreamingSMA":
+        indicator = cls(state["window"])
+        indicator.count = state["count"]
+        indicator.mean = state["mean"]
+        indicator.m2 = state["m2"]
+        indicator.ring = np.array(state["ring"], dtype=np.float64)
+        indicator.value = state["value"]
+        return indicator
+
+
+class StreamingBands:
+    """Полосы Боллинджера: среднее и дисперсия окна (ddof=1) из StreamingSMA"""
+
+    def __init__(self, period: int, deviation: float):
+        self.period = period
+        self.deviation = deviation
+        self.sma = StreamingSMA(period)
+        self.value = (math.nan, math.nan, math.nan)
+
+    def update(self, value: float) -> tuple[float, float, float]:
+        """Возвращает (sma, upper, lower)"""
+        mean = self.sma.update(value)
+        if self.period <= 1 or self.sma.count < self.period:
+            self.value = (mean, math.nan, math.nan)
+            return self.value
+        width = math.sqrt(self.sma.variance()) * self.deviation
+        self.value = (mean, mean + width, mean - width)
+        return self.value
+
+    def snapshot(self) -> dict:
+        return {
+            "period": self.period,
+            "deviation": self.deviation,
+            "sma": self.sma.snapshot(),
+            "value": list(self.value),
+        }
+
+    @classmethod
+    def restore(cls, state: dict) -> "StreamingBands":
+        indicator = cls(state["period"], state["deviation"])
+        indicator.sma = StreamingSMA.restore(state["sma"])
+        indicator.value = tuple(state["value"])
+        return indicator
+
+
+class StreamingRSI:
+    """
+    RSI со сглаживанием Уайлдера: два экспоненциальных средних (прирост и
+    падение) и последняя цена. Совпадает с пакетным RSI с точностью до
+    округления в последнем знаке (пакетный считает рекурсию блоками).
+    """
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 1 / period
+        self.last_close = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.value = math.nan
+
+    def update(self, value: float) -> float:
+        delta = 0.0 if self.last_close is None else value - self.last_close
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        if self.last_close is None:
+            self.avg_gain, self.avg_loss = gain, loss
+        else:
+            self.avg_gain = (1 - self.alpha) * self.avg_gain + self.alpha * gain
+            self.avg_loss = (1 - self.alpha) * self.avg_loss + self.alpha * loss
+        self.last_close = value
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = np.float64(self.avg_gain) / np.float64(self.avg_loss)
+            self.value = float(100 - (100 / (1 + rs)))
+        return self.value
+
+    def snapshot(self) -> dict:
+        return {
+            "period": self.period,
+            "last_close": self.last_close,
+            "avg_gain": self.avg_gain,
+            "avg_loss": self.avg_loss,
+            "value": self.value,
+        }
+
+    @classmethod
+    def restore(cls, state: dict) -> "StreamingRSI":
+        indicator = cls(state["period"])
+        indicator.last_close = state["last_close"]
+        indicator.avg_gain = state["avg_gain"]
+        indicator.avg_loss = state["avg_loss"]
+        indicator.value = state["value"]
+        return indicator
+
+
+class LiveSignal:
+    """
+    Сигнал и позиция стратегии по одной свече за раз. Индикатор и правило
+    сигнала берутся у стратегии (streaming_indicator / stream_signal),
+    позиция ведётся так же, как в run_engine.
+    """
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.indicator = strategy.streaming_indicator()
+        self.previous = None
+        self.signal = 0.0
+        self.position = 0.0
+
+    def update(self, close: float) -> float:
+        value = self.indicator.update(float(close))
+        self.signal = self.strategy.stream_signal(float(close), value, self.previous)
+        self.previous = value
+        if not self.strategy.hold_position or self.signal != 0:
+            self.position = self.signal
+        return self.signal
+
+    def snapshot(self) -> dict:
+        previous = list(self.previous) if isinstance(self.previous, tuple) else self.previous
+        return {
+            "indicator": self.indicator.snapshot(),
+            "previous": previous,
+            "signal": self.signal,
+            "position": self.position,
+        }
+
+    @classmethod
+    def restore(cls, strategy, state: dict) -> "LiveSignal":
+        live = cls(strategy)
+        live.indicator = type(live.indicator).restore(state["indicator"])
+        previous = state["previous"]
+        live.previous = tuple(previous) if isinstance(previous, list) else previous
+        live.signal = state["signal"]
+        live.position = state["position"]
+        return live
@@ -1,27 +1,24 @@
-import pandas as pd
 import numpy as np
-from .base import BaseStrategy
+from .base import BaseStrategy, rolling_mean
+from .indicators import StreamingSMA
 
 class MovingAverageStrategy(BaseStrategy):
-    """Стратегия на основе скользящих средних"""
-    
+    """Стратегия на основе скользящих средних: в позиции, пока цена выше MA"""
+    hold_position = False
+
     def __init__(self, window: int = 20):
         self.window = window
-        
-    def backtest(self, df: pd.DataFrame) -> dict:
-        # Реализация бэктеста
-        df['ma'] = df['close'].rolling(self.window).mean()
-        df['signal'] = np.where(df['close'] > df['ma'], 1, 0)
-        df['position'] = df['signal'].shift(1)
-        
-        df['returns'] = df['close'].pct_change() * df['position']
-        df['equity'] = (1 + df['returns']).cumprod()
-        
-        return {
-            'returns': df['returns'].sum(),
-            'equity_curve': df['equity'],
-            'signals': df[['close', 'ma', 'signal', 'position']]
-        }
-    
+
+    def signal_kernel(self, close: np.ndarray) -> tuple[np.ndarray, dict]:
+        ma = rolling_mean(close, self.window)
+        signal = np.greater(close, ma).astype(np.float64)
+        return signal, {'ma': ma}
+
+    def streaming_indicator(self) -> StreamingSMA:
+        return StreamingSMA(self.window)
+
+    def stream_signal(self, close: float, ma: float, previous) -> float:
+        return 1.0 if close > ma else 0.0
+
     def __str__(self):
-        return f"Moving Average (window={self.window})"
\ No newline at end of file
+        return f"Moving Average (window={self.window})"
@@ -0,0 +1,302 @@
+import itertools
+import math
+import os
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from config import OPTIMIZER_BUDGET_SECONDS, OPTIMIZER_WORKERS
+from strategies.registry import STRATEGY_CLASSES
+from utils.logger import logger
+
+# Сколько наборов параметров отдаётся процессу за одну задачу
+OPTIMIZER_CHUNK = 32
+# Метрики в порядке «больше — лучше»
+METRICS = ("sharpe", "total_return", "returns", "max_drawdown", "trades")
+
+# Пространства поиска по умолчанию: список — перебор значений,
+# кортеж (min, max) — непрерывный диапазон (целый, если границы целые)
+DEFAULT_SPACES = {
+    "MA": {"window": list(range(5, 205, 5))},
+    "RSI": {"period": [7, 10, 14, 21, 28], "oversold": [20, 25, 30, 35], "overbought": [65, 70, 75, 80]},
+    "Bollinger": {"period": list(range(10, 65, 5)), "deviation": [1.5, 2.0, 2.5, 3.0]},
+}
+
+# Состояние процесса-воркера: цены из общей памяти и буфер движка
+_worker = {}
+
+
+def _init_worker(shm_name: str, length: int):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["shm"] = shm
+    _worker["close"] = np.ndarray((length,), dtype=np.float64, buffer=shm.buf)
+    _worker["buffer"] = np.empty((3, length))
+
+
+@contextmanager
+def shared_price_pool(close: np.ndarray, workers: int):
+    """
+    Пул процессов, которым цены доступны из общей памяти: массив копируется
+    один раз, задачи передают только параметры.
+
+    workers=1 — расчёт в текущем процессе (в одном потоке), без дочерних
+    процессов: так считают задачи очереди бота, уже занимающие свой процесс.
+    """
+    if workers == 1:
+        _worker.update(close=close, buffer=np.empty((3, len(close))))
+        pool = ThreadPoolExecutor(max_workers=1)
+        try:
+            yield pool
+        finally:
+            # Досчитывающий кусок ещё читает _worker — ждём его
+            pool.shutdown(wait=True, cancel_futures=True)
+            _worker.clear()
+        return
+    shm = shared_memory.SharedMemory(create=True, size=max(close.nbytes, 1))
+    np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)[:] = close
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shm.name, len(close)))
+    try:
+        yield pool
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        shm.close()
+        shm.unlink()
+
+
+def evaluate(strategy, close: np.ndarray, buffer: np.ndarray | None = None, periods_per_year: int = 252) -> dict:
+    """Метрики одного прогона стратегии"""
+    (position, returns, equity), _ = strategy.backtest_arrays(close, buffer)
+    bar_returns = returns[1:]
+    curve = equity[1:]
+    if not len(curve):
+        return dict.fromkeys(METRICS, 0.0)
+    std = bar_returns.std()
+    drawdown = curve / np.maximum.accumulate(curve) - 1
+    return {
+        "sharpe": float(bar_returns.mean() / std * math.sqrt(periods_per_year)) if std > 0 else 0.0,
+        "total_return": float(curve[-1] - 1),
+        "returns": float(bar_returns.sum()),
+        "max_drawdown": float(drawdown.min()),
+        "trades": int(np.count_nonzero(np.diff(position))),
+    }
+
+
+def _run_chunk(strategy_key: str, params_list: list[dict], periods_per_year: int) -> list[dict]:
+    cls = STRATEGY_CLASSES[strategy_key]
+    rows = []
+    for params in params_list:
+        try:
+            metrics = evaluate(cls(**params), _worker["close"], _worker["buffer"], periods_per_year)
+        except Exception as e:
+            metrics = {"error": str(e)}
+        rows.append({**params, **metrics})
+    return rows
+
+
+def grid_points(space: dict) -> list[dict]:
+    """Все сочетания значений; диапазоны в сетке не допускаются"""
+    for name, values in space.items():
+        if isinstance(values, tuple):
+            raise ValueError(f"Для сетки параметр {name} должен быть списком значений")
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def _sample(spec, rng: np.random.Generator):
+    if isinstance(spec, tuple):
+        low, high = spec
+        if isinstance(low, int) and isinstance(high, int):
+            return int(rng.integers(low, high + 1))
+        return float(rng.uniform(low, high))
+    return spec[int(rng.integers(len(spec)))]
+
+
+def random_points(space: dict, trials: int, rng: np.random.Generator) -> list[dict]:
+    return [{name: _sample(spec, rng) for name, spec in space.items()} for _ in range(trials)]
+
+
+class _ParzenProposer:
+    """
+    Байесовский поиск в духе TPE: наблюдения делятся на лучшие и остальные,
+    по каждому параметру строятся оценки плотности l(x) и g(x), и из
+    кандидатов, выбранных вокруг лучших точек, берутся максимизирующие l/g.
+    """
+
+    def __init__(self, space: dict, rng: np.random.Generator, gamma: float = 0.25, candidates: int = 24):
+        self.space = space
+        self.rng = rng
+        self.gamma = gamma
+        self.candidates = candidates
+
+    def propose(self, observed: list[tuple[dict, float]], count: int) -> list[dict]:
+        ordered = sorted(observed, key=lambda item: item[1], reverse=True)
+        split = max(1, int(math.ceil(self.gamma * len(ordered))))
+        good = [params for params, _ in ordered[:split]]
+        bad = [params for params, _ in ordered[split:]] or good
+
+        pool = []
+        for _ in range(count * self.candidates):
+            anchor = good[int(self.rng.integers(len(good)))]
+            pool.append({name: self._near(name, anchor[name]) for name in self.space})
+        scores = [
+            sum(self._log_density(name, params[name], good) - self._log_density(name, params[name], bad)
+                for name in self.space)
+            for params in pool
+        ]
+        return [pool[i] for i in np.argsort(scores)[::-1][:count]]
+
+    def _near(self, name: str, value):
+        spec = self.space[name]
+        if isinstance(spec, tuple):
+            low, high = spec
+            point = np.clip(value + self.rng.normal(0, (high - low) / 10), low, high)
+            return int(round(point)) if isinstance(low, int) and isinstance(high, int) else float(point)
+        # Соседнее значение списка с вероятностью 1/2
+        index = spec.index(value) + int(self.rng.integers(-1, 2))
+        return spec[min(max(index, 0), len(spec) - 1)]
+
+    def _log_density(self, name: str, value, points: list[dict]) -> float:
+        spec = self.space[name]
+        if isinstance(spec, tuple):
+            width = (spec[1] - spec[0]) / max(1.0, math.sqrt(len(points)))
+            centers = np.array([params[name] for params in points], dtype=np.float64)
+            density = np.exp(-0.5 * ((value - centers) / width) ** 2).mean() / width
+        else:
+            matches = sum(1 for params in points if params[name] == value)
+            density = (matches + 1) / (len(points) + len(spec))
+        return math.log(density + 1e-12)
+
+
+class ParameterOptimizer:
+    """
+    Перебор параметров стратегии на пуле процессов.
+
+    Цены один раз копируются в общую память и подключаются каждым
+    процессом при старте, задачи передают только параметры. Каждый
+    процесс переиспользует один буфер движка. Когда бюджет времени
+    исчерпан, невыполненные задачи отменяются, а таблица строится по
+    уже полученным результатам.
+
+        with ParameterOptimizer("RSI", close) as optimizer:
+            table = optimizer.grid(DEFAULT_SPACES["RSI"])
+    """
+
+    def __init__(
+        self,
+        strategy_key: str,
+        close: np.ndarray,
+        workers: int | None = OPTIMIZER_WORKERS,
+        budget: float = OPTIMIZER_BUDGET_SECONDS,
+        metric: str = "sharpe",
+        periods_per_year: int = 252
+    ):
+        if strategy_key not in STRATEGY_CLASSES:
+            raise ValueError(f"Неизвестная стратегия: {strategy_key}")
+        if metric not in METRICS:
+            raise ValueError(f"Неизвестная метрика: {metric}")
+        self.strategy_key = strategy_key
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        self.workers = workers or os.cpu_count() or 1
+        self.budget = budget
+        self.metric = metric
+        self.periods_per_year = periods_per_year
+        self._context = None
+        self._pool = None
+
+    def __enter__(self):
+        self._context = shared_price_pool(self.close, self.workers)
+        self._pool = self._context.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._context.__exit__(*exc)
+        self._context = self._pool = None
+
+    def grid(self, space: dict) -> pd.DataFrame:
+        deadline = time.monotonic() + self.budget
+        points = grid_points(space)
+        rows, timed_out = self._evaluate(points, deadline)
+        return self._table(rows, len(points), timed_out)
+
+    def random(self, space: dict, trials: int, seed: int | None = None) -> pd.DataFrame:
+        deadline = time.monotonic() + self.budget
+        points = _unique(random_points(space, trials, np.random.default_rng(seed)))
+        rows, timed_out = self._evaluate(points, deadline)
+        return self._table(rows, len(points), timed_out)
+
+    def bayesian(self, space: dict, trials: int, seed: int | None = None, warmup: int | None = None) -> pd.DataFrame:
+        """Случайный разогрев, затем партии кандидатов от _ParzenProposer"""
+        deadline = time.monotonic() + self.budget
+        rng = np.random.default_rng(seed)
+        proposer = _ParzenProposer(space, rng)
+        batch = self.workers * OPTIMIZER_CHUNK
+        warmup = min(trials, warmup or max(batch, trials // 5))
+
+        rows, timed_out = self._evaluate(_unique(random_points(space, warmup, rng)), deadline)
+        seen = {_key(row, space) for row in rows}
+        while not timed_out and len(rows) < trials:
+            observed = [
+                ({name: row[name] for name in space}, row[self.metric])
+                for row in rows if "error" not in row
+            ]
+            if not observed:
+                break
+            proposals = [
+                params for params in _unique(proposer.propose(observed, min(batch, trials - len(rows))))
+                if _key(params, space) not in seen
+            ]
+            if not proposals:
+                break
+            seen.update(_key(params, space) for params in proposals)
+            new_rows, timed_out = self._evaluate(proposals, deadline)
+            rows.extend(new_rows)
+        return self._table(rows, trials, timed_out)
+
+    def _evaluate(self, points: list[dict], deadline: float) -> tuple[list[dict], bool]:
+        if self._pool is None:
+            raise RuntimeError("ParameterOptimizer используется вне with")
+        pending = {
+            self._pool.submit(_run_chunk, self.strategy_key, points[i:i + OPTIMIZER_CHUNK], self.periods_per_year)
+            for i in range(0, len(points), OPTIMIZER_CHUNK)
+        }
+        rows = []
+        while pending:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for future in done:
+                rows.extend(future.result())
+        for future in pending:
+            future.cancel()
+        return rows, bool(pending)
+
+    def _table(self, rows: list[dict], requested: int, timed_out: bool) -> pd.DataFrame:
+        table = pd.DataFrame(rows)
+        if self.metric in table:
+            table = table.sort_values(self.metric, ascending=False, na_position="last", ignore_index=True)
+        table.attrs.update({"requested": requested, "completed": len(rows), "timed_out": timed_out})
+        if timed_out:
+            logger.warning(
+                f"Optimizer {self.strategy_key}: budget {self.budget}s exceeded, "
+                f"{len(rows)}/{requested} run(s) completed"
+            )
+        return table
+
+
+def _key(params: dict, space: dict) -> tuple:
+    return tuple(params[name] for name in space)
+
+
+def _unique(points: list[dict]) -> list[dict]:
+    seen, result = set(), []
+    for params in points:
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            result.append(params)
+    return result
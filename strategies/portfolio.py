@@ -0,0 +1,212 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from config import CANDLE_DATA_DIR, OPTIMIZER_WORKERS
+from db.candle_files import CandleFileStore
+from strategies.base import rolling_std
+from strategies.registry import make_strategy
+from utils.logger import logger
+
+ALLOCATIONS = ("equal", "volatility", "fixed")
+# Окно оценки волатильности для распределения по обратной волатильности
+VOLATILITY_WINDOW = 20
+
+# Общая временная ось в процессе-воркере
+_axis = {}
+
+
+@dataclass(frozen=True)
+class CandleSource:
+    """Ряд из локального хранилища свечей: читается прямо в процессе-воркере"""
+    figi: str
+    interval: int
+    root: str = CANDLE_DATA_DIR
+
+    def load(self) -> tuple[np.ndarray, np.ndarray]:
+        arrays = CandleFileStore(self.root).read(self.figi, self.interval)
+        return np.asarray(arrays.time, dtype=np.int64), np.asarray(arrays.close, dtype=np.float64)
+
+
+def _times_and_close(source) -> tuple[np.ndarray, np.ndarray]:
+    """(unix-секунды, цены закрытия) из CandleSource или pd.Series с DatetimeIndex"""
+    if isinstance(source, CandleSource):
+        return source.load()
+    times = pd.DatetimeIndex(source.index).as_unit("s").asi8
+    return times.astype(np.int64), source.to_numpy(dtype=np.float64)
+
+
+def _source_times(source) -> np.ndarray:
+    if isinstance(source, CandleSource):
+        return np.asarray(CandleFileStore(source.root).read(source.figi, source.interval).time, dtype=np.int64)
+    return _times_and_close(source)[0]
+
+
+def _init_axis(shm_name: str, length: int):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _axis["shm"] = shm
+    _axis["times"] = np.ndarray((length,), dtype=np.int64, buffer=shm.buf)
+
+
+def _sleeve(strategy_key: str, params: dict, source, allocation: str, weight: float, vol_window: int) -> tuple:
+    """
+    Доходность «корзины» одного инструмента на общей оси и её вес.
+
+    Стратегия считается по собственным барам инструмента; на барах общей
+    оси, где у инструмента нет свечи, доходность 0. Вес равен 0 до первой
+    свечи (инструмента ещё нет) и после последней.
+    """
+    axis = _axis["times"]
+    times, close = _times_and_close(source)
+    if len(times) < 2:
+        return None
+    (position, returns, _), _ = make_strategy(strategy_key, params).backtest_arrays(close)
+    returns = np.nan_to_num(returns)
+
+    slots = np.searchsorted(axis, times)
+    sleeve = np.zeros(len(axis))
+    sleeve[slots] = returns
+
+    weights = np.zeros(len(axis))
+    if allocation == "volatility":
+        price_returns = np.zeros(len(close))
+        np.divide(close[1:], close[:-1], out=price_returns[1:])
+        price_returns[1:] -= 1.0
+        volatility = rolling_std(price_returns, vol_window)
+        # Вес на баре t известен по закрытию бара t-1
+        inverse = np.zeros(len(close))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse[1:] = np.where(volatility[:-1] > 0, 1.0 / volatility[:-1], 0.0)
+        inverse = np.nan_to_num(inverse, nan=0.0, posinf=0.0)
+        # Протягиваем вес инструмента на бары общей оси без его свечей
+        last = np.searchsorted(slots, np.arange(slots[0], slots[-1] + 1), side="right") - 1
+        weights[slots[0]:slots[-1] + 1] = inverse[last]
+    else:
+        weights[slots[0]:slots[-1] + 1] = weight
+
+    stats = {
+        "total_return": float(np.prod(1 + returns) - 1),
+        "trades": int(np.count_nonzero(np.diff(position))),
+        "bars": len(close),
+    }
+    return sleeve, weights, stats
+
+
+def portfolio_backtest(
+    strategy_key: str,
+    sources: dict,
+    params: dict | None = None,
+    allocation: str = "equal",
+    weights: dict[str, float] | None = None,
+    vol_window: int = VOLATILITY_WINDOW,
+    workers: int | None = OPTIMIZER_WORKERS
+) -> dict:
+    """
+    Бэктест стратегии на корзине инструментов.
+
+    sources: {название: pd.Series цен закрытия с DatetimeIndex | CandleSource}.
+    Каждый инструмент считается в отдельном процессе; ряды из хранилища
+    читаются воркером напрямую. Инструменты выравниваются по объединённой
+    временной оси (в общей памяти), капитал делится между ними правилом
+    allocation и перераспределяется на каждом баре:
+
+    - equal — поровну между инструментами, торгующимися на баре;
+    - volatility — пропорционально 1/σ доходностей за vol_window баров;
+    - fixed — доли weights; доля инструмента без данных остаётся в деньгах.
+
+    Родитель держит только сумму вкладов и сумму весов по оси и не более
+    2×workers результатов одновременно, поэтому память не растёт с числом
+    инструментов. workers=1 — инструменты по очереди в текущем процессе,
+    без пула процессов (так считают задачи очереди бота).
+    """
+    if allocation not in ALLOCATIONS:
+        raise ValueError(f"Неизвестное распределение: {allocation}")
+    if not sources:
+        raise ValueError("Корзина пуста")
+    fixed = {}
+    if allocation == "fixed":
+        if not weights:
+            raise ValueError("Для fixed нужны веса инструментов")
+        total = sum(weights.values())
+        fixed = {name: weights.get(name, 0.0) / total for name in sources}
+
+    axis = np.zeros(0, dtype=np.int64)
+    for source in sources.values():
+        axis = np.union1d(axis, _source_times(source))
+    if len(axis) < 2:
+        raise ValueError("Недостаточно данных для бэктеста корзины")
+
+    contribution = np.zeros(len(axis))
+    weight_sum = np.zeros(len(axis))
+    assets = []
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        # Задача очереди бота: инструменты по очереди в текущем процессе
+        shm = None
+        _axis["times"] = axis
+        executor = ThreadPoolExecutor(1)
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=axis.nbytes)
+        np.ndarray(axis.shape, dtype=np.int64, buffer=shm.buf)[:] = axis
+        executor = ProcessPoolExecutor(workers, initializer=_init_axis, initargs=(shm.name, len(axis)))
+    try:
+        with executor as pool:
+            queue = iter(sources.items())
+            pending = {}
+
+            def submit_next():
+                item = next(queue, None)
+                if item is not None:
+                    name, source = item
+                    future = pool.submit(
+                        _sleeve, strategy_key, params or {}, source, allocation, fixed.get(name, 1.0), vol_window
+                    )
+                    pending[future] = name
+
+            for _ in range(2 * workers):
+                submit_next()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    result = future.result()
+                    submit_next()
+                    if result is None:
+                        logger.warning(f"Portfolio backtest: no data for {name}")
+                        continue
+                    sleeve, sleeve_weights, stats = result
+                    sleeve *= sleeve_weights
+                    contribution += sleeve
+                    weight_sum += sleeve_weights
+                    assets.append({"asset": name, "weight": float(sleeve_weights.mean()), **stats})
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        else:
+            _axis.clear()
+
+    if allocation == "fixed":
+        returns = contribution
+    else:
+        returns = np.divide(contribution, weight_sum, out=np.zeros(len(axis)), where=weight_sum > 0)
+    equity = np.cumprod(1 + returns)
+    index = pd.to_datetime(axis, unit="s", utc=True)
+    table = pd.DataFrame(assets)
+    if len(table):
+        table["weight"] /= table["weight"].sum() or 1.0
+        table = table.sort_values("total_return", ascending=False, ignore_index=True)
+    logger.info(
+        f"Portfolio backtest {strategy_key}: {len(assets)}/{len(sources)} asset(s), "
+        f"{len(axis)} bar(s), return {equity[-1] - 1:.2%}"
+    )
+    return {
+        "returns": float(returns.sum()),
+        "equity_curve": pd.Series(equity, index=index, name="equity"),
+        "assets": table
+    }
@@ -0,0 +1,18 @@
+from .base import BaseStrategy
+from .bollinger import BollingerBandsStrategy
+from .ma import MovingAverageStrategy
+from .rsi import RSIStrategy
+
+# Ключи совпадают с handlers.strategy.STRATEGIES
+STRATEGY_CLASSES = {
+    "MA": MovingAverageStrategy,
+    "RSI": RSIStrategy,
+    "Bollinger": BollingerBandsStrategy,
+}
+
+
+def make_strategy(key: str, params: dict | None = None) -> BaseStrategy:
+    """Стратегия по ключу; неизвестный ключ — MA с параметрами по умолчанию"""
+    if key not in STRATEGY_CLASSES:
+        return MovingAverageStrategy()
+    return STRATEGY_CLASSES[key](**(params or {}))
@@ -1,6 +1,6 @@
-import pandas as pd
 import numpy as np
-from .base import BaseStrategy
+from .base import BaseStrategy, ewm_mean
+from .indicators import StreamingRSI
 
 
 class RSIStrategy(BaseStrategy):
@@ -22,54 +22,47 @@ class RSIStrategy(BaseStrategy):
         self.oversold = oversold
         self.overbought = overbought
         
-    def calculate_rsi(self, df: pd.DataFrame) -> pd.Series:
-        """Расчет индикатора RSI"""
-        delta = df['close'].diff()
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-        
-        avg_gain = gain.ewm(alpha=1/self.period, adjust=False).mean()
-        avg_loss = loss.ewm(alpha=1/self.period, adjust=False).mean()
-        
-        rs = avg_gain / avg_loss
-        return 100 - (100 / (1 + rs))
-    
-    def backtest(self, df: pd.DataFrame) -> dict:
-        """Запуск бэктеста на исторических данных"""
-        # Рассчитываем RSI
-        df['rsi'] = self.calculate_rsi(df)
-        
-        # Генерируем сигналы
-        df['signal'] = 0
-        df['position'] = 0
-        
-        # Условия для покупки
-        buy_condition = (
-            (df['rsi'] < self.oversold) & 
-            (df['rsi'].shift(1) < df['rsi'])
-        )
-        
-        # Условия для продажи
-        sell_condition = (
-            (df['rsi'] > self.overbought) & 
-            (df['rsi'].shift(1) > df['rsi'])
-        )
-        
-        df.loc[buy_condition, 'signal'] = 1
-        df.loc[sell_condition, 'signal'] = -1
-        
-        # Рассчитываем позиции
-        df['position'] = df['signal'].replace(0, method='ffill').fillna(0)
-        
-        # Рассчитываем доходность
-        df['returns'] = df['close'].pct_change() * df['position'].shift(1)
-        df['equity'] = (1 + df['returns']).cumprod()
-        
-        return {
-            'returns': df['returns'].sum(),
-            'equity_curve': df['equity'],
-            'signals': df[['close', 'rsi', 'signal', 'position']]
-        }
-    
+    def calculate_rsi(self, close: np.ndarray) -> np.ndarray:
+        """Расчет индикатора RSI (сглаживание Уайлдера)"""
+        # Рост и падение цены в одном массиве (2, n): оба сглаживания — за один проход
+        moves = np.empty((2, len(close)))
+        moves[:, :1] = 0.0
+        np.subtract(close[1:], close[:-1], out=moves[0, 1:])
+        np.negative(moves[0, 1:], out=moves[1, 1:])
+        np.maximum(moves, 0.0, out=moves)
+        avg_gain, avg_loss = ewm_mean(moves, 1 / self.period, out=moves)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.divide(avg_gain, avg_loss)
+        rsi += 1
+        np.divide(100, rsi, out=rsi)
+        np.subtract(100, rsi, out=rsi)
+        return rsi
+
+    def signal_kernel(self, close: np.ndarray) -> tuple[np.ndarray, dict]:
+        rsi = self.calculate_rsi(close)
+        rising = np.zeros(len(rsi), dtype=bool)
+        falling = np.zeros(len(rsi), dtype=bool)
+        np.less(rsi[:-1], rsi[1:], out=rising[1:])
+        np.greater(rsi[:-1], rsi[1:], out=falling[1:])
+
+        signal = np.zeros(len(rsi))
+        # Покупка: RSI ниже oversold и начал расти; продажа: выше overbought и начал падать
+        np.copyto(signal, 1.0, where=(rsi < self.oversold) & rising)
+        np.copyto(signal, -1.0, where=(rsi > self.overbought) & falling)
+        return signal, {'rsi': rsi}
+
+    def streaming_indicator(self) -> StreamingRSI:
+        return StreamingRSI(self.period)
+
+    def stream_signal(self, close: float, rsi: float, previous: float | None) -> float:
+        if previous is None:
+            return 0.0
+        if rsi < self.oversold and previous < rsi:
+            return 1.0
+        if rsi > self.overbought and previous > rsi:
+            return -1.0
+        return 0.0
+
     def __str__(self):
         return f"RSI Strategy (period={self.period}, oversold={self.oversold}, overbought={self.overbought})"
\ No newline at end of file
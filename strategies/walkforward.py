@@ -0,0 +1,159 @@
+import math
+import os
+from concurrent.futures import wait
+
+import numpy as np
+import pandas as pd
+
+from config import OPTIMIZER_WORKERS
+from strategies.optimizer import DEFAULT_SPACES, OPTIMIZER_CHUNK, _worker, grid_points, shared_price_pool
+from strategies.registry import STRATEGY_CLASSES
+from utils.logger import logger
+
+WALK_FORWARD_METRICS = ("sharpe", "total_return")
+# Ограничение снизу для доходности бара перед log1p (позиция не может потерять больше 100%)
+_MIN_BAR_RETURN = -0.999999
+
+
+def rolling_windows(length: int, train: int, test: int, step: int | None = None, anchored: bool = False) -> np.ndarray:
+    """
+    Окна (train_start, train_end, test_end) по индексам баров: обучение на
+    [train_start, train_end), проверка на [train_end, test_end).
+    anchored=True — обучающее окно всегда начинается с первого бара.
+    """
+    step = step or test
+    windows = []
+    start = 0
+    while start + train + test <= length:
+        windows.append((0 if anchored else start, start + train, start + train + test))
+        start += step
+    return np.array(windows, dtype=np.int64).reshape(-1, 3)
+
+
+def default_windows(length: int, folds: int = 5, train_ratio: int = 3) -> np.ndarray:
+    """folds последовательных проверочных окон, обучение в train_ratio раз длиннее"""
+    test = length // (folds + train_ratio)
+    if test < 2:
+        raise ValueError(f"Слишком короткая история для {folds} окон: {length} баров")
+    return rolling_windows(length, train=test * train_ratio, test=test)
+
+
+def bar_returns(strategy, close: np.ndarray, buffer: np.ndarray | None = None) -> np.ndarray:
+    """Доходности баров на всей истории (первая — 0 вместо NaN)"""
+    (_, returns, _), _ = strategy.backtest_arrays(close, buffer)
+    returns = np.nan_to_num(returns, copy=True)
+    returns[0] = 0.0
+    return returns
+
+
+def window_scores(returns: np.ndarray, starts: np.ndarray, ends: np.ndarray, metric: str, periods_per_year: int) -> np.ndarray:
+    """
+    Метрика на множестве окон [start, end) за O(1) на окно: по накопленным
+    суммам доходностей, их квадратов и логарифмов.
+    """
+    counts = (ends - starts).astype(np.float64)
+    if metric == "total_return":
+        logs = np.concatenate(([0.0], np.cumsum(np.log1p(np.maximum(returns, _MIN_BAR_RETURN)))))
+        return np.expm1(logs[ends] - logs[starts])
+
+    sums = np.concatenate(([0.0], np.cumsum(returns)))
+    squares = np.concatenate(([0.0], np.cumsum(returns * returns)))
+    mean = (sums[ends] - sums[starts]) / counts
+    variance = np.maximum((squares[ends] - squares[starts]) / counts - mean * mean, 0.0)
+    std = np.sqrt(variance)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(std > 0, mean / std * math.sqrt(periods_per_year), 0.0)
+
+
+def _score_chunk(strategy_key: str, params_list: list[dict], windows: np.ndarray, metric: str, periods_per_year: int) -> np.ndarray:
+    """
+    Оценки набора параметров на всех обучающих окнах. Индикаторы и позиции
+    считаются один раз по всей истории (они причинны), окна берут срезы.
+    """
+    cls = STRATEGY_CLASSES[strategy_key]
+    # Первый бар окна не учитывается: его доходность приходит из предыдущего бара
+    starts, ends = windows[:, 0] + 1, windows[:, 1]
+    scores = np.full((len(params_list), len(windows)), -np.inf)
+    for row, params in enumerate(params_list):
+        try:
+            returns = bar_returns(cls(**params), _worker["close"], _worker["buffer"])
+        except Exception:
+            continue
+        scores[row] = np.nan_to_num(window_scores(returns, starts, ends, metric, periods_per_year), nan=-np.inf)
+    return scores
+
+
+def walk_forward(
+    strategy_key: str,
+    close: np.ndarray,
+    windows: np.ndarray | None = None,
+    space: dict | None = None,
+    metric: str = "sharpe",
+    workers: int | None = OPTIMIZER_WORKERS,
+    periods_per_year: int = 252,
+    index: pd.Index | None = None
+) -> dict:
+    """
+    Walk-forward проверка: на каждом обучающем окне выбираются лучшие по
+    metric параметры из сетки space, они применяются к следующему
+    проверочному окну, а проверочные доходности склеиваются в одну кривую.
+
+    Наборы параметров считаются параллельно на пуле процессов с ценами в
+    общей памяти. Каждый набор прогоняется по истории один раз, и все окна
+    оцениваются по его доходностям, без пересчёта индикаторов на срезах.
+
+    Результат совместим с BaseStrategy.backtest: returns, equity_curve и
+    windows — таблица окон с выбранными параметрами и метриками.
+    """
+    if metric not in WALK_FORWARD_METRICS:
+        raise ValueError(f"Неизвестная метрика: {metric}")
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    windows = default_windows(len(close)) if windows is None else np.asarray(windows, dtype=np.int64)
+    if not len(windows):
+        raise ValueError("Нет ни одного окна walk-forward")
+    if (windows[1:, 1] < windows[:-1, 2]).any():
+        raise ValueError("Проверочные окна не должны перекрываться")
+    points = grid_points(space or DEFAULT_SPACES[strategy_key])
+    workers = workers or os.cpu_count() or 1
+
+    with shared_price_pool(close, workers) as pool:
+        futures = [
+            pool.submit(_score_chunk, strategy_key, points[i:i + OPTIMIZER_CHUNK], windows, metric, periods_per_year)
+            for i in range(0, len(points), OPTIMIZER_CHUNK)
+        ]
+        wait(futures)
+        scores = np.vstack([future.result() for future in futures])
+
+    best = scores.argmax(axis=0)
+    cls = STRATEGY_CLASSES[strategy_key]
+    winners = {}
+    rows, pieces = [], []
+    for number, (train_start, train_end, test_end) in enumerate(windows):
+        choice = int(best[number])
+        if choice not in winners:
+            winners[choice] = bar_returns(cls(**points[choice]), close)
+        test_returns = winners[choice][train_end:test_end]
+        pieces.append(test_returns)
+        test_starts, test_ends = np.array([train_end]), np.array([test_end])
+        rows.append({
+            "train_start": int(train_start),
+            "train_end": int(train_end),
+            "test_end": int(test_end),
+            **points[choice],
+            f"train_{metric}": float(scores[choice, number]),
+            f"test_{metric}": float(window_scores(winners[choice], test_starts, test_ends, metric, periods_per_year)[0]),
+        })
+
+    oos_returns = np.concatenate(pieces)
+    equity = np.cumprod(1 + oos_returns)
+    positions = np.concatenate([np.arange(start, end) for _, start, end in windows])
+    curve_index = index[positions] if index is not None else pd.Index(positions)
+    logger.info(
+        f"Walk-forward {strategy_key}: {len(windows)} window(s), {len(points)} parameter set(s), "
+        f"out-of-sample return {equity[-1] - 1:.2%}"
+    )
+    return {
+        "returns": float(oos_returns.sum()),
+        "equity_curve": pd.Series(equity, index=curve_index, name="equity"),
+        "windows": pd.DataFrame(rows)
+    }
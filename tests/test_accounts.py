@@ -0,0 +1,94 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+import tinkoff_api.accounts as accounts
+from tinkoff_api.accounts import AccountRegistry, close_sandbox_account, open_sandbox_account
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class FakeSandbox:
+    def __init__(self):
+        self.accounts = ["acc-1"]
+        self.calls = 0
+
+    async def get_sandbox_accounts(self):
+        self.calls += 1
+        return SimpleNamespace(accounts=[SimpleNamespace(id=account) for account in self.accounts])
+
+    async def open_sandbox_account(self):
+        account = f"acc-{len(self.accounts) + 1}"
+        self.accounts.append(account)
+        return SimpleNamespace(account_id=account)
+
+    async def close_sandbox_account(self, account_id):
+        self.accounts.remove(account_id)
+
+
+@pytest.fixture
+def sandbox(monkeypatch):
+    redis, api = FakeRedis(), FakeSandbox()
+
+    async def get_redis():
+        return redis
+
+    @asynccontextmanager
+    async def tinkoff_client(*args, **kwargs):
+        yield SimpleNamespace(sandbox=api)
+
+    monkeypatch.setattr(accounts, "get_redis", get_redis)
+    monkeypatch.setattr(accounts, "tinkoff_client", tinkoff_client)
+    AccountRegistry._accounts.clear()
+    yield redis, api
+    AccountRegistry._accounts.clear()
+
+
+@pytest.mark.asyncio
+async def test_accounts_are_cached_in_memory_and_redis(sandbox):
+    redis, api = sandbox
+    registry = AccountRegistry(sandbox=True)
+    assert await registry.get_accounts() == ["acc-1"]
+    assert await registry.get_accounts() == ["acc-1"]
+    assert api.calls == 1
+    assert registry._cache_key in redis.data
+
+    # Новый процесс: память пуста, счета берутся из Redis
+    AccountRegistry._accounts.clear()
+    assert await AccountRegistry(sandbox=True).get_accounts() == ["acc-1"]
+    assert api.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_open_and_close_invalidate_both_caches(sandbox):
+    redis, api = sandbox
+    registry = AccountRegistry(sandbox=True)
+    await registry.get_accounts()
+
+    opened = await open_sandbox_account()
+    assert registry._cache_key not in AccountRegistry._accounts
+    assert registry._cache_key not in redis.data
+    assert await registry.get_accounts() == ["acc-1", opened]
+    assert api.calls == 2
+
+    await close_sandbox_account("acc-1")
+    assert registry._cache_key not in AccountRegistry._accounts
+    assert registry._cache_key not in redis.data
+    assert await registry.get_accounts() == [opened]
+    assert api.calls == 3
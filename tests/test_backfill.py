@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import tinkoff_api.backfill as backfill_module
+from tinkoff_api.backfill import Backfill, plan_chunks
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+END = START + timedelta(days=10)
+
+
+class MemoryCheckpoint:
+    def __init__(self):
+        self.states = {}
+
+    async def load(self):
+        return dict(self.states)
+
+    async def save(self, figi, state):
+        self.states[figi] = state
+
+
+def test_plan_chunks_covers_range():
+    chunks = plan_chunks(START, START + timedelta(days=2, hours=6), timedelta(days=1))
+    assert len(chunks) == 3
+    assert chunks[0][0] == START
+    assert chunks[-1] == (START + timedelta(days=2), START + timedelta(days=2, hours=6))
+
+
+@pytest.mark.asyncio
+async def test_interrupted_backfill_resumes(monkeypatch):
+    monkeypatch.setattr(backfill_module, "BACKFILL_FLUSH_CHUNKS", 2)
+    monkeypatch.setattr(backfill_module, "BACKFILL_BACKOFF_SECONDS", 0)
+    fetched, written = [], []
+    broken = {"from": START + timedelta(days=5)}
+
+    async def fetcher(figi, from_, to, interval):
+        if figi == "F2" and from_ == broken["from"]:
+            raise RuntimeError("UNAVAILABLE")
+        fetched.append((figi, from_))
+        return [from_]
+
+    async def sink(figi, interval, candles, from_, to):
+        written.append((figi, from_, to, len(candles)))
+
+    checkpoint = MemoryCheckpoint()
+
+    def job():
+        return Backfill(
+            ["F1", "F2"], 1, START, END, fetcher, sink,
+            span=timedelta(days=1), retries=1, checkpoint=checkpoint
+        )
+
+    first = await job().run()
+    assert first["done"] == 1
+    assert first["failed"] == ["F2"]
+    # Чекпоинт F2 стоит на последней записанной границе
+    assert checkpoint.states["F2"]["next"] == (START + timedelta(days=4)).timestamp()
+
+    broken["from"] = None
+    fetched.clear()
+    second = await job().run()
+    assert second["done"] == 2
+    assert second["candles"] == 20
+    # Второй запуск не перекачивает ни F1, ни уже записанное по F2
+    assert [from_ for _, from_ in fetched] == [START + timedelta(days=d) for d in range(4, 10)]
@@ -0,0 +1,94 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import db.backtest_cache as backtest_cache
+from db.backtest_cache import BacktestCache, cache_key, dataset_identity, summarize
+from db.models import Base
+from db.session import add_missing_columns
+from strategies.ma import MovingAverageStrategy
+from utils.mocks import generate_mock_candles
+
+
+@pytest_asyncio.fixture
+async def cache(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(backtest_cache, "async_session", sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    BacktestCache._entries.clear()
+    yield BacktestCache()
+    BacktestCache._entries.clear()
+    await engine.dispose()
+
+
+def test_key_depends_on_params_and_data():
+    df = generate_mock_candles(200)
+    identity = dataset_identity(df)
+    assert cache_key(MovingAverageStrategy(20), *identity) == cache_key(MovingAverageStrategy(20), *identity)
+    assert cache_key(MovingAverageStrategy(20), *identity) != cache_key(MovingAverageStrategy(30), *identity)
+    assert dataset_identity(generate_mock_candles(300)) != identity
+
+
+@pytest.mark.asyncio
+async def test_result_survives_memory_eviction(cache):
+    strategy = MovingAverageStrategy(20)
+    df = generate_mock_candles(200)
+    key = cache_key(strategy, "FIGI:day", "200:1")
+    assert await cache.get(key) is None
+
+    results = strategy.backtest(df)
+    await cache.put(key, 1, strategy, "FIGI:day", "200:1", summarize(strategy, results), b"png")
+    BacktestCache._entries.clear()
+
+    entry = await cache.get(key)
+    assert entry["chart"] == b"png"
+    assert entry["returns"] == pytest.approx(results["returns"])
+    assert entry["params"] == {"window": 20}
+    assert len(entry["equity"]) == 200
+    assert cache.stats()["db_hits"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_new_data_version_drops_stale_results(cache):
+    strategy = MovingAverageStrategy(20)
+    results = strategy.backtest(generate_mock_candles(200))
+    old_key = cache_key(strategy, "FIGI:day", "200:1")
+    new_key = cache_key(strategy, "FIGI:day", "201:2")
+
+    await cache.put(old_key, 1, strategy, "FIGI:day", "200:1", summarize(strategy, results), b"old")
+    await cache.put(new_key, 1, strategy, "FIGI:day", "201:2", summarize(strategy, results), b"new")
+
+    assert await cache.get(old_key) is None
+    assert (await cache.get(new_key))["chart"] == b"new"
+
+
+@pytest.mark.asyncio
+async def test_duplicate_put_keeps_first_row(cache):
+    # Две одинаковые задачи досчитались одновременно — вторая запись не падает на уникальном ключе
+    strategy = MovingAverageStrategy(20)
+    results = strategy.backtest(generate_mock_candles(200))
+    key = cache_key(strategy, "FIGI:day", "200:1")
+    await cache.put(key, 1, strategy, "FIGI:day", "200:1", summarize(strategy, results), b"first")
+    await cache.put(key, 2, strategy, "FIGI:day", "200:1", summarize(strategy, results), b"second")
+
+    async with backtest_cache.async_session() as session:
+        rows = (await session.execute(text("SELECT user_id, chart FROM backtest_results"))).all()
+    assert rows == [(1, b"first")]
+
+
+@pytest.mark.asyncio
+async def test_add_missing_columns_upgrades_old_table():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE backtest_results (id INTEGER PRIMARY KEY, user_id INTEGER, "
+            "strategy VARCHAR, result_json VARCHAR, created_at DATETIME)"
+        ))
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+        columns = await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns("backtest_results")})
+    await engine.dispose()
+    assert {"cache_key", "dataset_id", "dataset_version", "chart"} <= columns
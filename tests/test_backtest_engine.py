@@ -0,0 +1,105 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+from strategies.base import ewm_mean, rolling_mean, rolling_mean_std, rolling_std, run_engine
+from strategies.bollinger import BollingerBandsStrategy
+from strategies.ma import MovingAverageStrategy
+from strategies.rsi import RSIStrategy
+
+
+def candles(count=2000, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"close": 100 + np.cumsum(rng.normal(0, 1, count))})
+
+
+def legacy_returns(df, signal, hold):
+    """Прежний расчёт на pandas: позиции, доходность и капитал"""
+    signal = pd.Series(signal, index=df.index)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        position = signal.replace(0, method="ffill").fillna(0) if hold else signal
+    returns = df["close"].pct_change() * position.shift(1)
+    return returns, (1 + returns).cumprod()
+
+
+def test_rolling_helpers_match_pandas():
+    close = candles()["close"]
+    np.testing.assert_allclose(rolling_mean(close.to_numpy(), 20), close.rolling(20).mean(), rtol=1e-10)
+    np.testing.assert_allclose(rolling_std(close.to_numpy(), 20), close.rolling(20).std(), rtol=1e-7)
+
+
+def test_rolling_std_stable_on_long_drifting_series():
+    rng = np.random.default_rng(7)
+    count = 500_000
+    walk = 100 * np.exp(np.cumsum(rng.normal(1e-5, 0.002, count)))
+    mean, std = rolling_mean_std(walk, 20)
+    np.testing.assert_allclose(std, pd.Series(walk).rolling(20).std(), rtol=1e-7)
+    np.testing.assert_allclose(mean, pd.Series(walk).rolling(20).mean(), rtol=1e-12)
+
+    # На сильном тренде ошибается и pandas (~1e-4), поэтому сравнение — с прямым расчётом по окнам
+    trend = 100 + np.arange(count, dtype=np.float64) + rng.normal(0, 0.01, count)
+    exact = sliding_window_view(trend, 20).std(axis=1, ddof=1)
+    np.testing.assert_allclose(rolling_std(trend, 20)[19:], exact, rtol=1e-9)
+
+
+@pytest.mark.parametrize("alpha", [1.0, 0.5, 1 / 14, 0.001])
+def test_ewm_mean_matches_pandas(alpha):
+    rng = np.random.default_rng(11)
+    values = np.cumsum(rng.normal(0, 1, (2, 50_000)), axis=1)
+    expected = [pd.Series(row).ewm(alpha=alpha, adjust=False).mean() for row in values]
+    np.testing.assert_allclose(ewm_mean(values, alpha), expected, rtol=1e-11, atol=1e-12)
+    np.testing.assert_allclose(ewm_mean(values, alpha, out=values), expected, rtol=1e-11, atol=1e-12)
+
+
+@pytest.mark.parametrize("hold", [True, False])
+def test_engine_matches_pandas(hold):
+    # Длиннее порции движка: позиция и капитал переносятся между порциями
+    df = candles(20_000)
+    signal = np.random.default_rng(1).choice([-1.0, 0.0, 1.0], size=len(df), p=[0.05, 0.9, 0.05])
+    position, returns, equity = run_engine(df["close"].to_numpy(), signal, hold)
+    expected_returns, expected_equity = legacy_returns(df, signal, hold)
+    np.testing.assert_allclose(returns, expected_returns, rtol=1e-12)
+    np.testing.assert_allclose(equity, expected_equity, rtol=1e-10)
+
+
+def test_ma_matches_legacy():
+    df = candles()
+    result = MovingAverageStrategy(window=20).backtest(df)
+    ma = df["close"].rolling(20).mean()
+    legacy_signal = np.where(df["close"] > ma, 1.0, 0.0)
+    _, equity = legacy_returns(df, legacy_signal, hold=False)
+    np.testing.assert_array_equal(result["signals"]["signal"], legacy_signal)
+    np.testing.assert_allclose(result["equity_curve"], equity, rtol=1e-10)
+
+
+def test_rsi_and_bollinger_match_legacy():
+    df = candles()
+    close = df["close"]
+
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).ewm(alpha=1 / 14, adjust=False).mean()
+    loss = (-delta.where(delta < 0, 0)).ewm(alpha=1 / 14, adjust=False).mean()
+    rsi = 100 - 100 / (1 + gain / loss)
+    rsi_signal = np.where((rsi < 30) & (rsi.shift(1) < rsi), 1.0, np.where((rsi > 70) & (rsi.shift(1) > rsi), -1.0, 0.0))
+
+    sma, std = close.rolling(20).mean(), close.rolling(20).std()
+    bb_signal = np.where(close < sma - 2 * std, 1.0, np.where(close > sma + 2 * std, -1.0, 0.0))
+
+    for strategy, signal in ((RSIStrategy(), rsi_signal), (BollingerBandsStrategy(), bb_signal)):
+        result = strategy.backtest(df)
+        returns, equity = legacy_returns(df, signal, hold=True)
+        np.testing.assert_array_equal(result["signals"]["signal"], signal)
+        np.testing.assert_allclose(result["equity_curve"], equity, rtol=1e-10)
+        assert result["returns"] == pytest.approx(returns.sum())
+
+
+def test_backtest_does_not_mutate_input():
+    df = candles(300)
+    columns = list(df.columns)
+    for strategy in (MovingAverageStrategy(), RSIStrategy(), BollingerBandsStrategy()):
+        strategy.backtest(df)
+    assert list(df.columns) == columns
@@ -0,0 +1,229 @@
+import asyncio
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import db.backtest_cache as backtest_cache
+from config import BACKTEST_USER_JOBS
+from db.backtest_cache import BacktestCache, cache_key, dataset_identity
+from db.models import Base
+from strategies.ma import MovingAverageStrategy
+from strategies.optimizer import ParameterOptimizer
+from utils.backtest_jobs import BacktestJob, BacktestJobs, ComputeJob, JobLimitError, load_source
+from utils.mocks import generate_mock_candles
+
+
+class FakeBot:
+    def __init__(self):
+        self.edits = []
+        self.photos = []
+        self.messages = []
+
+    async def edit_message_text(self, text, chat_id, message_id, reply_markup=None):
+        self.edits.append(text)
+
+    async def send_photo(self, chat_id, photo, caption, reply_to_message_id=None):
+        self.photos.append((photo, caption))
+
+    async def send_message(self, chat_id, text, parse_mode=None, reply_to_message_id=None):
+        self.messages.append(text)
+
+
+@pytest_asyncio.fixture
+async def jobs(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setattr(backtest_cache, "async_session", sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    BacktestCache._entries.clear()
+    BacktestJobs._jobs.clear()
+    bot = FakeBot()
+    await BacktestJobs().start(bot, workers=1)
+    yield BacktestJobs(), bot
+    await BacktestJobs().stop()
+    BacktestJobs._jobs.clear()
+    BacktestCache._entries.clear()
+    await engine.dispose()
+
+
+def make_job(user_id: int = 1) -> BacktestJob:
+    strategy = MovingAverageStrategy(20)
+    df = generate_mock_candles(200)
+    dataset_id, dataset_version = dataset_identity(df)
+    return BacktestJob(
+        user_id=user_id,
+        chat_id=10,
+        message_id=20,
+        strategy_key="MA",
+        params={"window": 20},
+        source=("mock", 200),
+        label="тестовые данные",
+        cache_key=cache_key(strategy, dataset_id, dataset_version),
+        dataset_id=dataset_id,
+        dataset_version=dataset_version
+    )
+
+
+async def wait_idle(jobs: BacktestJobs):
+    for _ in range(600):
+        if not any(job.status in ("queued", "running") for job in jobs._jobs.values()):
+            return
+        await asyncio.sleep(0.1)
+    raise AssertionError("очередь не опустела")
+
+
+@pytest.mark.asyncio
+async def test_job_runs_off_loop_and_fills_cache(jobs):
+    queue, bot = jobs
+    job = make_job()
+    assert queue.submit(job) == 1
+    await wait_idle(queue)
+
+    assert job.status == "done"
+    assert len(bot.photos) == 1
+    assert bot.photos[0][0].startswith(b"\x89PNG")
+    expected = MovingAverageStrategy(20).backtest(generate_mock_candles(200))["returns"]
+    cached = await BacktestCache().get(job.cache_key)
+    assert cached["returns"] == pytest.approx(expected)
+    assert queue.stats()["completed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_per_user_limit_and_cancel(jobs):
+    queue, bot = jobs
+    submitted = [make_job() for _ in range(BACKTEST_USER_JOBS)]
+    for job in submitted:
+        queue.submit(job)
+    with pytest.raises(JobLimitError):
+        queue.submit(make_job())
+    # Лимит — на пользователя, другой пользователь проходит
+    other = make_job(user_id=2)
+    queue.submit(other)
+
+    assert await queue.cancel(other.id, user_id=1) is False
+    assert await queue.cancel(other.id, user_id=2) is True
+    await wait_idle(queue)
+
+    assert other.status == "cancelled"
+    assert len(bot.photos) == BACKTEST_USER_JOBS
+    stats = queue.stats()
+    assert stats["rejected"] >= 1 and stats["cancelled"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_running_job_holds_its_slot(jobs):
+    queue, bot = jobs
+    job = make_job(user_id=3)
+    job.source = ("mock", 3_000_000)
+    queue.submit(job)
+    for _ in range(200):
+        if job.status == "running":
+            break
+        await asyncio.sleep(0.01)
+
+    assert await queue.cancel(job.id, user_id=3) is True
+    # Процесс ещё считает — задача занимает лимит пользователя
+    assert job.status == "running"
+    assert queue.user_jobs(3) == [job]
+    await wait_idle(queue)
+
+    assert job.status == "cancelled"
+    assert bot.photos == []
+    assert bot.edits[-1] == "🚫 Отменено: Бэктест MA"
+
+
+def grid_task(strategy_key: str, source: tuple):
+    close = load_source(source)["close"].to_numpy()
+    with ParameterOptimizer(strategy_key, close, workers=1) as optimizer:
+        return optimizer.grid({"window": [10, 20, 30]})
+
+
+async def send_grid(bot, job, table):
+    await bot.send_message(job.chat_id, f"{job.title}: {len(table)}")
+
+
+def make_compute_job(user_id: int = 1) -> ComputeJob:
+    return ComputeJob(
+        user_id=user_id,
+        chat_id=10,
+        message_id=20,
+        title="Подбор параметров MA",
+        label="тестовые данные",
+        task=grid_task,
+        args=("MA", ("mock", 300)),
+        on_done=send_grid
+    )
+
+
+@pytest.mark.asyncio
+async def test_compute_job_runs_in_queue(jobs):
+    queue, bot = jobs
+    job = make_compute_job()
+    queue.submit(job)
+    await wait_idle(queue)
+
+    assert job.status == "done"
+    assert bot.messages == ["Подбор параметров MA: 3"]
+    assert bot.edits[-1].startswith("✅ Подбор параметров MA: готово")
+
+
+@pytest.mark.asyncio
+async def test_compute_jobs_share_backtest_user_limit(jobs):
+    queue, bot = jobs
+    for _ in range(BACKTEST_USER_JOBS - 1):
+        queue.submit(make_job(user_id=4))
+    queue.submit(make_compute_job(user_id=4))
+    with pytest.raises(JobLimitError):
+        queue.submit(make_compute_job(user_id=4))
+    await wait_idle(queue)
+
+
+def crash_task():
+    # Процесс-исполнитель падает, как при нехватке памяти
+    os._exit(1)
+
+
+@pytest.mark.asyncio
+async def test_crashed_worker_fails_only_its_job(jobs):
+    queue, bot = jobs
+    crashed = make_compute_job()
+    crashed.task, crashed.args = crash_task, ()
+    restarts = queue.stats()["pool_restarts"]
+    queue.submit(crashed)
+    await wait_idle(queue)
+
+    assert crashed.status == "failed"
+    assert bot.edits[-1] == "❌ Подбор параметров MA: процесс расчёта аварийно завершился"
+    assert queue.stats()["pool_restarts"] == restarts + 1
+
+    # Следующая задача выполняется на новом пуле
+    job = make_job()
+    queue.submit(job)
+    await wait_idle(queue)
+    assert job.status == "done"
+    assert len(bot.photos) == 1
+
+
+@pytest.mark.asyncio
+async def test_result_delivered_when_cache_write_fails(jobs, monkeypatch):
+    queue, bot = jobs
+
+    class LockedSession:
+        async def __aenter__(self):
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+        async def __aexit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(backtest_cache, "async_session", LockedSession)
+    job = make_job()
+    queue.submit(job)
+    await wait_idle(queue)
+
+    assert job.status == "done"
+    assert len(bot.photos) == 1
+    assert queue.stats()["completed"] >= 1
@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("tinkoff.invest")
+
+import grpc
+from grpc.aio import AioRpcError, Metadata
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from tinkoff.invest import OrderExecutionReportStatus
+
+import tinkoff_api.batch_orders as batch_orders
+from db.models import Base, BrokerOrder, OrderHistory
+from tinkoff_api.batch_orders import BatchOrderSubmitter, OrderIntent, order_key
+
+INTENTS = [OrderIntent("FIGI_A", "BUY", 1), OrderIntent("FIGI_B", "SELL", 2, 101.5), OrderIntent("FIGI_C", "BUY", 3)]
+
+
+def rpc_error(code):
+    return AioRpcError(code, Metadata(), Metadata(), details="test")
+
+
+class FakeSubmitter(BatchOrderSubmitter):
+    """Вместо API — сценарий ответов по figi: исключения по очереди, затем успех"""
+
+    def __init__(self, script: dict | None = None):
+        super().__init__(token="test", sandbox=True, concurrency=4, retries=2)
+        self.script = script or {}
+        self.sent = []
+
+    async def _post(self, account_id, result):
+        self.sent.append(result.client_order_id)
+        errors = self.script.get(result.intent.figi, [])
+        if errors:
+            raise errors.pop(0)
+        return SimpleNamespace(
+            order_id=f"broker-{result.client_order_id[:8]}",
+            execution_report_status=OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW,
+            lots_executed=0
+        )
+
+
+@pytest_asyncio.fixture
+async def db(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(batch_orders, "async_session", session)
+    monkeypatch.setattr(batch_orders, "BATCH_BACKOFF_SECONDS", 0)
+    yield session
+    await engine.dispose()
+
+
+async def count(session, model) -> int:
+    async with session() as s:
+        return (await s.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+def test_keys_are_stable_per_batch():
+    assert order_key("rebalance:1", 0, INTENTS[0]) == order_key("rebalance:1", 0, INTENTS[0])
+    assert order_key("rebalance:1", 0, INTENTS[0]) != order_key("rebalance:2", 0, INTENTS[0])
+    assert order_key("rebalance:1", 0, INTENTS[0]) != order_key("rebalance:1", 1, INTENTS[0])
+
+
+@pytest.mark.asyncio
+async def test_batch_key_is_required(db):
+    with pytest.raises(ValueError):
+        await FakeSubmitter().submit("acc", INTENTS, user_id=1, batch_key="")
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_retry_with_same_key(db):
+    submitter = FakeSubmitter({"FIGI_A": [rpc_error(grpc.StatusCode.UNAVAILABLE)]})
+    results = await submitter.submit("acc", INTENTS, user_id=1, batch_key="b1")
+
+    assert all(result.ok for result in results)
+    assert results[0].attempts == 2
+    # Повтор ушёл с тем же ключом идемпотентности
+    assert submitter.sent.count(results[0].client_order_id) == 2
+    assert await count(db, OrderHistory) == len(INTENTS)
+
+
+@pytest.mark.asyncio
+async def test_partial_failure_and_resubmit_dedup(db):
+    submitter = FakeSubmitter({
+        "FIGI_B": [rpc_error(grpc.StatusCode.INVALID_ARGUMENT)],
+        "FIGI_C": [rpc_error(grpc.StatusCode.UNAVAILABLE)] * 3,
+    })
+    results = await submitter.submit("acc", INTENTS, user_id=1, batch_key="b2")
+    assert [result.ok for result in results] == [True, False, False]
+    assert results[1].retryable is False and results[2].retryable is True
+
+    async with db() as s:
+        statuses = {
+            row.figi: row.status for row in (await s.execute(select(BrokerOrder))).scalars().all()
+        }
+    assert statuses == {"FIGI_A": "NEW", "FIGI_B": "REJECTED", "FIGI_C": "PENDING"}
+
+    # Повтор пакета: принятая заявка не отправляется, история не дублируется
+    retry = FakeSubmitter()
+    again = await retry.submit("acc", INTENTS, user_id=1, batch_key="b2")
+    assert results[0].client_order_id not in retry.sent
+    assert again[0].broker_order_id == results[0].broker_order_id
+    assert all(result.ok for result in again)
+    assert await count(db, OrderHistory) == len(INTENTS)
+    assert await count(db, BrokerOrder) == len(INTENTS)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from tinkoff_api.candle_codec import (
+    CandleArrays,
+    CandleCodecError,
+    decode_candles,
+    encode_candles,
+)
+
+
+def make_arrays(count=500):
+    rng = np.random.default_rng(1)
+    close = np.round(100 + np.cumsum(rng.normal(0, 0.5, count)), 9)
+    return CandleArrays(
+        1_700_000_000 + np.arange(count, dtype=np.int64) * 60,
+        close + 0.123456789,
+        close + 1,
+        close - 1,
+        close,
+        rng.integers(0, 10_000, count)
+    )
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_roundtrip(compress):
+    arrays = make_arrays()
+    payload = encode_candles(arrays, 10, 20, compress=compress)
+    decoded, covered_from, covered_to = decode_candles(payload)
+
+    assert (covered_from, covered_to) == (10, 20)
+    np.testing.assert_array_equal(decoded.time, arrays.time)
+    np.testing.assert_array_equal(decoded.volume, arrays.volume)
+    for field in ("open", "high", "low", "close"):
+        np.testing.assert_allclose(getattr(decoded, field), getattr(arrays, field), rtol=0, atol=1e-9)
+
+
+def test_empty_series():
+    decoded, _, _ = decode_candles(encode_candles(CandleArrays.empty()))
+    assert len(decoded) == 0
+
+
+def test_rejects_foreign_payload():
+    with pytest.raises(CandleCodecError):
+        decode_candles(b'[{"time": "2024-01-01T00:00:00+00:00"}]')
+
+
+def test_slice_by_time():
+    arrays = make_arrays(10)
+    part = arrays.slice(int(arrays.time[3]), int(arrays.time[7]))
+    np.testing.assert_array_equal(part.time, arrays.time[3:7])
@@ -0,0 +1,57 @@
+import numpy as np
+
+import db.candle_files as candle_files
+from db.candle_files import CandleFileStore
+from tinkoff_api.candle_codec import CandleArrays
+
+DAY = 86400
+
+
+def make_candles(start: int, count: int) -> CandleArrays:
+    time = start + np.arange(count, dtype=np.int64) * 60
+    close = 100 + np.arange(count, dtype=np.float64)
+    return CandleArrays(time, close, close + 1, close - 1, close, np.arange(count, dtype=np.int64))
+
+
+def test_append_and_range_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(candle_files, "BLOCK_ROWS", 16)
+    store = CandleFileStore(str(tmp_path))
+    store.write("FIGI", 1, make_candles(0, 100), 0, 6000)
+    # Пересекающийся хвост: уже сохранённые свечи не дублируются
+    assert store.append("FIGI", 1, make_candles(5940, 50)) == 49
+
+    arrays = store.read("FIGI", 1)
+    assert len(arrays) == 149
+    assert np.all(np.diff(arrays.time) == 60)
+    assert isinstance(arrays.close, np.memmap)
+
+    window = store.read("FIGI", 1, 60 * 37, 60 * 101)
+    assert window.time[0] == 60 * 37
+    assert window.time[-1] == 60 * 100
+    assert store.info("FIGI", 1)["count"] == 149
+
+
+def test_older_range_is_merged(tmp_path):
+    store = CandleFileStore(str(tmp_path))
+    store.write("FIGI", 1, make_candles(DAY, 10), DAY, DAY + 600)
+    store.write("FIGI", 1, make_candles(0, 10), 0, 600)
+
+    arrays = store.read("FIGI", 1)
+    assert len(arrays) == 20
+    assert arrays.time[0] == 0 and arrays.time[-1] == DAY + 540
+    meta = store.info("FIGI", 1)
+    assert (meta["covered_from"], meta["covered_to"]) == (0, DAY + 600)
+
+
+def test_interrupted_append_is_ignored(tmp_path):
+    store = CandleFileStore(str(tmp_path))
+    store.write("FIGI", 1, make_candles(0, 10), 0, 600)
+    # Обрыв после записи колонки, но до фиксации meta.json
+    with open(tmp_path / "FIGI" / "1" / "close", "ab") as f:
+        f.write(b"\x00" * 24)
+
+    assert len(store.read("FIGI", 1)) == 10
+    store.append("FIGI", 1, make_candles(600, 5))
+    arrays = store.read("FIGI", 1)
+    assert len(arrays) == 15
+    assert arrays.close[10] == 100
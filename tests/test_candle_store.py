@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+from tinkoff.invest import CandleInterval, HistoricCandle, Quotation
+
+import tinkoff_api.candle_store as candle_store
+from tinkoff_api.candle_store import CandleStore
+
+MINUTE = CandleInterval.CANDLE_INTERVAL_1_MIN
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.written = []
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value):
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def mset(self, mapping):
+        self.written.extend(mapping)
+        self.data.update(mapping)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class Market:
+    """Минутные свечи с ценой = номер минуты; последняя до «сейчас» формируется"""
+
+    def __init__(self, clock: datetime):
+        self.clock = clock
+        self.requests = []
+
+    async def fetch(self, figi, from_, to, interval):
+        self.requests.append((from_, to))
+        candles = []
+        t = from_.replace(second=0, microsecond=0)
+        while t < to:
+            price = Quotation(units=int(t.timestamp()) // 60 % 1000, nano=0)
+            complete = t + timedelta(minutes=1) <= self.clock
+            candles.append(HistoricCandle(time=t, open=price, high=price, low=price, close=price, volume=1, is_complete=complete))
+            t += timedelta(minutes=1)
+        return candles
+
+
+@pytest.fixture
+def env(monkeypatch):
+    redis = FakeRedis()
+    market = Market(datetime(2024, 5, 6, 12, 0, 30, tzinfo=timezone.utc))
+
+    async def get_redis():
+        return redis
+    monkeypatch.setattr(candle_store, "get_redis", get_redis)
+    monkeypatch.setattr(candle_store, "now", lambda: market.clock)
+    CandleStore._locks.clear()
+    return redis, market
+
+
+@pytest.mark.asyncio
+async def test_tail_update_rewrites_only_last_chunk(env):
+    redis, market = env
+    store = CandleStore(market.fetch)
+    first = await store.get_arrays("FIGI", MINUTE, 3)
+    assert len(first) == 3 * 24 * 60
+    assert len(redis.written) == 4  # три дня задевают четыре суточных куска
+
+    redis.written.clear()
+    market.clock += timedelta(minutes=5)
+    second = await store.get_arrays("FIGI", MINUTE, 3)
+    assert redis.written == ["candles:FIGI:1:1714953600"]
+    assert market.requests[-1][0] == datetime(2024, 5, 6, 12, 0, tzinfo=timezone.utc)
+    assert second.time[-1] - first.time[-1] == 5 * 60
+    assert (second.close == second.time // 60 % 1000).all()
+
+
+@pytest.mark.asyncio
+async def test_wider_window_fetches_only_the_head(env):
+    redis, market = env
+    store = CandleStore(market.fetch)
+    await store.get_arrays("FIGI", MINUTE, 1)
+    arrays = await store.get_arrays("FIGI", MINUTE, 2)
+
+    head_from, head_to = market.requests[-2]
+    assert head_to - head_from == timedelta(days=1)
+    assert len(arrays) == 2 * 24 * 60
+    assert (arrays.close == arrays.time // 60 % 1000).all()
+
+
+@pytest.mark.asyncio
+async def test_lost_chunk_triggers_refetch(env):
+    redis, market = env
+    store = CandleStore(market.fetch)
+    expected = await store.get_arrays("FIGI", MINUTE, 2)
+    del redis.data["candles:FIGI:1:1714953600"]
+
+    arrays = await store.get_arrays("FIGI", MINUTE, 2)
+    assert market.requests[-1][1] - market.requests[-1][0] >= timedelta(days=2)
+    assert (arrays.time == expected.time).all()
+
+
+@pytest.mark.asyncio
+async def test_merge_extends_series_backwards(env):
+    redis, market = env
+    store = CandleStore(market.fetch)
+    await store.get_arrays("FIGI", MINUTE, 1)
+    covered_from = market.clock - timedelta(days=1)
+    older = covered_from - timedelta(days=2)
+    await store.merge("FIGI", MINUTE, await market.fetch("FIGI", older, covered_from, MINUTE), older, covered_from)
+
+    requests = len(market.requests)
+    arrays = await store.get_arrays("FIGI", MINUTE, 3)
+    # Вся история уже в хранилище — запрашивается только хвост
+    assert len(market.requests) == requests + 1
+    assert len(arrays) == 3 * 24 * 60
+    assert (arrays.close == arrays.time // 60 % 1000).all()
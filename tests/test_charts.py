@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tinkoff_api.candle_codec import CandleArrays
+from utils.charts import CHART_POINTS, ChartRenderer, downsample_candles, downsample_equity, lttb
+
+
+def make_candles(n: int) -> CandleArrays:
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.standard_normal(n))
+    open_ = np.r_[close[0], close[:-1]]
+    return CandleArrays(
+        1_700_000_000 + np.arange(n, dtype=np.int64) * 60,
+        open_,
+        np.maximum(open_, close) + rng.random(n),
+        np.minimum(open_, close) - rng.random(n),
+        close,
+        np.ones(n, dtype=np.int64)
+    )
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    y = np.sin(np.linspace(0, 20, 10_000))
+    y[1234] = 5.0
+    y[8765] = -5.0
+    keep = lttb(np.arange(len(y)), y, 300)
+    assert len(keep) == 300
+    assert keep[0] == 0 and keep[-1] == len(y) - 1
+    assert np.all(np.diff(keep) > 0)
+    assert {1234, 8765} <= set(keep.tolist())
+    assert len(lttb(np.arange(10), np.arange(10.0), 300)) == 10
+
+
+def test_equity_downsampling_drops_nan_and_keeps_dates():
+    index = pd.date_range("2024-01-01", periods=50_000, freq="min", tz="UTC")
+    equity = pd.Series(np.r_[np.nan, np.linspace(1, 2, 49_999)], index=index)
+    x, y = downsample_equity(equity)
+    assert len(x) == CHART_POINTS
+    assert x.dtype.kind == "M" and not np.isnan(y).any()
+    assert y[0] == 1 and y[-1] == 2
+
+
+def test_candle_groups_preserve_price_range():
+    candles = make_candles(1_000)
+    data = downsample_candles(candles, width=100)
+    assert len(data["time"]) == 100
+    assert data["open"][0] == candles.open[0] and data["close"][-1] == candles.close[-1]
+    assert data["high"].max() == candles.high.max() and data["low"].min() == candles.low.min()
+    assert data["high"][0] == candles.high[:10].max()
+
+
+@pytest.mark.asyncio
+async def test_identical_charts_rendered_once():
+    renderer = ChartRenderer()
+    ChartRenderer._cache.clear()
+    equity = pd.Series(np.cumprod(1 + np.random.default_rng(1).standard_normal(5_000) * 0.01))
+    renders = renderer.stats()["renders"]
+
+    first = renderer.equity_png(equity)
+    assert first.startswith(b"\x89PNG")
+    assert await renderer.equity(equity.copy()) == first
+    assert renderer.stats()["renders"] == renders + 1
+
+    chart = await renderer.candles(make_candles(500), "SBER (1min)")
+    assert chart.startswith(b"\x89PNG") and chart != first
+    assert renderer.stats()["renders"] == renders + 2
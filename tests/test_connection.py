@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("tinkoff.invest")
+
+import grpc
+from grpc.aio import AioRpcError, Metadata
+
+import tinkoff_api.connection as connection
+from tinkoff_api.connection import TinkoffConnectionManager, tinkoff_client
+
+
+class FakeClient:
+    """AsyncClient без сети: каждый вход — новый «канал» со своими сервисами"""
+    opened = []
+
+    def __init__(self, token):
+        self.token = token
+
+    async def __aenter__(self):
+        services = object()
+        FakeClient.opened.append(services)
+        return services
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest_asyncio.fixture
+async def manager(monkeypatch):
+    monkeypatch.setattr(connection, "AsyncClient", FakeClient)
+    monkeypatch.setattr(connection, "TINKOFF_CHANNEL_POOL_SIZE", 1)
+    monkeypatch.setattr(TinkoffConnectionManager, "_lock", asyncio.Lock())
+    monkeypatch.setattr(TinkoffConnectionManager, "_stats", {"opened": 0, "reused": 0, "reconnects": 0, "dropped": 0})
+    FakeClient.opened.clear()
+    TinkoffConnectionManager._pools.clear()
+    TinkoffConnectionManager._cursors.clear()
+    yield TinkoffConnectionManager()
+    await TinkoffConnectionManager().close()
+
+
+def rpc_error(code):
+    return AioRpcError(code, Metadata(), Metadata(), details="test")
+
+
+@pytest.mark.asyncio
+async def test_unavailable_marks_channel_broken_and_next_acquire_reconnects(manager):
+    async with tinkoff_client("token") as first:
+        pass
+    with pytest.raises(AioRpcError):
+        async with tinkoff_client("token"):
+            raise rpc_error(grpc.StatusCode.UNAVAILABLE)
+    assert TinkoffConnectionManager._pools["token"][0].broken is True
+    assert manager.stats()["dropped"] == 1
+
+    async with tinkoff_client("token") as second:
+        pass
+    assert second is not first
+    assert FakeClient.opened == [first, second]
+    assert manager.stats()["reconnects"] == 1
+
+
+@pytest.mark.asyncio
+async def test_request_errors_keep_the_channel(manager):
+    async with tinkoff_client("token") as first:
+        pass
+    with pytest.raises(AioRpcError):
+        async with tinkoff_client("token"):
+            raise rpc_error(grpc.StatusCode.INVALID_ARGUMENT)
+
+    async with tinkoff_client("token") as again:
+        pass
+    assert again is first
+    assert manager.stats()["reconnects"] == 0 and manager.stats()["dropped"] == 0
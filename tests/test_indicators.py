@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from strategies.bollinger import BollingerBandsStrategy
+from strategies.indicators import LiveSignal, StreamingBands, StreamingRSI, StreamingSMA
+from strategies.ma import MovingAverageStrategy
+from strategies.rsi import RSIStrategy
+
+
+@pytest.fixture
+def close():
+    rng = np.random.default_rng(21)
+    return 100 + np.cumsum(rng.normal(0, 1, 3000))
+
+
+def stream(indicator, values):
+    return np.array([indicator.update(value) for value in values])
+
+
+@pytest.mark.parametrize("window", [1, 2, 20, 200])
+def test_sma_matches_pandas(close, window):
+    expected = pd.Series(close).rolling(window).mean()
+    np.testing.assert_allclose(stream(StreamingSMA(window), close), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize("period", [2, 20, 55])
+def test_bands_match_pandas(close, period):
+    bands = stream(StreamingBands(period, 2.0), close)
+    sma = pd.Series(close).rolling(period).mean()
+    width = pd.Series(close).rolling(period).std() * 2.0
+    np.testing.assert_allclose(bands[:, 0], sma, rtol=1e-12)
+    np.testing.assert_allclose(bands[:, 1], sma + width, rtol=1e-9)
+    np.testing.assert_allclose(bands[:, 2], sma - width, rtol=1e-9)
+
+
+def test_bands_do_not_drift_on_long_series():
+    rng = np.random.default_rng(5)
+    close = 100 * np.exp(np.cumsum(rng.normal(1e-4, 0.002, 200_000)))
+    indicator = StreamingBands(20, 2.0)
+    bands = stream(indicator, close)
+    std = pd.Series(close).rolling(20).std()
+    np.testing.assert_allclose((bands[:, 1] - bands[:, 0]) / 2.0, std, rtol=1e-7)
+    # В снимке — только окно и его статистики, без накопленных сумм с начала ряда
+    state = indicator.snapshot()["sma"]
+    assert len(state["ring"]) == 20
+    assert abs(state["mean"] - close[-20:].mean()) < 1e-9 * close[-1]
+
+
+def test_rsi_matches_batch(close):
+    strategy = RSIStrategy(period=14)
+    np.testing.assert_allclose(stream(StreamingRSI(14), close), strategy.calculate_rsi(close), rtol=1e-12)
+
+
+@pytest.mark.parametrize("strategy", [MovingAverageStrategy(), RSIStrategy(), BollingerBandsStrategy()])
+def test_live_signal_matches_backtest(close, strategy):
+    (position, _, _), indicators = strategy.backtest_arrays(close)
+    live = LiveSignal(strategy)
+    signals, positions = [], []
+    for value in close:
+        signals.append(live.update(value))
+        positions.append(live.position)
+    np.testing.assert_array_equal(signals, indicators["signal"])
+    np.testing.assert_array_equal(positions, position)
+
+
+@pytest.mark.parametrize("strategy", [MovingAverageStrategy(), RSIStrategy(), BollingerBandsStrategy()])
+def test_snapshot_restore_continues_seamlessly(close, strategy):
+    uninterrupted = LiveSignal(strategy)
+    expected = [uninterrupted.update(value) for value in close]
+
+    live = LiveSignal(strategy)
+    head = [live.update(value) for value in close[:1500]]
+    state = json.loads(json.dumps(live.snapshot()))
+    restored = LiveSignal.restore(strategy, state)
+    tail = [restored.update(value) for value in close[1500:]]
+
+    assert head + tail == expected
+    assert restored.indicator.snapshot() == uninterrupted.indicator.snapshot()
@@ -0,0 +1,240 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("tinkoff.invest")
+
+from tinkoff.invest import Quotation
+
+import tinkoff_api.market_data_hub as market_data_hub
+from strategies.indicators import LiveSignal
+from strategies.ma import MovingAverageStrategy
+from tinkoff_api.connection import TinkoffConnectionManager
+from tinkoff_api.live_signals import LiveSignalRunner
+from tinkoff_api.market_data_hub import MarketDataHub
+
+T0 = datetime(2024, 5, 6, 10, 0, tzinfo=timezone.utc)
+
+
+class FakeManager:
+    def __init__(self):
+        self.active = set()
+        self.calls = []
+
+    def subscribe(self, instruments):
+        figis = {item.figi for item in instruments}
+        self.calls.append(("subscribe", figis))
+        self.active |= figis
+
+    def unsubscribe(self, instruments):
+        figis = {item.figi for item in instruments}
+        self.calls.append(("unsubscribe", figis))
+        self.active -= figis
+
+
+class FakeStream:
+    def __init__(self):
+        self.candles, self.order_book, self.last_price = FakeManager(), FakeManager(), FakeManager()
+        self.responses = asyncio.Queue()
+
+    def stop(self):
+        self.responses.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        response = await self.responses.get()
+        if response is None:
+            raise StopAsyncIteration
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def candle(figi: str, minute: int, close: float):
+    data = SimpleNamespace(
+        figi=figi, time=T0 + timedelta(minutes=minute), close=Quotation(units=int(close), nano=0), last_trade_ts=None
+    )
+    return SimpleNamespace(last_price=None, orderbook=None, candle=data)
+
+
+@pytest_asyncio.fixture
+async def streams(monkeypatch):
+    created = []
+
+    async def get_services(self, token=None):
+        def create_market_data_stream():
+            created.append(FakeStream())
+            return created[-1]
+        return SimpleNamespace(create_market_data_stream=create_market_data_stream)
+
+    monkeypatch.setattr(TinkoffConnectionManager, "get_services", get_services)
+    monkeypatch.setattr(market_data_hub, "RECONNECT_DELAY", 0)
+    monkeypatch.setattr(MarketDataHub, "_lock", asyncio.Lock())
+    MarketDataHub._subscribers.clear()
+    MarketDataHub._snapshots.clear()
+    MarketDataHub._stream = None
+    yield created
+    await LiveSignalRunner().stop()
+    await MarketDataHub().stop()
+    MarketDataHub._subscribers.clear()
+    MarketDataHub._snapshots.clear()
+
+
+async def connected(streams, count: int = 1):
+    for _ in range(100):
+        if len(streams) >= count and MarketDataHub._stream is streams[count - 1]:
+            return streams[count - 1]
+        await asyncio.sleep(0.01)
+    raise AssertionError("стрим не подключился")
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_are_ref_counted(streams):
+    hub = MarketDataHub()
+    await hub.start(token="test")
+    stream = await connected(streams)
+
+    first = await hub.acquire("FIGI_A")
+    second = await hub.acquire("FIGI_A")
+    await hub.acquire("FIGI_B")
+    assert stream.candles.calls == [("subscribe", {"FIGI_A"}), ("subscribe", {"FIGI_B"})]
+    assert hub.stats()["instruments"] == 2 and hub.stats()["subscribers"] == 3
+
+    await hub.release(first)
+    assert stream.candles.active == {"FIGI_A", "FIGI_B"}
+    await hub.release(second)
+    assert stream.candles.active == {"FIGI_B"}
+    assert stream.last_price.active == stream.order_book.active == {"FIGI_B"}
+    assert hub.snapshot("FIGI_A") is None
+
+
+@pytest.mark.asyncio
+async def test_reconnect_restores_subscriptions(streams):
+    hub = MarketDataHub()
+    await hub.start(token="test")
+    first = await connected(streams)
+    async with hub.subscribe("FIGI_A") as updates:
+        first.responses.put_nowait(ConnectionError("UNAVAILABLE"))
+        second = await connected(streams, 2)
+        assert second.candles.active == {"FIGI_A"}
+
+        second.responses.put_nowait(candle("FIGI_A", 0, 101))
+        update = await asyncio.wait_for(updates.__anext__(), 1)
+        assert update.kind == "candle" and update.snapshot.last_price == 101
+    assert second.candles.active == set()
+    assert hub.stats()["reconnects"] >= 1
+
+
+class MemoryWatchStore:
+    def __init__(self, records=()):
+        self.records = {(record["user_id"], record["figi"]): record for record in records}
+
+    async def load(self):
+        return [json.loads(json.dumps(record)) for record in self.records.values()]
+
+    async def save(self, record):
+        self.records[(record["user_id"], record["figi"])] = json.loads(json.dumps(record))
+
+    async def delete(self, user_id, figi):
+        self.records.pop((user_id, figi), None)
+
+
+def minutes(*offsets):
+    return np.array([int((T0 + timedelta(minutes=offset)).timestamp()) for offset in offsets])
+
+
+async def wait_for(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("условие не выполнилось")
+
+
+@pytest.mark.asyncio
+async def test_live_signals_consume_closed_candles(streams):
+    sent = []
+
+    class Bot:
+        async def send_message(self, chat_id, text):
+            sent.append(text)
+
+    async def history(ticker, since):
+        return minutes(-2, -1), np.array([10.0, 10.0])
+
+    hub = MarketDataHub()
+    await hub.start(token="test")
+    stream = await connected(streams)
+    runner = LiveSignalRunner()
+    store = MemoryWatchStore()
+    await runner.start(Bot(), history=history, store=store)
+    assert await runner.watch(7, "SBER", "FIGI_A", "MA", {"window": 2}) is True
+    assert await runner.watch(7, "SBER", "FIGI_A", "MA", {"window": 2}) is False
+    assert stream.candles.active == {"FIGI_A"}
+
+    # Формирующаяся свеча приходит несколько раз — в сигнал идёт её последняя цена
+    for minute, close in ((0, 12), (0, 13), (1, 9), (2, 9)):
+        stream.responses.put_nowait(candle("FIGI_A", minute, close))
+    await wait_for(lambda: len(sent) == 2)
+
+    assert sent == ["📶 SBER (MA): 🟢 покупка по 13.00", "📶 SBER (MA): ⚪️ вне рынка по 9.00"]
+    assert runner.watching(7) == ["SBER"]
+    # После каждой закрытой свечи запись со снимком сохранена
+    record = store.records[(7, "FIGI_A")]
+    assert record["time"] == minutes(1)[0]
+    assert record["state"]["position"] == 0.0
+
+    assert await runner.unwatch(7) == 1
+    assert stream.candles.active == set()
+    assert hub.stats()["subscribers"] == 0
+    assert store.records == {}
+
+
+@pytest.mark.asyncio
+async def test_live_signals_restored_on_start(streams):
+    sent = []
+
+    class Bot:
+        async def send_message(self, chat_id, text):
+            sent.append(text)
+
+    # Наблюдение до перезапуска: MA(2) по свечам 10, 12 — в позиции после минуты 0
+    live = LiveSignal(MovingAverageStrategy(2))
+    for close in (10.0, 12.0):
+        live.update(close)
+    store = MemoryWatchStore([{
+        "user_id": 7, "figi": "FIGI_A", "ticker": "SBER", "strategy": "MA", "params": {"window": 2},
+        "time": int(minutes(0)[0]), "state": live.snapshot(),
+    }])
+    requested = []
+
+    async def history(ticker, since):
+        # За время простоя закрылась свеча минуты 1 — её догоняем, старые не повторяем
+        requested.append(since)
+        return minutes(1), np.array([13.0])
+
+    hub = MarketDataHub()
+    await hub.start(token="test")
+    stream = await connected(streams)
+    runner = LiveSignalRunner()
+    await runner.start(Bot(), history=history, store=store)
+
+    assert runner.watching(7) == ["SBER"]
+    assert runner.stats()["restored"] >= 1
+    await wait_for(lambda: store.records[(7, "FIGI_A")]["time"] == minutes(1)[0])
+    assert requested == [minutes(1)[0]]
+    assert stream.candles.active == {"FIGI_A"}
+
+    # Свеча минуты 1 из стрима уже учтена по истории; минута 2 закрывается ниже MA
+    for minute, close in ((1, 13), (2, 8), (3, 8)):
+        stream.responses.put_nowait(candle("FIGI_A", minute, close))
+    await wait_for(lambda: sent)
+    assert sent == ["📶 SBER (MA): ⚪️ вне рынка по 8.00"]
+    assert await runner.unwatch(7, "FIGI_A") == 1
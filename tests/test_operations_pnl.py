@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+import pytest
+
+from db.operations import realized_pnl
+
+
+def op(type_, quantity, payment, figi="F1"):
+    return SimpleNamespace(
+        type=f"OPERATION_TYPE_{type_}", figi=figi, quantity=quantity, quantity_done=quantity, payment=payment
+    )
+
+
+def test_realized_pnl_uses_average_cost():
+    operations = [
+        op("BUY", 10, -1000.0),
+        op("BUY", 10, -1200.0),
+        op("BROKER_FEE", 0, -3.0),
+        op("SELL", 5, 650.0),
+    ]
+    # Средняя цена 110, продано 5 по 130
+    assert realized_pnl(operations)["F1"] == pytest.approx(5 * 20 - 3)
+
+
+def test_sell_without_position_is_ignored():
+    operations = [op("SELL", 5, 500.0), op("BUY", 1, -90.0, figi="F2"), op("SELL", 1, 100.0, figi="F2")]
+    pnl = realized_pnl(operations)
+    assert pnl["F1"] == 0
+    assert pnl["F2"] == pytest.approx(10)
@@ -0,0 +1,59 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from strategies.optimizer import ParameterOptimizer, evaluate, grid_points
+from strategies.rsi import RSIStrategy
+
+
+@pytest.fixture
+def close():
+    rng = np.random.default_rng(11)
+    return 100 + np.cumsum(rng.normal(0, 1, 3000))
+
+
+def test_grid_is_ranked_and_matches_direct_runs(close):
+    space = {"period": [7, 14, 21], "oversold": [25, 30], "overbought": [70, 75]}
+    with ParameterOptimizer("RSI", close, workers=2, budget=60) as optimizer:
+        table = optimizer.grid(space)
+
+    assert len(table) == len(grid_points(space)) == 12
+    assert table.attrs["timed_out"] is False
+    assert list(table["sharpe"]) == sorted(table["sharpe"], reverse=True)
+    best = table.iloc[0]
+    expected = evaluate(RSIStrategy(int(best["period"]), int(best["oversold"]), int(best["overbought"])), close)
+    assert best["sharpe"] == pytest.approx(expected["sharpe"])
+    assert best["total_return"] == pytest.approx(expected["total_return"])
+
+
+def test_budget_cancels_remaining_runs(close):
+    with ParameterOptimizer("MA", close, workers=1, budget=0) as optimizer:
+        table = optimizer.grid({"window": list(range(2, 500))})
+    assert table.attrs["timed_out"] is True
+    assert table.attrs["completed"] < table.attrs["requested"]
+
+
+def test_random_and_bayesian_search_respect_space(close):
+    space = {"period": (5, 60), "deviation": (1.0, 3.0)}
+    with ParameterOptimizer("Bollinger", close, workers=2, budget=60, metric="total_return") as optimizer:
+        random_table = optimizer.random(space, trials=20, seed=1)
+        bayes_table = optimizer.bayesian(space, trials=40, seed=1, warmup=10)
+
+    for table in (random_table, bayes_table):
+        assert table["period"].between(5, 60).all()
+        assert table["deviation"].between(1.0, 3.0).all()
+        assert list(table["total_return"]) == sorted(table["total_return"], reverse=True)
+    assert 10 < len(bayes_table) <= 40
+
+
+def test_single_worker_runs_without_child_processes(close):
+    space = {"period": [7, 14], "oversold": [25, 30], "overbought": [70]}
+    with ParameterOptimizer("RSI", close, workers=1, budget=60) as optimizer:
+        table = optimizer.grid(space)
+        assert multiprocessing.active_children() == []
+
+    assert len(table) == 4
+    best = table.iloc[0]
+    expected = evaluate(RSIStrategy(int(best["period"]), int(best["oversold"]), int(best["overbought"])), close)
+    assert best["sharpe"] == pytest.approx(expected["sharpe"])
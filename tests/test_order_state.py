@@ -0,0 +1,94 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("tinkoff.invest")
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from tinkoff.invest import Quotation
+
+import tinkoff_api.order_state as order_state
+from db.models import Base, BrokerOrder, BrokerTrade
+from tinkoff_api.instruments import InstrumentCache
+from tinkoff_api.order_state import OrderStateTracker
+
+WHEN = datetime.datetime(2024, 5, 6, 10, 0, 0, tzinfo=datetime.timezone.utc)
+
+
+def trade(quantity: int, price: int = 100, trade_id: str = "", date_time: datetime.datetime = WHEN):
+    return SimpleNamespace(date_time=date_time, quantity=quantity, price=Quotation(units=price, nano=0), trade_id=trade_id)
+
+
+def order_trades(*trades):
+    return SimpleNamespace(order_id="B1", trades=list(trades))
+
+
+@pytest_asyncio.fixture
+async def db(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(order_state, "async_session", session)
+
+    async def get_by_figi(self, figi):
+        return {"lot": 10}
+    monkeypatch.setattr(InstrumentCache, "get_by_figi", get_by_figi)
+
+    async with session() as s:
+        s.add(BrokerOrder(
+            account_id="acc", broker_order_id="B1", figi="FIGI", direction="BUY",
+            lots_requested=5, lots_executed=0, status="NEW"
+        ))
+        await s.commit()
+    yield session
+    await engine.dispose()
+
+
+async def order(session) -> BrokerOrder:
+    async with session() as s:
+        return (await s.execute(select(BrokerOrder))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_same_second_partial_fills_are_all_counted(db):
+    tracker = OrderStateTracker()
+    # Два частичных исполнения в одну секунду, по разным ценам
+    await tracker._apply_trades(order_trades(trade(10, 100)))
+    await tracker._apply_trades(order_trades(trade(20, 101)))
+
+    row = await order(db)
+    assert row.lots_executed == 3
+    assert row.status == "PARTIALLYFILL"
+
+
+@pytest.mark.asyncio
+async def test_stream_replay_is_not_counted_twice(db):
+    tracker = OrderStateTracker()
+    first = [trade(10, trade_id="T1"), trade(10, trade_id="T2")]
+    await tracker._apply_trades(order_trades(*first))
+    # После переподключения стрим повторяет сделки и добавляет новую в ту же секунду
+    await tracker._apply_trades(order_trades(*first, trade(30, trade_id="T3")))
+    await tracker._apply_trades(order_trades(*first, trade(30, trade_id="T3")))
+
+    row = await order(db)
+    assert row.lots_executed == 5
+    assert row.status == "FILL"
+    async with db() as s:
+        assert (await s.execute(select(func.count()).select_from(BrokerTrade))).scalar_one() == 3
+
+
+@pytest.mark.asyncio
+async def test_trades_after_reconcile_do_not_inflate_fill(db):
+    async with db() as s:
+        row = (await s.execute(select(BrokerOrder))).scalar_one()
+        row.lots_executed, row.status = 2, "PARTIALLYFILL"
+        await s.commit()
+
+    # Стрим присылает одну из сделок, уже учтённых сверкой
+    await OrderStateTracker()._apply_trades(order_trades(trade(10, trade_id="T1")))
+    assert (await order(db)).lots_executed == 2
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from db.candle_files import CandleFileStore
+from strategies.ma import MovingAverageStrategy
+from strategies.portfolio import CandleSource, portfolio_backtest
+from tinkoff_api.candle_codec import CandleArrays
+
+
+def series(seed, start, periods):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=periods, freq="D", tz="UTC")
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.02, periods))), index=index)
+
+
+def sleeve_returns(close: pd.Series, axis: pd.DatetimeIndex) -> pd.Series:
+    (_, returns, _), _ = MovingAverageStrategy(10).backtest_arrays(close.to_numpy())
+    return pd.Series(np.nan_to_num(returns), index=close.index).reindex(axis, fill_value=0.0)
+
+
+def test_equal_weight_combines_assets_on_common_axis():
+    first = series(1, "2024-01-01", 300)
+    second = series(2, "2024-03-01", 200)  # появляется позже
+    result = portfolio_backtest("MA", {"A": first, "B": second}, params={"window": 10}, workers=2)
+
+    axis = first.index.union(second.index)
+    a, b = sleeve_returns(first, axis), sleeve_returns(second, axis)
+    live_b = (axis >= second.index[0]) & (axis <= second.index[-1])
+    live_a = axis <= first.index[-1]
+    expected = (a * live_a + b * live_b) / (live_a.astype(int) + live_b.astype(int))
+
+    np.testing.assert_allclose(result["equity_curve"].to_numpy(), np.cumprod(1 + expected.to_numpy()))
+    assert result["equity_curve"].index.equals(axis)
+    assert set(result["assets"]["asset"]) == {"A", "B"}
+
+
+def test_fixed_weights_keep_missing_share_in_cash():
+    first, second = series(3, "2024-01-01", 100), series(4, "2024-02-10", 60)
+    result = portfolio_backtest(
+        "MA", {"A": first, "B": second}, params={"window": 10},
+        allocation="fixed", weights={"A": 3, "B": 1}, workers=1
+    )
+    axis = first.index.union(second.index)
+    expected = 0.75 * sleeve_returns(first, axis) + 0.25 * sleeve_returns(second, axis)
+    assert result["returns"] == pytest.approx(expected.sum())
+
+
+def test_volatility_parity_reads_candle_store(tmp_path):
+    store = CandleFileStore(str(tmp_path))
+    sources = {}
+    for seed, sigma in ((5, 0.01), (6, 0.04)):
+        rng = np.random.default_rng(seed)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, sigma, 250)))
+        times = 1_700_000_000 + np.arange(250, dtype=np.int64) * 86400
+        store.write(f"FIGI{seed}", 5, CandleArrays(times, close, close, close, close, np.ones(250, dtype=np.int64)), int(times[0]), int(times[-1]) + 86400)
+        sources[f"FIGI{seed}"] = CandleSource(f"FIGI{seed}", 5, str(tmp_path))
+
+    result = portfolio_backtest("Bollinger", sources, allocation="volatility", workers=2)
+    weights = result["assets"].set_index("asset")["weight"]
+    # Менее волатильный инструмент получает больший вес
+    assert weights["FIGI5"] > 2 * weights["FIGI6"]
+    assert len(result["equity_curve"]) == 250
+
+
+def test_single_worker_matches_process_pool():
+    sources = {"A": series(7, "2024-01-01", 200), "B": series(8, "2024-02-01", 150), "C": series(9, "2024-01-15", 180)}
+    pooled = portfolio_backtest("MA", sources, params={"window": 10}, allocation="volatility", workers=2)
+    inline = portfolio_backtest("MA", sources, params={"window": 10}, allocation="volatility", workers=1)
+
+    np.testing.assert_allclose(inline["equity_curve"].to_numpy(), pooled["equity_curve"].to_numpy())
+    assert inline["assets"]["asset"].tolist() == pooled["assets"]["asset"].tolist()
@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from tinkoff_api.portfolio_cache import SnapshotCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_served_while_refreshing():
+    clock = Clock()
+    cache = SnapshotCache(fresh_for=5, max_age=60, clock=clock)
+    versions = iter(range(1, 100))
+
+    async def loader():
+        return next(versions)
+
+    assert await cache.get("acc", loader) == 1
+    clock.now = 3
+    assert await cache.get("acc", loader) == 1   # свежий
+
+    clock.now = 10
+    assert await cache.get("acc", loader) == 1   # устаревший, обновление в фоне
+    await asyncio.sleep(0)
+    assert await cache.get("acc", loader) == 2
+
+    clock.now = 100
+    assert await cache.get("acc", loader) == 3   # старше max_age — ждём загрузку
+
+
+@pytest.mark.asyncio
+async def test_invalidate_discards_inflight_refresh():
+    clock = Clock()
+    cache = SnapshotCache(fresh_for=5, max_age=60, clock=clock)
+    release = asyncio.Event()
+
+    async def slow_loader():
+        await release.wait()
+        return "before_trade"
+
+    async def fast_loader():
+        return "after_trade"
+
+    assert await cache.get("acc", fast_loader) == "after_trade"
+    clock.now = 10
+    await cache.get("acc", slow_loader)          # запускает фоновое обновление
+    cache.invalidate("acc")
+    release.set()
+    await asyncio.sleep(0)
+
+    assert await cache.get("acc", fast_loader) == "after_trade"
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from tinkoff_api.quota import Priority, QuotaScheduler, TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_requests_within_burst_do_not_wait():
+    scheduler = QuotaScheduler(limits={"orders": 600})
+    for _ in range(60):
+        await scheduler.acquire("orders", Priority.ORDER)
+    stats = scheduler.stats()["classes"]["ORDER"]
+    assert stats["granted"] == 60
+    assert stats["max_wait"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_orders_jump_ahead_of_queued_market_data():
+    # 6000/мин: всплеск 600 токенов, поток 85 токенов в секунду
+    scheduler = QuotaScheduler(limits={"market_data": 6000})
+    await scheduler.acquire("market_data", Priority.MARKET_DATA, cost=600)
+
+    done = []
+
+    async def request(name, priority):
+        await scheduler.acquire("market_data", priority)
+        done.append(name)
+
+    tasks = [asyncio.create_task(request(f"candles{i}", Priority.MARKET_DATA)) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("order", Priority.ORDER)))
+    await asyncio.sleep(0)
+    assert scheduler.stats()["classes"]["MARKET_DATA"]["queue_depth"] == 3
+
+    await asyncio.gather(*tasks)
+    assert done[0] == "order"
+    assert scheduler.stats()["classes"]["MARKET_DATA"]["avg_wait"] > 0
+
+
+def test_bucket_never_exceeds_minute_limit():
+    now = [0.0]
+    bucket = TokenBucket(capacity=10, rate=85 / 60, clock=lambda: now[0])
+    granted = 0
+    for _ in range(6000):
+        if bucket.try_take(1):
+            granted += 1
+        now[0] += 0.01
+    assert granted <= 100
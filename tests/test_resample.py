@@ -0,0 +1,47 @@
+import numpy as np
+from tinkoff_api.candle_codec import CandleArrays
+from tinkoff_api.resample import ResampleCache, resample_ohlcv
+
+
+def minute_candles(count, start=1_700_000_040):
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, count))
+    return CandleArrays(
+        start + np.arange(count, dtype=np.int64) * 60,
+        close + 0.01,
+        close + rng.uniform(0, 1, count),
+        close - rng.uniform(0, 1, count),
+        close,
+        rng.integers(1, 100, count)
+    )
+
+
+def test_resample_matches_naive_aggregation():
+    base = minute_candles(47)
+    result = resample_ohlcv(base, 300)
+
+    buckets = base.time - base.time % 300
+    for i, bucket in enumerate(np.unique(buckets)):
+        mask = buckets == bucket
+        assert result.time[i] == bucket
+        assert result.open[i] == base.open[mask][0]
+        assert result.close[i] == base.close[mask][-1]
+        assert result.high[i] == base.high[mask].max()
+        assert result.low[i] == base.low[mask].min()
+        assert result.volume[i] == base.volume[mask].sum()
+
+
+def test_cache_appends_only_new_buckets():
+    base = minute_candles(600)
+    cache = ResampleCache()
+    step = 900
+
+    covered_to = int(base.time[299]) + 60
+    cache.resample("k", base.slice(0, covered_to), CandleArrays.empty(), covered_to, step)
+
+    covered_to = int(base.time[-1]) + 60
+    incremental = cache.resample("k", base, CandleArrays.empty(), covered_to, step)
+    full = resample_ohlcv(base, step)
+
+    for got, expected in zip(incremental, full):
+        np.testing.assert_array_equal(got, expected)
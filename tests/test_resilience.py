@@ -0,0 +1,179 @@
+import asyncio
+
+import pytest
+
+import tinkoff_api.resilience as resilience
+from tinkoff_api.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    Endpoint,
+    mark_rpc_started,
+    with_deadline,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_and_recovers_after_probe():
+    clock = Clock()
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=10, clock=clock)
+    for _ in range(3):
+        breaker.allow()
+        breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    clock.now = 11
+    breaker.allow()                 # пробный запрос
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()             # второй параллельный не пропускаем
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_serves_fallback():
+    endpoint = Endpoint("fallback-test")
+    endpoint.breaker.failure_threshold = 1
+
+    async def failing():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        await endpoint.call(failing)
+    assert await endpoint.call(failing, fallback=lambda: "cached") == "cached"
+    assert endpoint.stats["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_over_slow_first():
+    endpoint = Endpoint("hedge-test")
+    for _ in range(50):
+        endpoint.latency.record(0.01)
+    delays = iter([1.0, 0.0])
+
+    async def request():
+        mark_rpc_started()
+        await asyncio.sleep(next(delays))
+        return "ok"
+
+    assert await asyncio.wait_for(endpoint.call(request, hedge=True), 0.5) == "ok"
+    assert endpoint.stats["hedged"] == 1
+    assert endpoint.stats["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_propagates_from_handler():
+    endpoint = Endpoint("deadline-test")
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    @with_deadline(0.05)
+    async def handler():
+        await endpoint.call(slow)
+
+    with pytest.raises(DeadlineExceeded):
+        await handler()
+    # Запрос не дошёл до API (нет mark_rpc_started) — это наш дедлайн, не сбой API
+    assert endpoint.breaker.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_does_not_wedge_breaker():
+    clock = Clock()
+    endpoint = Endpoint("cancel-probe-test")
+    endpoint.breaker = CircuitBreaker("cancel-probe-test", failure_threshold=1, reset_timeout=10, clock=clock)
+
+    async def failing():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        await endpoint.call(failing)
+    clock.now = 11
+
+    started = asyncio.Event()
+
+    async def hanging():
+        started.set()
+        await asyncio.sleep(10)
+
+    probe = asyncio.ensure_future(endpoint.call(hanging))
+    await started.wait()
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    async def healthy():
+        return "ok"
+
+    assert await endpoint.call(healthy) == "ok"
+    assert endpoint.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_only_slow_rpc_counts_as_failure(monkeypatch):
+    monkeypatch.setattr(resilience, "RPC_TIMEOUT_SECONDS", 0.02)
+    endpoint = Endpoint("rpc-timeout-test")
+
+    async def throttled():
+        # Ждёт локальную квоту дольше дедлайна — API тут ни при чём
+        await asyncio.sleep(1)
+        mark_rpc_started()
+
+    async def hung():
+        mark_rpc_started()
+        await asyncio.sleep(1)
+
+    @with_deadline(0.05)
+    async def handler(factory):
+        await endpoint.call(factory)
+
+    with pytest.raises(DeadlineExceeded):
+        await handler(throttled)
+    assert endpoint.breaker.failures == 0
+    with pytest.raises(DeadlineExceeded):
+        await handler(hung)
+    assert endpoint.breaker.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_sent_write_outlives_handler_deadline():
+    endpoint = Endpoint("write-test")
+
+    async def post():
+        mark_rpc_started()
+        await asyncio.sleep(0.1)
+        return "accepted"
+
+    @with_deadline(0.02)
+    async def handler():
+        return await endpoint.call(post, cancellable=False)
+
+    assert await handler() == "accepted"
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_while_waiting_for_quota():
+    endpoint = Endpoint("hedge-quota-test")
+    for _ in range(50):
+        endpoint.latency.record(0.01)
+    calls = []
+
+    async def request():
+        calls.append(1)
+        await asyncio.sleep(0.05)   # локальная квота
+        mark_rpc_started()
+        await asyncio.sleep(0.005)
+        return "ok"
+
+    assert await endpoint.call(request, hedge=True) == "ok"
+    assert len(calls) == 1
+    assert endpoint.stats["hedged"] == 0
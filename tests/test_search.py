@@ -0,0 +1,63 @@
+from tinkoff_api.search import InstrumentSearchIndex
+
+CATALOG = {
+    "F1": {"figi": "F1", "ticker": "SBER", "name": "Сбер Банк", "type": "share"},
+    "F2": {"figi": "F2", "ticker": "SBERP", "name": "Сбер Банк - привилегированные акции", "type": "share"},
+    "F3": {"figi": "F3", "ticker": "GAZP", "name": "Газпром", "type": "share"},
+    "F4": {"figi": "F4", "ticker": "RU000A0JX0J2", "name": "Газпром капитал выпуск 4", "type": "bond"},
+    "F5": {"figi": "F5", "ticker": "AAPL", "name": "Apple", "type": "share"},
+}
+
+
+def build():
+    index = InstrumentSearchIndex()
+    index.update(CATALOG)
+    return index
+
+
+def tickers(results):
+    return [item["ticker"] for item in results]
+
+
+def test_exact_ticker_first():
+    assert tickers(build().search("sber"))[:2] == ["SBER", "SBERP"]
+
+
+def test_cyrillic_and_latin_queries_match():
+    index = build()
+    assert tickers(index.search("газпр"))[:2] == ["GAZP", "RU000A0JX0J2"]
+    assert tickers(index.search("gazprom"))[:2] == ["GAZP", "RU000A0JX0J2"]
+    assert tickers(index.search("сбер"))[0] == "SBER"
+
+
+def test_fuzzy_match_with_typo():
+    assert tickers(build().search("газпрм"))[0] == "GAZP"
+
+
+def test_incremental_update():
+    index = build()
+    catalog = dict(CATALOG)
+    del catalog["F5"]
+    catalog["F3"] = dict(catalog["F3"], name="Газпром нефть")
+    index.update(catalog)
+
+    assert "AAPL" not in tickers(index.search("apple"))
+    assert tickers(index.search("газпром нефть"))[0] == "GAZP"
+    assert len(index) == 4
+
+
+def test_fuzzy_skipped_when_exact_match_found():
+    # «сбер» находится по названию — опечатки-похожие инструменты не подмешиваются
+    assert tickers(build().search("sber")) == ["SBER", "SBERP"]
+
+
+def test_fuzzy_after_removal_reuses_slots():
+    index = build()
+    catalog = {key: item for key, item in CATALOG.items() if key != "F3"}
+    index.update(catalog)
+    assert tickers(index.search("газпрм")) == ["RU000A0JX0J2"]
+
+    catalog["F6"] = {"figi": "F6", "ticker": "GAZPN", "name": "Газпром нефть", "type": "share"}
+    index.update(catalog)
+    assert tickers(index.search("газпрм нефт"))[0] == "GAZPN"
+    assert "GAZP" not in tickers(index.search("газпрм"))
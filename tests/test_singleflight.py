@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from utils.singleflight import SingleFlight, coalesce, make_key
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test_shared")
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "portfolio"
+
+    results = await asyncio.gather(*(flight.do("acc", load) for _ in range(5)))
+
+    assert results == ["portfolio"] * 5
+    assert calls == 1
+    assert flight.stats()["coalesced"] == 4
+    assert flight.stats()["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_error_propagates_to_all_callers():
+    flight = SingleFlight("test_error")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream")
+
+    results = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats()["executions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flight = SingleFlight("test_cancel")
+
+    async def load():
+        await asyncio.sleep(0.02)
+        return 42
+
+    first = asyncio.ensure_future(flight.do("k", load))
+    second = asyncio.ensure_future(flight.do("k", load))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == 42
+
+
+@pytest.mark.asyncio
+async def test_decorator_normalizes_key():
+    flight = SingleFlight("test_decorator")
+
+    @coalesce(flight, key=lambda ticker, days=7: make_key(ticker, days))
+    async def get(ticker, days=7):
+        await asyncio.sleep(0.01)
+        return ticker
+
+    await asyncio.gather(get("sber"), get("SBER"), get("SBER", days=7), get("GAZP"))
+
+    assert flight.stats()["executions"] == 2
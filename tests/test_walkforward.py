@@ -0,0 +1,47 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from strategies.ma import MovingAverageStrategy
+from strategies.walkforward import rolling_windows, walk_forward
+
+
+def sharpe(returns):
+    std = returns.std()
+    return returns.mean() / std * math.sqrt(252) if std > 0 else 0.0
+
+
+def test_rolling_windows_layout():
+    windows = rolling_windows(100, train=30, test=10)
+    assert windows[0].tolist() == [0, 30, 40]
+    assert windows[-1].tolist() == [60, 90, 100]
+    assert (rolling_windows(100, train=30, test=10, anchored=True)[:, 0] == 0).all()
+
+
+def test_walk_forward_picks_best_train_params_and_stitches_test_windows():
+    rng = np.random.default_rng(5)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 1200)))
+    index = pd.date_range("2024-01-01", periods=len(close), freq="h")
+    space = {"window": [5, 10, 20, 40]}
+    windows = rolling_windows(len(close), train=600, test=150)
+
+    result = walk_forward("MA", close, windows, space, workers=2, index=index)
+    table = result["windows"]
+
+    full = {}
+    for window in space["window"]:
+        (_, returns, _), _ = MovingAverageStrategy(window).backtest_arrays(close)
+        full[window] = np.nan_to_num(returns)
+    for row in table.itertuples():
+        scores = {window: sharpe(r[row.train_start + 1:row.train_end]) for window, r in full.items()}
+        assert row.window == max(scores, key=scores.get)
+        assert row.train_sharpe == pytest.approx(scores[row.window], rel=1e-6)
+
+    expected = np.concatenate([
+        full[row.window][row.train_end:row.test_end] for row in table.itertuples()
+    ])
+    np.testing.assert_allclose(result["equity_curve"].to_numpy(), np.cumprod(1 + expected))
+    assert result["equity_curve"].index[0] == index[600]
+    assert len(result["equity_curve"]) == 150 * len(windows)
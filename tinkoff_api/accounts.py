@@ -1,16 +1,116 @@
-from tinkoff.invest import AsyncClient, MoneyValue
-from config import TINKOFF_TOKEN, USE_SANDBOX
+import asyncio
+import hashlib
+import json
+from tinkoff.invest import MoneyValue
+from config import TINKOFF_TOKEN, USE_SANDBOX, PRIMARY_ACCOUNT_ID
+from db.session import get_redis
+from tinkoff_api.connection import tinkoff_client
+from tinkoff_api.quota import Priority, Service
+from utils.logger import logger
+
+ACCOUNTS_CACHE_TTL = 7 * 24 * 3600
+
+
+class AccountRegistry:
+    """
+    Кэш идентификаторов счетов: процессная память + Redis.
+
+    Счета запрашиваются у API один раз на токен/режим, дальше
+    отдаются из памяти. Кэш сбрасывается явно при закрытии счёта.
+    """
+    _accounts: dict = {}
+    _lock = asyncio.Lock()
+
+    def __init__(self, token: str = TINKOFF_TOKEN, sandbox: bool = USE_SANDBOX):
+        self.token = token
+        self.sandbox = sandbox
+
+    @property
+    def _cache_key(self) -> str:
+        digest = hashlib.sha256((self.token or "").encode()).hexdigest()[:16]
+        return f"accounts:{'sandbox' if self.sandbox else 'real'}:{digest}"
+
+    async def get_accounts(self, refresh: bool = False) -> list[str]:
+        """Все счета текущего токена"""
+        key = self._cache_key
+        if not refresh and self._accounts.get(key):
+            return self._accounts[key]
+
+        async with self._lock:
+            if not refresh and self._accounts.get(key):
+                return self._accounts[key]
+
+            redis = await get_redis()
+            cached = None if refresh else await redis.get(key)
+            if cached:
+                accounts = json.loads(cached)
+            else:
+                accounts = await self._fetch_accounts()
+                await redis.set(key, json.dumps(accounts), ex=ACCOUNTS_CACHE_TTL)
+                logger.info(f"Resolved {len(accounts)} account(s) from Tinkoff API")
+
+            self._accounts[key] = accounts
+            return accounts
+
+    async def _fetch_accounts(self) -> list[str]:
+        service = Service.SANDBOX if self.sandbox else Service.USERS
+        async with tinkoff_client(self.token, service, Priority.PORTFOLIO) as client:
+            if self.sandbox:
+                response = await client.sandbox.get_sandbox_accounts()
+                accounts = [acc.id for acc in response.accounts]
+                if not accounts:
+                    acc = await client.sandbox.open_sandbox_account()
+                    accounts = [acc.account_id]
+                return accounts
+            response = await client.users.get_accounts()
+            return [acc.id for acc in response.accounts]
+
+    async def get_account_id(self, index: int = 0) -> str:
+        """Счёт по умолчанию (в боевом режиме — PRIMARY_ACCOUNT_ID, если задан)"""
+        if not self.sandbox and PRIMARY_ACCOUNT_ID:
+            return PRIMARY_ACCOUNT_ID
+        accounts = await self.get_accounts()
+        if index >= len(accounts):
+            raise ValueError(f"Счёт #{index} не найден")
+        return accounts[index]
+
+    async def invalidate(self):
+        """Сбрасывает кэш счетов (после открытия/закрытия счёта)"""
+        key = self._cache_key
+        self._accounts.pop(key, None)
+        redis = await get_redis()
+        await redis.delete(key)
+
+    async def warm_up(self):
+        """Заранее резолвит счета при старте бота"""
+        accounts = await self.get_accounts()
+        logger.info(f"Accounts cache warmed: {len(accounts)} account(s)")
+
+
+async def resolve_account_id() -> str:
+    """Счёт для пользовательских запросов без обращения к API"""
+    return await AccountRegistry().get_account_id()
+
 
 async def get_or_create_sandbox_account():
-    async with AsyncClient(TINKOFF_TOKEN) as client:
-        accounts = await client.sandbox.get_sandbox_accounts()
-        if accounts.accounts:
-            return accounts.accounts[0].id
+    return await AccountRegistry(sandbox=True).get_account_id()
+
+
+async def open_sandbox_account() -> str:
+    async with tinkoff_client(TINKOFF_TOKEN, Service.SANDBOX, Priority.PORTFOLIO) as client:
         acc = await client.sandbox.open_sandbox_account()
-        return acc.account_id
+    await AccountRegistry(sandbox=True).invalidate()
+    return acc.account_id
+
+
+async def close_sandbox_account(account_id: str):
+    async with tinkoff_client(TINKOFF_TOKEN, Service.SANDBOX, Priority.PORTFOLIO) as client:
+        await client.sandbox.close_sandbox_account(account_id=account_id)
+    await AccountRegistry(sandbox=True).invalidate()
+
 
 async def deposit_sandbox(account_id: str, amount: float):
-    async with AsyncClient(TINKOFF_TOKEN) as client:
+    async with tinkoff_client(TINKOFF_TOKEN, Service.SANDBOX, Priority.PORTFOLIO) as client:
         await client.sandbox.sandbox_pay_in(
             account_id=account_id,
             amount=MoneyValue(units=int(amount), nano=0, currency="rub")
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from db.session import get_redis
+from utils.logger import logger
+
+BACKFILL_CONCURRENCY = 4
+BACKFILL_RETRIES = 5
+BACKFILL_BACKOFF_SECONDS = 1.0
+# Сколько запросов копить в памяти перед записью в хранилище и чекпоинтом
+BACKFILL_FLUSH_CHUNKS = 30
+BACKFILL_CHECKPOINT_TTL = 30 * 24 * 3600
+
+# (figi, from_, to, interval) -> свечи
+ChunkFetcher = Callable[[str, datetime, datetime, object], Awaitable[list]]
+# (figi, interval, свечи, from_, to) -> None
+CandleSink = Callable[[str, object, list, datetime, datetime], Awaitable[None]]
+
+
+def plan_chunks(from_: datetime, to: datetime, span: timedelta) -> list[tuple[datetime, datetime]]:
+    """Режет диапазон на отрезки не длиннее одного запроса API"""
+    chunks = []
+    start = from_
+    while start < to:
+        end = min(start + span, to)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+class RedisCheckpoint:
+    """Прогресс задачи в Redis-хеше: figi -> состояние"""
+
+    def __init__(self, job_id: str):
+        self.key = f"backfill:{job_id}"
+
+    async def load(self) -> dict[str, dict]:
+        redis = await get_redis()
+        raw = await redis.hgetall(self.key)
+        return {figi.decode(): json.loads(state) for figi, state in raw.items()}
+
+    async def save(self, figi: str, state: dict):
+        redis = await get_redis()
+        await redis.hset(self.key, figi, json.dumps(state))
+        await redis.expire(self.key, BACKFILL_CHECKPOINT_TTL)
+
+
+class Backfill:
+    """
+    Массовая загрузка истории свечей по набору инструментов.
+
+    Диапазон каждого инструмента режется на отрезки длиной `span` (максимум
+    одного запроса GetCandles) и проходится от старых к новым. Инструменты
+    качаются параллельно, одновременных запросов — не больше `concurrency`.
+    После каждой записи в хранилище прогресс сохраняется в чекпоинт, так что
+    прерванный запуск с теми же параметрами продолжается с места остановки.
+    """
+
+    def __init__(
+        self,
+        figis: list[str],
+        interval,
+        from_: datetime,
+        to: datetime,
+        fetcher: ChunkFetcher,
+        sink: CandleSink,
+        span: timedelta,
+        concurrency: int = BACKFILL_CONCURRENCY,
+        retries: int = BACKFILL_RETRIES,
+        checkpoint=None
+    ):
+        self.figis = sorted(set(figis))
+        self.interval = interval
+        self.from_ = from_
+        self.to = to
+        self.fetcher = fetcher
+        self.sink = sink
+        self.span = span
+        self.retries = retries
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.checkpoint = checkpoint or RedisCheckpoint(self.job_id)
+
+    @property
+    def job_id(self) -> str:
+        """Одинаковые параметры дают одну и ту же задачу — и общий чекпоинт"""
+        raw = f"{int(self.interval)}:{self.from_.isoformat()}:{self.to.isoformat()}:{','.join(self.figis)}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+    async def run(self) -> dict:
+        states = await self.checkpoint.load()
+        pending = [figi for figi in self.figis if states.get(figi, {}).get("status") != "done"]
+        logger.info(
+            f"Backfill {self.job_id}: {len(pending)} of {len(self.figis)} instrument(s) to load, "
+            f"{self.from_:%Y-%m-%d} - {self.to:%Y-%m-%d}"
+        )
+        await asyncio.gather(*(self._backfill_figi(figi, states.get(figi)) for figi in pending))
+
+        states = await self.checkpoint.load()
+        summary = {
+            "job_id": self.job_id,
+            "done": sum(1 for s in states.values() if s["status"] == "done"),
+            "failed": [figi for figi, s in states.items() if s["status"] == "failed"],
+            "candles": sum(s["candles"] for s in states.values()),
+        }
+        logger.info(f"Backfill {self.job_id} finished: {summary}")
+        return summary
+
+    async def _backfill_figi(self, figi: str, state: dict | None):
+        state = state or {"next": self.from_.timestamp(), "candles": 0}
+        resume_from = datetime.fromtimestamp(state["next"], tz=self.from_.tzinfo)
+        chunks = plan_chunks(max(resume_from, self.from_), self.to, self.span)
+
+        buffer, buffer_from = [], None
+        try:
+            for index, (start, end) in enumerate(chunks):
+                buffer.extend(await self._fetch_with_retry(figi, start, end))
+                buffer_from = buffer_from or start
+                if (index + 1) % BACKFILL_FLUSH_CHUNKS == 0 or index == len(chunks) - 1:
+                    await self.sink(figi, self.interval, buffer, buffer_from, end)
+                    state = {"next": end.timestamp(), "candles": state["candles"] + len(buffer), "status": "running"}
+                    await self.checkpoint.save(figi, state)
+                    buffer, buffer_from = [], None
+        except Exception as e:
+            logger.error(f"Backfill {figi} failed: {e}")
+            await self.checkpoint.save(figi, {**state, "status": "failed", "error": str(e)})
+            return
+
+        await self.checkpoint.save(figi, {**state, "status": "done"})
+        logger.info(f"Backfill {figi}: done, {state['candles']} candles")
+
+    async def _fetch_with_retry(self, figi: str, start: datetime, end: datetime) -> list:
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    return await self.fetcher(figi, start, end, self.interval)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = BACKFILL_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning(f"Backfill {figi} {start:%Y-%m-%d %H:%M}: {e}, retry in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+async def select_figis(
+    instrument_cache,
+    tickers: list[str] | None = None,
+    instrument_type: str | None = None,
+    currency: str | None = None,
+    class_code: str | None = None
+) -> list[str]:
+    """FIGI по списку тикеров или по фильтру над каталогом инструментов"""
+    if tickers:
+        figis = []
+        for ticker in tickers:
+            figi = await instrument_cache.get_figi(ticker)
+            if not figi:
+                raise ValueError(f"Инструмент {ticker} не найден")
+            figis.append(figi)
+        return figis
+
+    if instrument_type:
+        instruments = (await instrument_cache.get_by_type(instrument_type)).values()
+    else:
+        instruments = (await instrument_cache.get_instruments()).values()
+    return [
+        item["figi"] for item in instruments
+        if (currency is None or item["currency"] == currency)
+        and (class_code is None or item["class_code"] == class_code)
+    ]
@@ -0,0 +1,249 @@
+import asyncio
+from dataclasses import dataclass
+from decimal import Decimal
+
+import grpc
+from grpc.aio import AioRpcError
+from sqlalchemy import select
+from tinkoff.invest import OrderDirection, OrderType
+from tinkoff.invest.utils import decimal_to_quotation
+
+from config import TINKOFF_TOKEN, USE_SANDBOX
+from db.models import BrokerOrder, OrderHistory
+from db.session import async_session
+from tinkoff_api.connection import tinkoff_client
+from tinkoff_api.order_state import STATUS_NAMES
+from tinkoff_api.orders import idempotency_key
+from tinkoff_api.portfolio_cache import portfolio_cache
+from tinkoff_api.quota import Priority, Service
+from utils.logger import logger
+
+BATCH_CONCURRENCY = 8
+BATCH_RETRIES = 3
+BATCH_BACKOFF_SECONDS = 0.5
+# Ошибки, после которых заявку можно безопасно отправить повторно с тем же ключом
+RETRYABLE_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.INTERNAL,
+}
+
+
+@dataclass(frozen=True)
+class OrderIntent:
+    """Намерение выставить заявку: price=None — рыночная"""
+    figi: str
+    direction: str  # BUY / SELL
+    lots: int
+    price: float | None = None
+
+
+@dataclass
+class OrderResult:
+    intent: OrderIntent
+    client_order_id: str
+    broker_order_id: str | None = None
+    status: str = "PENDING"  # статус брокера или FAILED
+    lots_executed: int = 0
+    error: str | None = None
+    attempts: int = 0
+    retryable: bool = False  # заявка могла дойти до брокера; повтор с тем же batch_key безопасен
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def order_key(batch_key: str, index: int, intent: OrderIntent) -> str:
+    """
+    Ключ идемпотентности заявки (order_id в PostOrder). Один и тот же пакет
+    с тем же batch_key даёт те же ключи, и брокер не исполнит заявку дважды.
+    """
+    return idempotency_key(batch_key, index, intent.figi, intent.direction, intent.lots, intent.price)
+
+
+class BatchOrderSubmitter:
+    """
+    Пакетная отправка заявок.
+
+    Намерения пакета записываются в order_history и broker_orders одной
+    транзакцией до отправки, исходы — одной транзакцией после. Заявки
+    уходят параллельно (в пределах квоты сервиса заявок); при сетевых
+    ошибках отправляются повторно с тем же ключом идемпотентности.
+    Повторный вызов с тем же batch_key не отправляет заявки, уже принятые
+    брокером, а возвращает их сохранённое состояние. batch_key обязателен
+    и должен быть стабильным для «того же» пакета (например, id ребалансировки).
+    """
+
+    def __init__(
+        self,
+        token: str = TINKOFF_TOKEN,
+        sandbox: bool = USE_SANDBOX,
+        concurrency: int = BATCH_CONCURRENCY,
+        retries: int = BATCH_RETRIES
+    ):
+        self.token = token
+        self.sandbox = sandbox
+        self.retries = retries
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit(
+        self,
+        account_id: str,
+        intents: list[OrderIntent],
+        user_id: int,
+        batch_key: str
+    ) -> list[OrderResult]:
+        if not batch_key:
+            raise ValueError("batch_key обязателен: по нему повтор пакета не создаёт новых заявок")
+        results = [OrderResult(intent, order_key(batch_key, i, intent)) for i, intent in enumerate(intents)]
+
+        history = await self._record_intents(account_id, results, user_id)
+        pending = [result for result in results if result.broker_order_id is None]
+        try:
+            await asyncio.gather(*(self._dispatch(account_id, result) for result in pending))
+        finally:
+            portfolio_cache.invalidate(account_id)
+            await self._record_outcomes(results, history)
+
+        failed = sum(1 for result in results if not result.ok)
+        logger.info(
+            f"Order batch {batch_key}: {len(results)} order(s), {len(pending)} sent, {failed} failed"
+        )
+        return results
+
+    async def _record_intents(self, account_id: str, results: list[OrderResult], user_id: int) -> dict:
+        """Одна транзакция: order_history + broker_orders для всех заявок пакета"""
+        keys = [result.client_order_id for result in results]
+        history = {}
+        async with async_session() as session:
+            existing = await session.execute(select(BrokerOrder).where(BrokerOrder.client_order_id.in_(keys)))
+            known = {row.client_order_id: row for row in existing.scalars().all()}
+            entries = await session.execute(select(OrderHistory).where(OrderHistory.client_order_id.in_(keys)))
+            recorded = {entry.client_order_id: entry for entry in entries.scalars().all()}
+
+            for result in results:
+                row = known.get(result.client_order_id)
+                if row is not None and row.broker_order_id is not None:
+                    # Уже принята брокером в прошлой попытке — повторно не отправляем
+                    result.broker_order_id = row.broker_order_id
+                    result.status = row.status
+                    result.lots_executed = row.lots_executed
+                    continue
+                if row is None:
+                    session.add(BrokerOrder(
+                        account_id=account_id,
+                        client_order_id=result.client_order_id,
+                        user_id=user_id,
+                        figi=result.intent.figi,
+                        direction=result.intent.direction,
+                        lots_requested=result.intent.lots,
+                        price=result.intent.price,
+                        status="PENDING"
+                    ))
+                # Повтор пакета обновляет строку истории прошлой попытки, а не добавляет новую
+                entry = recorded.get(result.client_order_id)
+                if entry is None:
+                    entry = OrderHistory(
+                        user_id=user_id,
+                        figi=result.intent.figi,
+                        direction=result.intent.direction,
+                        quantity=result.intent.lots,
+                        price=result.intent.price or 0.0,
+                        client_order_id=result.client_order_id
+                    )
+                    session.add(entry)
+                entry.status = "PENDING"
+                history[result.client_order_id] = entry
+            await session.commit()
+        return history
+
+    async def _record_outcomes(self, results: list[OrderResult], history: dict):
+        """Одна транзакция: исходы всех отправленных заявок пакета"""
+        async with async_session() as session:
+            rows = await session.execute(
+                select(BrokerOrder).where(BrokerOrder.client_order_id.in_(list(history)))
+            )
+            rows = {row.client_order_id: row for row in rows.scalars().all()}
+            # Сверка трекера могла успеть завести эти заявки как «чужие» — убираем дубли
+            sent = [result.broker_order_id for result in results if result.broker_order_id]
+            adopted = await session.execute(
+                select(BrokerOrder).where(
+                    BrokerOrder.broker_order_id.in_(sent),
+                    BrokerOrder.client_order_id.is_(None)
+                )
+            )
+            for row in adopted.scalars().all():
+                await session.delete(row)
+            await session.flush()
+
+            by_key = {result.client_order_id: result for result in results}
+            for key, entry in history.items():
+                result = by_key[key]
+                entry = await session.merge(entry)
+                entry.status = result.status
+                row = rows.get(key)
+                if row is not None:
+                    row.broker_order_id = result.broker_order_id
+                    if result.ok:
+                        row.status = result.status
+                    else:
+                        row.status = "PENDING" if result.retryable else "REJECTED"
+                    row.lots_executed = result.lots_executed
+            await session.commit()
+
+    async def _dispatch(self, account_id: str, result: OrderResult):
+        for attempt in range(self.retries + 1):
+            result.attempts = attempt + 1
+            try:
+                async with self._semaphore:
+                    response = await self._post(account_id, result)
+                result.broker_order_id = response.order_id
+                result.status = STATUS_NAMES.get(response.execution_report_status, "NEW")
+                result.lots_executed = response.lots_executed
+                result.error = None
+                return
+            except AioRpcError as e:
+                result.error = f"{e.code().name}: {e.details()}"
+                result.retryable = e.code() in RETRYABLE_CODES
+                if not result.retryable or attempt == self.retries:
+                    break
+                await asyncio.sleep(BATCH_BACKOFF_SECONDS * 2 ** attempt)
+            except Exception as e:
+                result.error = str(e)
+                break
+        result.status = "FAILED"
+        logger.error(f"Order {result.client_order_id} ({result.intent.figi}) failed: {result.error}")
+
+    async def _post(self, account_id: str, result: OrderResult):
+        intent = result.intent
+        params = {
+            "account_id": account_id,
+            "figi": intent.figi,
+            "quantity": intent.lots,
+            "direction": (
+                OrderDirection.ORDER_DIRECTION_BUY if intent.direction == "BUY"
+                else OrderDirection.ORDER_DIRECTION_SELL
+            ),
+            "order_type": OrderType.ORDER_TYPE_LIMIT if intent.price else OrderType.ORDER_TYPE_MARKET,
+            "order_id": result.client_order_id,
+        }
+        if intent.price:
+            params["price"] = decimal_to_quotation(Decimal(str(intent.price)))
+
+        service = Service.SANDBOX if self.sandbox else Service.ORDERS
+        async with tinkoff_client(self.token, service, Priority.ORDER) as client:
+            if self.sandbox:
+                return await client.sandbox.post_sandbox_order(**params)
+            return await client.orders.post_order(**params)
+
+
+async def submit_orders(
+    account_id: str,
+    intents: list[OrderIntent],
+    user_id: int,
+    batch_key: str
+) -> list[OrderResult]:
+    """Короткий вызов: `await submit_orders(account_id, intents, user_id, batch_key="rebalance:...")`"""
+    return await BatchOrderSubmitter().submit(account_id, intents, user_id, batch_key)
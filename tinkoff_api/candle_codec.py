@@ -0,0 +1,122 @@
+"""
+Колоночный бинарный формат свечей для кэша в Redis.
+
+Формат (little-endian):
+    заголовок  <4s B B H I q q>:
+        magic b"TWC\\0", версия, флаги, резерв, количество свечей,
+        начало и конец покрытого диапазона (unix-секунды)
+    колонки    time[int64 сек], open/high/low/close[int64 в нано-единицах],
+               volume[int64], каждая по count элементов
+
+Флаг FLAG_ZLIB означает, что блок колонок сжат zlib. Цены хранятся
+в целых нано-единицах (units * 1e9 + nano), поэтому Quotation
+восстанавливается без потерь.
+"""
+import struct
+import zlib
+from typing import NamedTuple
+
+import numpy as np
+
+MAGIC = b"TWC\0"
+VERSION = 1
+FLAG_ZLIB = 0x01
+
+NANO = 1_000_000_000
+
+_HEADER = struct.Struct("<4sBBHIqq")
+_COLUMNS = ("time", "open", "high", "low", "close", "volume")
+
+
+class CandleCodecError(ValueError):
+    pass
+
+
+class CandleArrays(NamedTuple):
+    """Свечи в виде массивов NumPy (цены — float64 в единицах валюты)"""
+    time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self):
+        return len(self.time)
+
+    @classmethod
+    def empty(cls) -> "CandleArrays":
+        return cls(
+            np.empty(0, dtype=np.int64),
+            *(np.empty(0, dtype=np.float64) for _ in range(4)),
+            np.empty(0, dtype=np.int64)
+        )
+
+    def slice(self, start: int, stop: int | None = None) -> "CandleArrays":
+        """Срез по времени [start, stop) в unix-секундах"""
+        lo = int(np.searchsorted(self.time, start, side="left"))
+        hi = len(self.time) if stop is None else int(np.searchsorted(self.time, stop, side="left"))
+        return CandleArrays(*(column[lo:hi] for column in self))
+
+    def concat(self, other: "CandleArrays") -> "CandleArrays":
+        return CandleArrays(*(np.concatenate([a, b]) for a, b in zip(self, other)))
+
+
+def prices_to_nano(prices: np.ndarray) -> np.ndarray:
+    return np.rint(np.asarray(prices, dtype=np.float64) * NANO).astype(np.int64)
+
+
+def encode_candles(
+    arrays: CandleArrays,
+    covered_from: int = 0,
+    covered_to: int = 0,
+    compress: bool = True
+) -> bytes:
+    count = len(arrays)
+    columns = (
+        np.ascontiguousarray(arrays.time, dtype="<i8"),
+        *(prices_to_nano(getattr(arrays, name)).astype("<i8", copy=False)
+          for name in ("open", "high", "low", "close")),
+        np.ascontiguousarray(arrays.volume, dtype="<i8"),
+    )
+    body = b"".join(column.tobytes() for column in columns)
+    flags = 0
+    if compress:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_ZLIB
+    header = _HEADER.pack(MAGIC, VERSION, flags, 0, count, covered_from, covered_to)
+    return header + body
+
+
+def decode_header(payload: bytes) -> tuple[int, int, int, int]:
+    """(флаги, количество, начало, конец) из заголовка"""
+    if len(payload) < _HEADER.size:
+        raise CandleCodecError("Слишком короткий payload")
+    magic, version, flags, _, count, covered_from, covered_to = _HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise CandleCodecError("Неизвестный формат кэша свечей")
+    if version != VERSION:
+        raise CandleCodecError(f"Неподдерживаемая версия формата: {version}")
+    return flags, count, covered_from, covered_to
+
+
+def decode_candles(payload: bytes) -> tuple[CandleArrays, int, int]:
+    """Декодирует payload в массивы без создания объектов на каждую свечу"""
+    flags, count, covered_from, covered_to = decode_header(payload)
+    body = memoryview(payload)[_HEADER.size:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    if len(body) != count * 8 * len(_COLUMNS):
+        raise CandleCodecError("Повреждённый payload свечей")
+
+    raw = np.frombuffer(body, dtype="<i8").reshape(len(_COLUMNS), count)
+    time, open_, high, low, close, volume = raw
+    arrays = CandleArrays(
+        time.astype(np.int64, copy=False),
+        open_ / NANO,
+        high / NANO,
+        low / NANO,
+        close / NANO,
+        volume.astype(np.int64, copy=False)
+    )
+    return arrays, covered_from, covered_to
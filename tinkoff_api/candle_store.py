@@ -0,0 +1,323 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+import numpy as np
+from tinkoff.invest import CandleInterval, HistoricCandle, Quotation
+from tinkoff.invest.utils import now
+
+from db.session import get_redis
+from tinkoff_api.candle_codec import (
+    NANO,
+    CandleArrays,
+    CandleCodecError,
+    decode_candles,
+    encode_candles,
+    prices_to_nano,
+)
+from utils.logger import logger
+
+# Длительность одной свечи для каждого интервала
+INTERVAL_STEP = {
+    CandleInterval.CANDLE_INTERVAL_1_MIN: timedelta(minutes=1),
+    CandleInterval.CANDLE_INTERVAL_5_MIN: timedelta(minutes=5),
+    CandleInterval.CANDLE_INTERVAL_15_MIN: timedelta(minutes=15),
+    CandleInterval.CANDLE_INTERVAL_HOUR: timedelta(hours=1),
+    CandleInterval.CANDLE_INTERVAL_DAY: timedelta(days=1),
+}
+
+# Максимальный период одного запроса GetCandles для интервала
+INTERVAL_MAX_SPAN = {
+    CandleInterval.CANDLE_INTERVAL_1_MIN: timedelta(days=1),
+    CandleInterval.CANDLE_INTERVAL_5_MIN: timedelta(days=1),
+    CandleInterval.CANDLE_INTERVAL_15_MIN: timedelta(days=1),
+    CandleInterval.CANDLE_INTERVAL_HOUR: timedelta(weeks=1),
+    CandleInterval.CANDLE_INTERVAL_DAY: timedelta(days=365),
+}
+
+# Длина куска ряда в Redis (ключ на кусок): дозапись хвоста перекодирует
+# только последний кусок, а не весь ряд
+CHUNK_SPAN = {
+    CandleInterval.CANDLE_INTERVAL_1_MIN: timedelta(days=1),
+    CandleInterval.CANDLE_INTERVAL_5_MIN: timedelta(days=7),
+    CandleInterval.CANDLE_INTERVAL_15_MIN: timedelta(days=14),
+    CandleInterval.CANDLE_INTERVAL_HOUR: timedelta(days=60),
+    CandleInterval.CANDLE_INTERVAL_DAY: timedelta(days=730),
+}
+
+
+CandleFetcher = Callable[[str, datetime, datetime, CandleInterval], Awaitable[list[HistoricCandle]]]
+
+
+def _quotation(value: int) -> Quotation:
+    units, nano = divmod(abs(value), NANO)
+    sign = -1 if value < 0 else 1
+    return Quotation(units=sign * units, nano=sign * nano)
+
+
+def candles_to_arrays(candles: list[HistoricCandle]) -> CandleArrays:
+    """Список HistoricCandle -> колоночные массивы"""
+    count = len(candles)
+
+    def prices(field):
+        return np.fromiter(
+            (getattr(c, field).units * NANO + getattr(c, field).nano for c in candles),
+            dtype=np.int64, count=count
+        ) / NANO
+
+    return CandleArrays(
+        np.fromiter((int(c.time.timestamp()) for c in candles), dtype=np.int64, count=count),
+        prices("open"),
+        prices("high"),
+        prices("low"),
+        prices("close"),
+        np.fromiter((c.volume for c in candles), dtype=np.int64, count=count)
+    )
+
+
+def arrays_to_candles(arrays: CandleArrays, is_complete: bool = True) -> list[HistoricCandle]:
+    """Колоночные массивы -> список HistoricCandle (только для отображения)"""
+    columns = [prices_to_nano(getattr(arrays, field)).tolist() for field in ("open", "high", "low", "close")]
+    return [
+        HistoricCandle(
+            time=datetime.fromtimestamp(ts, tz=timezone.utc),
+            open=_quotation(o),
+            high=_quotation(h),
+            low=_quotation(l),
+            close=_quotation(c),
+            volume=volume,
+            is_complete=is_complete
+        )
+        for ts, o, h, l, c, volume in zip(arrays.time.tolist(), *columns, arrays.volume.tolist())
+    ]
+
+
+def file_sink(files):
+    """Приёмник массовой загрузки, пишущий в CandleFileStore (db.candle_files)"""
+    async def sink(figi: str, interval: CandleInterval, candles: list[HistoricCandle], from_: datetime, to: datetime):
+        completed = candles_to_arrays([c for c in candles if c.is_complete])
+        covered_to = min([_ts(to)] + [_ts(c.time) for c in candles if not c.is_complete])
+        await asyncio.to_thread(files.write, figi, interval, completed, _ts(from_), covered_to)
+    return sink
+
+
+class CandleSeries:
+    """Закрытые свечи одного (figi, interval) и покрытый ими диапазон времени"""
+
+    def __init__(self, covered_from: int, covered_to: int, arrays: CandleArrays):
+        self.covered_from = covered_from
+        self.covered_to = covered_to
+        self.arrays = arrays
+
+
+class ChunkMissing(Exception):
+    """Кусок ряда пропал из Redis или повреждён — ряд нужно перекачать"""
+
+
+def _ts(value: datetime) -> int:
+    return int(value.timestamp())
+
+
+def _dt(value: int) -> datetime:
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+def window_start(days: int) -> int:
+    """Начало окна последних `days` дней в unix-секундах"""
+    return _ts(now() - timedelta(days=days))
+
+
+class CandleStore:
+    """
+    Дозаписываемое хранилище свечей по ключу (figi, interval).
+
+    Закрытые свечи хранятся в Redis бессрочно: они больше не меняются.
+    Ряд лежит кусками по CHUNK_SPAN (ключ на кусок) плюс ключ с покрытым
+    диапазоном. При запросе догружается только хвост после последней
+    закрытой свечи (и начало истории, если запрошено окно шире
+    сохранённого); перезаписываются только затронутые куски, а читаются
+    только куски запрошенного окна.
+    """
+    _locks = defaultdict(asyncio.Lock)
+
+    def __init__(self, fetcher: CandleFetcher):
+        self.fetcher = fetcher
+
+    @staticmethod
+    def _key(figi: str, interval: CandleInterval) -> str:
+        return f"candles:{figi}:{int(interval)}"
+
+    def _chunk_key(self, figi: str, interval: CandleInterval, chunk: int) -> str:
+        return f"{self._key(figi, interval)}:{chunk}"
+
+    @staticmethod
+    def _chunks(interval: CandleInterval, start: int, stop: int) -> range:
+        """Начала кусков, пересекающих [start, stop)"""
+        span = int(CHUNK_SPAN[interval].total_seconds())
+        return range(start - start % span, stop, span)
+
+    async def _load_meta(self, redis, figi: str, interval: CandleInterval) -> tuple[int, int] | None:
+        payload = await redis.get(f"{self._key(figi, interval)}:meta")
+        if not payload:
+            return None
+        covered_from, covered_to = map(int, payload.split(b":"))
+        return covered_from, covered_to
+
+    async def _save_meta(self, redis, figi: str, interval: CandleInterval, covered_from: int, covered_to: int):
+        await redis.set(f"{self._key(figi, interval)}:meta", f"{covered_from}:{covered_to}")
+
+    async def _drop(self, redis, figi: str, interval: CandleInterval, covered_from: int, covered_to: int):
+        keys = [self._chunk_key(figi, interval, chunk) for chunk in self._chunks(interval, covered_from, covered_to)]
+        await redis.delete(f"{self._key(figi, interval)}:meta", *keys)
+
+    async def _read(self, redis, figi: str, interval: CandleInterval, start: int, stop: int) -> CandleArrays:
+        """Свечи [start, stop) из кусков; пропавший или битый кусок — ChunkMissing"""
+        chunks = self._chunks(interval, start, stop)
+        if not len(chunks):
+            return CandleArrays.empty()
+        payloads = await redis.mget([self._chunk_key(figi, interval, chunk) for chunk in chunks])
+        arrays = CandleArrays.empty()
+        for chunk, payload in zip(chunks, payloads):
+            if payload is None:
+                raise ChunkMissing(f"нет куска {chunk}")
+            try:
+                arrays = arrays.concat(decode_candles(payload)[0])
+            except CandleCodecError as e:
+                raise ChunkMissing(f"кусок {chunk}: {e}") from e
+        return arrays.slice(start, stop)
+
+    async def _write(
+        self,
+        redis,
+        figi: str,
+        interval: CandleInterval,
+        arrays: CandleArrays,
+        new_from: int,
+        new_to: int
+    ):
+        """Записывает свечи диапазона [new_from, new_to); остальные свечи затронутых кусков сохраняются"""
+        span = int(CHUNK_SPAN[interval].total_seconds())
+        chunks = self._chunks(interval, new_from, new_to)
+        keys = [self._chunk_key(figi, interval, chunk) for chunk in chunks]
+        payloads = await redis.mget(keys)
+        updates = {}
+        for chunk, key, payload in zip(chunks, keys, payloads):
+            stored = CandleArrays.empty()
+            if payload:
+                try:
+                    stored = decode_candles(payload)[0]
+                except CandleCodecError as e:
+                    logger.warning(f"Overwriting candle chunk {key}: {e}")
+            merged = stored.slice(chunk, new_from).concat(arrays.slice(max(chunk, new_from), min(chunk + span, new_to)))
+            updates[key] = encode_candles(merged.concat(stored.slice(new_to)), chunk, chunk + span)
+        if updates:
+            await redis.mset(updates)
+
+    async def _load(self, redis, figi: str, interval: CandleInterval, start: int) -> CandleSeries | None:
+        """Ряд от начала куска с `start`: диапазон из meta, свечи только из нужных кусков"""
+        meta = await self._load_meta(redis, figi, interval)
+        if meta is None:
+            return None
+        covered_from, covered_to = meta
+        span = int(CHUNK_SPAN[interval].total_seconds())
+        start = max(covered_from, start - start % span)
+        try:
+            arrays = await self._read(redis, figi, interval, start, covered_to)
+        except ChunkMissing as e:
+            # Куски вытеснены или повреждены — перекачиваем ряд заново
+            logger.warning(f"Dropping candle series {figi}: {e}")
+            await self._drop(redis, figi, interval, covered_from, covered_to)
+            return None
+        return CandleSeries(covered_from, covered_to, arrays)
+
+    async def sync(self, figi: str, interval: CandleInterval, days: int) -> tuple[CandleSeries, CandleArrays]:
+        """
+        Догружает недостающие свечи за последние `days` дней.
+        Возвращает сохранённый ряд от начала куска, в который попадает
+        начало окна, и текущие формирующиеся свечи.
+        """
+        async with self._locks[(figi, interval)]:
+            redis = await get_redis()
+            end = now()
+            start = _ts(end - timedelta(days=days))
+            step = int(INTERVAL_STEP[interval].total_seconds())
+
+            series = await self._load(redis, figi, interval, start)
+            changed = False
+            if series is None:
+                # Заодно убираем ряд старого формата — один ключ на всю историю
+                await redis.delete(self._key(figi, interval))
+                series = CandleSeries(start, start, CandleArrays.empty())
+                changed = True
+
+            # Начало истории: окно шире, чем уже сохранено
+            if start < series.covered_from:
+                head = await self.fetcher(figi, _dt(start), _dt(series.covered_from), interval)
+                head = candles_to_arrays([c for c in head if c.is_complete])
+                await self._write(redis, figi, interval, head, start, series.covered_from)
+                series.arrays = head.concat(series.arrays)
+                series.covered_from = start
+                changed = True
+
+            # Хвост: всё после последней закрытой свечи
+            tail = await self.fetcher(figi, _dt(series.covered_to), end, interval)
+            completed = candles_to_arrays([c for c in tail if c.is_complete])
+            forming = candles_to_arrays([c for c in tail if not c.is_complete])
+            if len(completed):
+                covered_to = int(completed.time[-1]) + step
+                await self._write(redis, figi, interval, completed, series.covered_to, covered_to)
+                series.arrays = series.arrays.concat(completed)
+                series.covered_to = covered_to
+                changed = True
+
+            if changed:
+                await self._save_meta(redis, figi, interval, series.covered_from, series.covered_to)
+
+            logger.debug(
+                f"Candle store {figi}: {len(series.arrays)} loaded, "
+                f"{len(completed)} appended, {len(forming)} forming"
+            )
+            return series, forming
+
+    async def merge(
+        self,
+        figi: str,
+        interval: CandleInterval,
+        candles: list[HistoricCandle],
+        from_: datetime,
+        to: datetime
+    ):
+        """
+        Вливает в ряд закрытые свечи, загруженные за [from_, to) в обход sync
+        (массовая загрузка истории). Ряд остаётся непрерывным: если новый
+        диапазон не примыкает к сохранённому, сохранённый заменяется —
+        недостающее догрузит sync.
+        """
+        async with self._locks[(figi, interval)]:
+            redis = await get_redis()
+            completed = [c for c in candles if c.is_complete]
+            new_from, new_to = _ts(from_), _ts(to)
+            incomplete = [_ts(c.time) for c in candles if not c.is_complete]
+            if incomplete:
+                new_to = min(new_to, min(incomplete))
+            arrays = candles_to_arrays(completed).slice(new_from, new_to)
+
+            meta = await self._load_meta(redis, figi, interval)
+            if meta is None or new_to < meta[0] or new_from > meta[1]:
+                if meta is not None:
+                    await self._drop(redis, figi, interval, *meta)
+                covered_from, covered_to = new_from, new_to
+            else:
+                covered_from, covered_to = min(meta[0], new_from), max(meta[1], new_to)
+            await self._write(redis, figi, interval, arrays, new_from, new_to)
+            await self._save_meta(redis, figi, interval, covered_from, covered_to)
+
+    async def get_arrays(self, figi: str, interval: CandleInterval, days: int) -> CandleArrays:
+        """Свечи за последние `days` дней: закрытые из хранилища + текущая формирующаяся"""
+        series, forming = await self.sync(figi, interval, days)
+        return series.arrays.slice(window_start(days)).concat(forming)
+
+    async def get_window(self, figi: str, interval: CandleInterval, days: int) -> list[HistoricCandle]:
+        arrays = await self.get_arrays(figi, interval, days)
+        return arrays_to_candles(arrays)
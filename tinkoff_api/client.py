@@ -1,86 +1,161 @@
-from tinkoff.invest import AsyncClient, OrderDirection, OrderType, OrderExecutionReportStatus
+from tinkoff.invest import OrderDirection, OrderType, OrderExecutionReportStatus
 from config import TINKOFF_TOKEN, USE_SANDBOX
-from datetime import datetime, timedelta
+from datetime import timedelta
+from tinkoff.invest.utils import now
 from utils.logger import log_action
+from tinkoff_api.connection import tinkoff_client
+from utils.singleflight import SingleFlight, coalesce, make_key
+from tinkoff_api.portfolio_cache import portfolio_cache
+from tinkoff_api.quota import Priority, Service
+from tinkoff_api.order_state import record_order
+from tinkoff_api.orders import client_order_key
+from tinkoff_api.resilience import CircuitOpenError, DeadlineExceeded, Endpoint
+from utils.logger import logger
 
 # Определяем кастомное исключение внутри файла
 class TinkoffAPIError(Exception):
     pass
 
+class TinkoffUnavailableError(TinkoffAPIError):
+    """API отключён выключателем или не уложился в дедлайн запроса"""
+
+# Портфель одного счёта, запрошенный несколькими пользователями одновременно
+_portfolio_flight = SingleFlight("get_portfolio")
+
 class TinkoffClient:
     def __init__(self, token: str = TINKOFF_TOKEN, sandbox: bool = USE_SANDBOX):
         self.token = token
         self.sandbox = sandbox
 
+    def _service(self, service: str) -> str:
+        """В песочнице все вызовы считаются по лимиту SandboxService"""
+        return Service.SANDBOX if self.sandbox else service
+
     async def get_portfolio(self, account_id: str):
+        """Снимок портфеля: свежий — сразу, устаревший — с фоновым обновлением"""
+        try:
+            return await portfolio_cache.get(account_id, lambda: self._fetch_portfolio(account_id))
+        except TinkoffUnavailableError:
+            # Пока API недоступен, лучше показать последний снимок, чем ошибку
+            snapshot = portfolio_cache.peek(account_id)
+            if snapshot is None:
+                raise
+            logger.warning(f"Serving last known portfolio for {account_id}: API unavailable")
+            return snapshot
+
+    @coalesce(
+        _portfolio_flight,
+        key=lambda self, account_id: make_key(self.token, self.sandbox, account_id)
+    )
+    async def _fetch_portfolio(self, account_id: str):
         try:
-            async with AsyncClient(self.token) as client:
-                if self.sandbox:
-                    return await client.sandbox.get_sandbox_portfolio(account_id=account_id)
-                return await client.operations.get_portfolio(account_id=account_id)
+            return await Endpoint.get("get_portfolio").call(lambda: self._request_portfolio(account_id))
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            # Быстрый отказ: без записи в БД, чтобы не нагружать её во время сбоя API
+            raise TinkoffUnavailableError(f"Ошибка получения портфеля: {str(e)}") from e
         except Exception as e:
             await log_action("tinkoff_error", f"get_portfolio: {str(e)}")
             raise TinkoffAPIError(f"Ошибка получения портфеля: {str(e)}")
 
+    async def _request_portfolio(self, account_id: str):
+        async with tinkoff_client(
+            self.token, self._service(Service.OPERATIONS), Priority.PORTFOLIO
+        ) as client:
+            if self.sandbox:
+                return await client.sandbox.get_sandbox_portfolio(account_id=account_id)
+            return await client.operations.get_portfolio(account_id=account_id)
+
+    async def _request_orders(self, account_id: str):
+        async with tinkoff_client(
+            self.token, self._service(Service.ORDERS), Priority.PORTFOLIO
+        ) as client:
+            if self.sandbox:
+                return await client.sandbox.get_sandbox_orders(account_id=account_id)
+            return await client.orders.get_orders(account_id=account_id)
+
     async def get_orders(self, account_id: str):
         try:
-            async with AsyncClient(self.token) as client:
-                if self.sandbox:
-                    orders_response = await client.sandbox.get_sandbox_orders(account_id=account_id)
-                else:
-                    orders_response = await client.orders.get_orders(account_id=account_id)
-                
-                active_statuses = [
-                    OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW,
-                    OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_PARTIALLYFILL
-                ]
-                
-                active_orders = [
-                    order for order in orders_response.orders
-                    if order.execution_report_status in active_statuses
-                ]
-                
-                executed_orders = [
-                    order for order in orders_response.orders
-                    if order.execution_report_status == OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL
-                    and datetime.utcnow() - order.order_date < timedelta(days=7)
-                ]
-                
-                return active_orders, executed_orders
+            orders_response = await Endpoint.get("get_orders").call(lambda: self._request_orders(account_id))
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            raise TinkoffUnavailableError(f"Ошибка получения ордеров: {str(e)}") from e
         except Exception as e:
             await log_action("tinkoff_error", f"get_orders: {str(e)}")
             raise TinkoffAPIError(f"Ошибка получения ордеров: {str(e)}")
 
+        active_statuses = [
+            OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW,
+            OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_PARTIALLYFILL
+        ]
+
+        active_orders = [
+            order for order in orders_response.orders
+            if order.execution_report_status in active_statuses
+        ]
+
+        # order_date приходит в UTC с таймзоной — сравниваем с aware-временем
+        cutoff = now() - timedelta(days=7)
+        executed_orders = [
+            order for order in orders_response.orders
+            if order.execution_report_status == OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL
+            and order.order_date >= cutoff
+        ]
+
+        return active_orders, executed_orders
+
     async def execute_order(
         self,
         account_id: str,
         figi: str,
         quantity: int,
         price: float,
-        direction: OrderDirection
+        direction: OrderDirection,
+        client_order_id: str | None = None,
+        user_id: int | None = None,
+        order_id: int | None = None
     ):
+        request_params = {
+            # Повтор с тем же ордером уходит с тем же ключом и не исполняется дважды
+            "order_id": client_order_key(
+                client_order_id, user_id, order_id, account_id, figi, direction, quantity, price
+            ),
+            "figi": figi,
+            "quantity": quantity,
+            "price": price,
+            "direction": direction,
+            "account_id": account_id,
+            "order_type": OrderType.ORDER_TYPE_LIMIT
+        }
         try:
-            async with AsyncClient(self.token) as client:
-                request_params = {
-                    "figi": figi,
-                    "quantity": quantity,
-                    "price": price,
-                    "direction": direction,
-                    "account_id": account_id,
-                    "order_type": OrderType.ORDER_TYPE_LIMIT
-                }
-                
-                if self.sandbox:
-                    response = await client.sandbox.post_sandbox_order(**request_params)
-                else:
-                    response = await client.orders.post_order(**request_params)
-                
-                await log_action(
-                    "order_executed", 
-                    f"{direction} {figi} {quantity}@{price}",
-                    metadata={"status": response.execution_report_status.name}
-                )
-                return response
+            # Ушедшую заявку дедлайн хендлера не обрывает: иначе её судьба неизвестна
+            response = await Endpoint.get("post_order").call(
+                lambda: self._post_order(request_params), cancellable=False
+            )
+            await log_action(
+                "order_executed",
+                f"{direction} {figi} {quantity}@{price} ({response.execution_report_status.name})"
+            )
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            raise TinkoffUnavailableError(f"Ошибка исполнения ордера: {str(e)}") from e
         except Exception as e:
             await log_action("tinkoff_error", f"execute_order: {str(e)}")
-            raise TinkoffAPIError(f"Ошибка исполнения ордера: {str(e)}")
\ No newline at end of file
+            raise TinkoffAPIError(f"Ошибка исполнения ордера: {str(e)}")
+        finally:
+            # Ордер мог дойти до биржи даже при ошибке — не показываем старый снимок
+            portfolio_cache.invalidate(account_id)
+
+        try:
+            await record_order(
+                account_id, response, figi, direction, quantity, price, user_id, order_id,
+                client_order_id=request_params["order_id"]
+            )
+        except Exception as e:
+            logger.error(f"Failed to record order {response.order_id}: {e}")
+        return response
+
+    async def _post_order(self, request_params: dict):
+        async with tinkoff_client(
+            self.token, self._service(Service.ORDERS), Priority.ORDER
+        ) as client:
+            if self.sandbox:
+                return await client.sandbox.post_sandbox_order(**request_params)
+            return await client.orders.post_order(**request_params)
\ No newline at end of file
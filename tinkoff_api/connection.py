@@ -0,0 +1,161 @@
+import asyncio
+import itertools
+from contextlib import asynccontextmanager, suppress
+
+import grpc
+from grpc.aio import AioRpcError
+from tinkoff.invest import AsyncClient
+from tinkoff.invest.async_services import AsyncServices
+
+from config import TINKOFF_TOKEN, TINKOFF_CHANNEL_POOL_SIZE
+from tinkoff_api.quota import Priority, quota
+from tinkoff_api.resilience import mark_rpc_started
+from utils.logger import logger
+
+# Коды gRPC, после которых канал считаем разорванным и переоткрываем
+RECONNECT_CODES = {grpc.StatusCode.UNAVAILABLE}
+
+
+class _PooledChannel:
+    """Один открытый AsyncClient (gRPC-канал) и его сервисы"""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.client = None
+        self.services = None
+        self.broken = False
+
+    async def open(self):
+        self.client = AsyncClient(self.token)
+        self.services = await self.client.__aenter__()
+        self.broken = False
+
+    async def close(self):
+        client, self.client, self.services = self.client, None, None
+        if client is not None:
+            with suppress(Exception):
+                await client.__aexit__(None, None, None)
+
+    def is_alive(self) -> bool:
+        if self.services is None or self.broken:
+            return False
+        channel = getattr(self.client, "_channel", None)
+        if channel is None:
+            return True
+        return channel.get_state() != grpc.ChannelConnectivity.SHUTDOWN
+
+
+class TinkoffConnectionManager:
+    """
+    Процессный менеджер долгоживущих каналов Tinkoff Invest API.
+
+    На каждый токен держится небольшой пул каналов (TINKOFF_CHANNEL_POOL_SIZE),
+    которые раздаются вызывающему коду по кругу. Разорванный канал
+    переоткрывается при следующем обращении.
+    """
+    _instance = None
+    _pools: dict = {}
+    _cursors: dict = {}
+    _lock = asyncio.Lock()
+    _stats = {"opened": 0, "reused": 0, "reconnects": 0, "dropped": 0}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    async def start(self, *tokens: str):
+        """Открывает пулы каналов заранее (вызывается при старте бота)"""
+        for token in tokens or (TINKOFF_TOKEN,):
+            if token:
+                await self._ensure_pool(token)
+
+    async def _ensure_pool(self, token: str) -> list:
+        pool = self._pools.get(token)
+        if pool is not None:
+            return pool
+        async with self._lock:
+            pool = self._pools.get(token)
+            if pool is None:
+                pool = []
+                for _ in range(max(1, TINKOFF_CHANNEL_POOL_SIZE)):
+                    channel = _PooledChannel(token)
+                    await channel.open()
+                    self._stats["opened"] += 1
+                    pool.append(channel)
+                self._pools[token] = pool
+                self._cursors[token] = itertools.count()
+                logger.info(f"Opened {len(pool)} Tinkoff API channel(s)")
+        return pool
+
+    async def _acquire(self, token: str) -> _PooledChannel:
+        pool = await self._ensure_pool(token)
+        channel = pool[next(self._cursors[token]) % len(pool)]
+        if channel.is_alive():
+            self._stats["reused"] += 1
+            return channel
+        async with self._lock:
+            # Канал мог быть переоткрыт, пока мы ждали блокировку
+            if not channel.is_alive():
+                await channel.close()
+                await channel.open()
+                self._stats["reconnects"] += 1
+                logger.warning("Tinkoff API channel reconnected")
+        return channel
+
+    async def get_services(self, token: str = TINKOFF_TOKEN) -> AsyncServices:
+        channel = await self._acquire(token)
+        return channel.services
+
+    @asynccontextmanager
+    async def client(
+        self,
+        token: str = TINKOFF_TOKEN,
+        service: str | None = None,
+        priority: Priority = Priority.MARKET_DATA,
+        cost: float = 1
+    ):
+        """
+        Замена `async with AsyncClient(token)` без открытия нового канала.
+
+        Если указан `service`, перед запросом берётся квота этого сервиса
+        (см. tinkoff_api.quota); `cost` — ожидаемое число запросов.
+        """
+        if service is not None:
+            await quota.acquire(service, priority, cost)
+        channel = await self._acquire(token)
+        # Дальше время идёт на сам запрос — для выключателя это уже ответственность API
+        mark_rpc_started()
+        try:
+            yield channel.services
+        except AioRpcError as e:
+            if e.code() in RECONNECT_CODES:
+                channel.broken = True
+                self._stats["dropped"] += 1
+            raise
+
+    async def close(self):
+        """Закрывает все каналы (вызывается при остановке бота)"""
+        async with self._lock:
+            for pool in self._pools.values():
+                for channel in pool:
+                    await channel.close()
+            self._pools.clear()
+            self._cursors.clear()
+        logger.info(f"Tinkoff API channels closed: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "channels": sum(len(pool) for pool in self._pools.values()),
+        }
+
+
+def tinkoff_client(
+    token: str = TINKOFF_TOKEN,
+    service: str | None = None,
+    priority: Priority = Priority.MARKET_DATA,
+    cost: float = 1
+):
+    """Короткий доступ к общему каналу: `async with tinkoff_client() as client`"""
+    return TinkoffConnectionManager().client(token, service, priority, cost)
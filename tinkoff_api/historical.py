@@ -1,16 +1,19 @@
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 from tinkoff.invest import (
-    AsyncClient,
     CandleInterval,
-    HistoricCandle,
-    Quotation
+    HistoricCandle
 )
-from tinkoff.invest.utils import now, quotation_to_decimal
-from db.session import get_redis
+from tinkoff.invest.utils import quotation_to_decimal
 from config import TINKOFF_TOKEN  # Используем только TINKOFF_TOKEN
 from tinkoff_api.instruments import InstrumentCache
+from tinkoff_api.connection import tinkoff_client
+from tinkoff_api.candle_store import CandleStore, INTERVAL_MAX_SPAN, INTERVAL_STEP, arrays_to_candles, window_start
+from tinkoff_api.candle_codec import CandleArrays
+from tinkoff_api.resample import ResampleCache
+from tinkoff_api.quota import Priority, Service
+from tinkoff_api.resilience import Endpoint
 from utils.logger import logger
+from utils.singleflight import SingleFlight, coalesce, make_key
 
 # ОБНОВЛЕНО: Ключи приведены в соответствие с callback-запросами
 INTERVAL_MAPPING = {
@@ -21,10 +24,29 @@ INTERVAL_MAPPING = {
     'day': CandleInterval.CANDLE_INTERVAL_DAY,
 }
 
+# Базовый интервал, из которого собираются более крупные
+BASE_INTERVAL = CandleInterval.CANDLE_INTERVAL_1_MIN
+
+# Интервалы, которые точно агрегируются из минутных свечей
+RESAMPLED_INTERVALS = {
+    CandleInterval.CANDLE_INTERVAL_5_MIN,
+    CandleInterval.CANDLE_INTERVAL_15_MIN,
+    CandleInterval.CANDLE_INTERVAL_HOUR,
+}
+
+# Для более длинных окон минутная база слишком велика — идём в API напрямую
+RESAMPLE_MAX_DAYS = 14
+
+# Одинаковые одновременные запросы свечей (кнопка «🔄 Обновить») идут в API один раз
+_candles_flight = SingleFlight("get_candles")
+
 class HistoricalData:
+    _resample_cache = ResampleCache()
+
     def __init__(self):
         self.instrument_cache = InstrumentCache()
         self.token = TINKOFF_TOKEN  # Используем единый токен
+        self.store = CandleStore(self._fetch_candles)
 
     async def get_candles(
         self,
@@ -32,65 +54,97 @@ class HistoricalData:
         interval: CandleInterval,
         days: int = 7
     ) -> list[HistoricCandle]:
+        arrays = await self.get_candle_arrays(ticker, interval, days)
+        return arrays_to_candles(arrays)
+
+    @coalesce(
+        _candles_flight,
+        key=lambda self, ticker, interval, days=7: make_key(ticker, interval, days)
+    )
+    async def get_candle_arrays(
+        self,
+        ticker: str,
+        interval: CandleInterval,
+        days: int = 7
+    ) -> CandleArrays:
+        """Те же свечи в виде массивов NumPy — без объектов на каждую свечу"""
+        figi = await self._resolve_figi(ticker)
+        if interval in RESAMPLED_INTERVALS and days <= RESAMPLE_MAX_DAYS:
+            return await self._get_resampled(figi, interval, days)
+        return await self.store.get_arrays(figi, interval, days)
+
+    async def _get_resampled(self, figi: str, interval: CandleInterval, days: int) -> CandleArrays:
+        """Свечи крупного интервала, собранные из минутной базы"""
+        series, forming = await self.store.sync(figi, BASE_INTERVAL, days)
+        step = int(INTERVAL_STEP[interval].total_seconds())
+        # База читается от начала куска с началом окна — у разных окон своё начало
+        resampled = self._resample_cache.resample(
+            (figi, interval, days), series.arrays, forming, series.covered_to, step
+        )
+        return resampled.slice(window_start(days))
+
+    async def _resolve_figi(self, ticker: str) -> str:
         figi = await self.instrument_cache.get_figi(ticker)
         if not figi:
             raise ValueError(f"Инструмент {ticker} не найден")
+        return figi
+
+    async def _fetch_candles(
+        self,
+        figi: str,
+        from_: datetime,
+        to: datetime,
+        interval: CandleInterval
+    ) -> list[HistoricCandle]:
+        """
+        Загрузка свечей из API за произвольный диапазон: по одному запросу
+        GetCandles на отрезок INTERVAL_MAX_SPAN. Выключатель, p95 и хедж —
+        у каждого запроса отдельно, поэтому длинный диапазон не дублируется целиком.
+        """
+        candles = []
+        span = INTERVAL_MAX_SPAN[interval]
+        start = from_
+        while start < to:
+            end = min(start + span, to)
+            # Чтение идемпотентно: при задержке дольше p95 уходит второй запрос
+            candles.extend(await Endpoint.get("get_candles").call(
+                lambda start=start, end=end: self._request_candles(figi, start, end, interval, Priority.MARKET_DATA),
+                hedge=True
+            ))
+            start = end
+        logger.info(f"Loaded {len(candles)} candles for {figi} from API")
+        return candles
 
-        # Проверяем кэш
-        cache_key = f"candles:{figi}:{interval}:{days}"
-        redis = await get_redis()
-        cached = await redis.get(cache_key)
-        
-        if cached:
-            try:
-                # Десериализуем данные из JSON
-                cached_data = json.loads(cached)
-                candles = [
-                    HistoricCandle(
-                        time=datetime.fromisoformat(candle["time"]),
-                        open=Quotation(units=candle["open"]["units"], nano=candle["open"]["nano"]),
-                        high=Quotation(units=candle["high"]["units"], nano=candle["high"]["nano"]),
-                        low=Quotation(units=candle["low"]["units"], nano=candle["low"]["nano"]),
-                        close=Quotation(units=candle["close"]["units"], nano=candle["close"]["nano"]),
-                        volume=candle["volume"]
-                    )
-                    for candle in cached_data
-                ]
-                return candles
-            except Exception as e:
-                logger.error(f"Error deserializing cached data: {e}")
-                # В случае ошибки игнорируем кэш и загружаем заново
-
-        # Получаем данные из API
-        async with AsyncClient(self.token) as client:
-            end_time = now()
-            start_time = end_time - timedelta(days=days)
-            
-            candles = []
-            async for candle in client.get_all_candles(
-                figi=figi,
-                from_=start_time,
-                to=end_time,
-                interval=interval
-            ):
-                candles.append(candle)
-            
-            # Сериализуем и кэшируем на 15 минут
-            serialized_candles = [
-                {
-                    "time": candle.time.isoformat(),
-                    "open": {"units": candle.open.units, "nano": candle.open.nano},
-                    "high": {"units": candle.high.units, "nano": candle.high.nano},
-                    "low": {"units": candle.low.units, "nano": candle.low.nano},
-                    "close": {"units": candle.close.units, "nano": candle.close.nano},
-                    "volume": candle.volume
-                }
-                for candle in candles
-            ]
-            await redis.set(cache_key, json.dumps(serialized_candles), ex=900)
-            
-            logger.info(f"Loaded {len(candles)} candles for {ticker} from API")
-            return candles
+    async def fetch_backfill_chunk(
+        self,
+        figi: str,
+        from_: datetime,
+        to: datetime,
+        interval: CandleInterval
+    ) -> list[HistoricCandle]:
+        """
+        Один отрезок массовой загрузки (scripts/backfill.py): свой эндпоинт,
+        чтобы фоновая загрузка не открывала выключатель и не портила p95
+        интерактивных запросов; без хеджа и с низшим приоритетом квоты.
+        """
+        return await Endpoint.get("get_candles_backfill").call(
+            lambda: self._request_candles(figi, from_, to, interval, Priority.CATALOGUE)
+        )
+
+    async def _request_candles(
+        self,
+        figi: str,
+        from_: datetime,
+        to: datetime,
+        interval: CandleInterval,
+        priority: Priority
+    ) -> list[HistoricCandle]:
+        """Ровно один запрос GetCandles (диапазон не длиннее INTERVAL_MAX_SPAN)"""
+        if from_ >= to:
+            return []
+        async with tinkoff_client(self.token, Service.MARKET_DATA, priority) as client:
+            response = await client.market_data.get_candles(figi=figi, from_=from_, to=to, interval=interval)
+        return list(response.candles)
 
     @staticmethod
     def format_candle(candle: HistoricCandle) -> str:
@@ -1,15 +1,51 @@
 import asyncio
+import json
 from datetime import datetime, timedelta
-from tinkoff.invest import AsyncClient
 from tinkoff.invest.utils import quotation_to_decimal
 from db.session import get_redis
 from config import TINKOFF_TOKEN  # Импортируем только TINKOFF_TOKEN
 from utils.logger import logger
+from tinkoff_api.connection import tinkoff_client
+from tinkoff_api.quota import Priority, Service
+from tinkoff_api.resilience import resilient
+from tinkoff_api.search import InstrumentSearchIndex
+
+# Тип инструмента -> метод каталога InstrumentsService
+INSTRUMENT_TYPES = {
+    "share": "shares",
+    "bond": "bonds",
+    "etf": "etfs",
+    "currency": "currencies",
+}
+
+# Поля записи об инструменте (в Redis хранятся строками без повторения ключей)
+FIELDS = ("figi", "uid", "ticker", "class_code", "name", "lot", "currency", "type", "min_price_increment")
+
+CACHE_KEY = "tinkoff_instruments:{}"
+CACHE_TTL = 24 * 3600
+REFRESH_INTERVAL = timedelta(hours=24)
+
+
+def _dumps(instruments: list[dict]) -> bytes:
+    rows = [[item[field] for field in FIELDS] for item in instruments]
+    return json.dumps({"fields": FIELDS, "rows": rows}, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _loads(payload: bytes) -> list[dict]:
+    data = json.loads(payload)
+    fields = data["fields"]
+    return [dict(zip(fields, row)) for row in data["rows"]]
+
 
 class InstrumentCache:
     _instance = None
-    _instruments = None
-    _last_updated = None
+    _catalog: dict = {}      # тип -> список инструментов
+    _updated: dict = {}      # тип -> время загрузки
+    _instruments = None      # тикер -> инструмент
+    _by_figi: dict = {}
+    _by_uid: dict = {}
+    _by_type: dict = {}
+    _search_index = InstrumentSearchIndex()
     _lock = asyncio.Lock()
 
     def __new__(cls):
@@ -18,15 +54,35 @@ class InstrumentCache:
         return cls._instance
 
     async def get_instruments(self):
-        async with self._lock:
-            if self._instruments is None or self._should_refresh():
-                await self._load_instruments()
-            return self._instruments
+        stale = self._stale_types()
+        if stale:
+            async with self._lock:
+                stale = self._stale_types()
+                if stale:
+                    await self._load_types(stale)
+        return self._instruments
 
     async def get_instrument(self, ticker):
         instruments = await self.get_instruments()
         return instruments.get(ticker.upper())
 
+    async def get_by_figi(self, figi):
+        await self.get_instruments()
+        return self._by_figi.get(figi)
+
+    async def get_by_uid(self, uid):
+        await self.get_instruments()
+        return self._by_uid.get(uid)
+
+    async def get_by_type(self, instrument_type):
+        await self.get_instruments()
+        return self._by_type.get(instrument_type, {})
+
+    async def search(self, query: str, limit: int = 10) -> list[dict]:
+        """Поиск по префиксу тикера/названия с нечётким добором результатов"""
+        await self.get_instruments()
+        return self._search_index.search(query, limit)
+
     async def get_figi(self, ticker):
         instrument = await self.get_instrument(ticker)
         return instrument["figi"] if instrument else None
@@ -35,46 +91,85 @@ class InstrumentCache:
         instrument = await self.get_instrument(ticker)
         return instrument["lot"] if instrument else None
 
-    def _should_refresh(self):
-        return (self._last_updated is None or 
-                datetime.now() - self._last_updated > timedelta(hours=24))
+    async def refresh(self, instrument_type: str | None = None):
+        """Принудительно перезагружает из API один тип инструментов или весь каталог"""
+        types = [instrument_type] if instrument_type else list(INSTRUMENT_TYPES)
+        async with self._lock:
+            await self._load_types(types, use_cache=False)
+
+    def _stale_types(self) -> list[str]:
+        now = datetime.now()
+        return [
+            instrument_type for instrument_type in INSTRUMENT_TYPES
+            if instrument_type not in self._updated
+            or now - self._updated[instrument_type] > REFRESH_INTERVAL
+        ]
 
-    async def _load_instruments(self):
+    async def _load_types(self, types: list[str], use_cache: bool = True):
         redis = await get_redis()
-        cached = await redis.get("tinkoff_instruments")
-        
-        if cached:
-            self._instruments = eval(cached)
-            self._last_updated = datetime.now()
+        missing = []
+        for instrument_type in types:
+            cached = await redis.get(CACHE_KEY.format(instrument_type)) if use_cache else None
+            if cached:
+                self._catalog[instrument_type] = _loads(cached)
+                self._updated[instrument_type] = datetime.now()
+            else:
+                missing.append(instrument_type)
+
+        if missing:
+            # Каталоги разных типов запрашиваем параллельно
+            loaded = await asyncio.gather(*(self._fetch_type(t) for t in missing))
+            for instrument_type, instruments in zip(missing, loaded):
+                self._catalog[instrument_type] = instruments
+                self._updated[instrument_type] = datetime.now()
+                await redis.set(CACHE_KEY.format(instrument_type), _dumps(instruments), ex=CACHE_TTL)
+            logger.info(f"Loaded {sum(map(len, loaded))} instruments ({', '.join(missing)}) from Tinkoff API")
+        if len(missing) < len(types):
             logger.info("Loaded instruments from cache")
-            return
 
-        instruments = {}
+        await self._rebuild_indexes()
+
+    @resilient("instruments", hedge=True)
+    async def _fetch_type(self, instrument_type: str) -> list[dict]:
         # Используем единый TINKOFF_TOKEN, который уже содержит правильный токен для текущего режима
-        token = TINKOFF_TOKEN
-        async with AsyncClient(token) as client:
-            # Убраны параметры status из всех вызовов
-            shares = await client.instruments.shares()
-            bonds = await client.instruments.bonds()
-            etfs = await client.instruments.etfs()
-            currencies = await client.instruments.currencies()
-
-            # Обработка всех инструментов независимо от статуса
-            for item in shares.instruments + bonds.instruments + etfs.instruments + currencies.instruments:
-                instruments[item.ticker] = {
-                    "figi": item.figi,
-                    "ticker": item.ticker,
-                    "name": item.name,
-                    "lot": item.lot,
-                    "currency": item.currency,
-                    "type": "share" if hasattr(item, 'share') else 
-                            "bond" if hasattr(item, 'bond') else 
-                            "etf" if hasattr(item, 'etf') else "currency",
-                    "min_price_increment": float(quotation_to_decimal(item.min_price_increment))
-                }
-
-        self._instruments = instruments
-        self._last_updated = datetime.now()
-        await redis.set("tinkoff_instruments", str(instruments), ex=24*3600)
-        logger.info(f"Loaded {len(instruments)} instruments from Tinkoff API")
-        return instruments
\ No newline at end of file
+        async with tinkoff_client(TINKOFF_TOKEN, Service.INSTRUMENTS, Priority.CATALOGUE) as client:
+            response = await getattr(client.instruments, INSTRUMENT_TYPES[instrument_type])()
+
+        return [
+            {
+                "figi": item.figi,
+                "uid": item.uid,
+                "ticker": item.ticker,
+                "class_code": item.class_code,
+                "name": item.name,
+                "lot": item.lot,
+                "currency": item.currency,
+                "type": instrument_type,
+                "min_price_increment": float(quotation_to_decimal(item.min_price_increment))
+            }
+            for item in response.instruments
+        ]
+
+    async def _rebuild_indexes(self):
+        by_ticker, by_figi, by_uid, by_type = {}, {}, {}, {}
+        # Порядок типов сохраняет прежний приоритет при совпадении тикеров
+        for instrument_type in INSTRUMENT_TYPES:
+            typed = by_type.setdefault(instrument_type, {})
+            for item in self._catalog.get(instrument_type, ()):
+                by_ticker[item["ticker"]] = item
+                by_figi[item["figi"]] = item
+                by_uid[item["uid"]] = item
+                typed[item["ticker"]] = item
+
+        InstrumentCache._instruments = by_ticker
+        InstrumentCache._by_figi = by_figi
+        InstrumentCache._by_uid = by_uid
+        InstrumentCache._by_type = by_type
+        if len(self._search_index):
+            # Поисковый индекс переиндексирует только изменившиеся инструменты
+            self._search_index.update(by_figi)
+        else:
+            # Первичная сборка целиком занимает секунды — строим вне event loop
+            index = InstrumentSearchIndex()
+            await asyncio.to_thread(index.update, by_figi)
+            InstrumentCache._search_index = index
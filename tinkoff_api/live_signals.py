@@ -0,0 +1,224 @@
+import asyncio
+import json
+import time
+from contextlib import suppress
+from typing import Awaitable, Callable
+
+import numpy as np
+from tinkoff.invest import CandleInterval
+from tinkoff.invest.utils import quotation_to_decimal
+
+from db.session import get_redis
+from tinkoff_api.market_data_hub import MarketDataHub, Subscription
+from strategies.indicators import LiveSignal
+from strategies.registry import make_strategy
+from utils.logger import logger
+
+# Сколько дней минутной истории прогоняется через индикатор перед стримом
+WARM_UP_DAYS = 1
+
+POSITION_NAMES = {1.0: "🟢 покупка", -1.0: "🔴 продажа", 0.0: "⚪️ вне рынка"}
+
+# (ticker, since) -> (время, цена закрытия) завершённых минутных свечей начиная с since
+HistoryLoader = Callable[[str, int], Awaitable[tuple[np.ndarray, np.ndarray]]]
+
+
+async def minute_history(ticker: str, since: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Закрытые минутные свечи за WARM_UP_DAYS из хранилища свечей (без формирующейся)"""
+    from tinkoff_api.historical import HistoricalData
+
+    arrays = await HistoricalData().get_candle_arrays(ticker, CandleInterval.CANDLE_INTERVAL_1_MIN, WARM_UP_DAYS)
+    closed = arrays.slice(since, int(time.time()) // 60 * 60)
+    return closed.time, closed.close
+
+
+class RedisWatchStore:
+    """Наблюдения в Redis-хеше: "user:figi" -> запись (тикер, стратегия, снимок LiveSignal)"""
+    key = "live_signals:watches"
+
+    async def load(self) -> list[dict]:
+        redis = await get_redis()
+        raw = await redis.hgetall(self.key)
+        return [json.loads(record) for record in raw.values()]
+
+    async def save(self, record: dict):
+        redis = await get_redis()
+        await redis.hset(self.key, f"{record['user_id']}:{record['figi']}", json.dumps(record))
+
+    async def delete(self, user_id: int, figi: str):
+        redis = await get_redis()
+        await redis.hdel(self.key, f"{user_id}:{figi}")
+
+
+class LiveSignalRunner:
+    """
+    Живые сигналы стратегий по минутным свечам из MarketDataHub.
+
+    На пару (пользователь, инструмент) — LiveSignal выбранной стратегии и
+    подписка хаба; индикатор разогревается минутной историей. Стрим шлёт
+    формирующуюся свечу много раз, поэтому в сигнал идёт цена закрытия
+    свечи, когда началась следующая, — O(1) на свечу. О смене позиции
+    владельцу приходит сообщение.
+
+    После каждой закрытой свечи запись наблюдения со снимком LiveSignal
+    сохраняется в хранилище; start() поднимает сохранённые наблюдения и
+    догоняет индикатор свечами, пропущенными за время простоя.
+    """
+    _instance = None
+    _bot = None
+    _history: HistoryLoader | None = None
+    _store = None
+    _watches: dict = {}
+    _stats = {"candles": 0, "notifications": 0, "restored": 0}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    async def start(self, bot, history: HistoryLoader | None = minute_history, store=None):
+        LiveSignalRunner._bot = bot
+        LiveSignalRunner._history = history
+        LiveSignalRunner._store = store if store is not None else RedisWatchStore()
+        try:
+            records = await self._store.load()
+        except Exception as e:
+            logger.warning(f"Failed to load live signal watches: {e}")
+            return
+        for record in records:
+            try:
+                if await self._launch(record):
+                    self._stats["restored"] += 1
+            except Exception as e:
+                logger.warning(f"Failed to restore live signals {record.get('ticker')} for user {record.get('user_id')}: {e}")
+        if records:
+            logger.info(f"Live signals restored: {self._stats['restored']} of {len(records)}")
+
+    async def stop(self):
+        watches, LiveSignalRunner._watches = self._watches, {}
+        for _, task in watches.values():
+            task.cancel()
+        for _, task in watches.values():
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def stats(self) -> dict:
+        return {**self._stats, "watches": len(self._watches)}
+
+    def watching(self, user_id: int) -> list[str]:
+        return [ticker for (user, _), (ticker, _) in self._watches.items() if user == user_id]
+
+    async def watch(self, user_id: int, ticker: str, figi: str, strategy_key: str, params: dict | None = None) -> bool:
+        """Запускает сигналы стратегии по инструменту; False — уже запущены"""
+        record = {
+            "user_id": user_id,
+            "figi": figi,
+            "ticker": ticker,
+            "strategy": strategy_key,
+            "params": params or {},
+            "time": None,
+            "state": None,
+        }
+        return await self._launch(record)
+
+    async def unwatch(self, user_id: int, figi: str | None = None) -> int:
+        """Останавливает сигналы по инструменту (или все сигналы пользователя)"""
+        keys = [key for key in self._watches if key[0] == user_id and figi in (None, key[1])]
+        tasks = [self._watches.pop(key)[1] for key in keys]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        # Запись удаляется и для упавшего наблюдения, которого уже нет в _watches
+        for watched in {key[1] for key in keys} | ({figi} if figi else set()):
+            await self._forget_record(user_id, watched)
+        return len(tasks)
+
+    async def _launch(self, record: dict) -> bool:
+        """LiveSignal из записи (со снимка, если он есть) и задача стрима"""
+        key = (record["user_id"], record["figi"])
+        if key in self._watches:
+            return False
+        strategy = make_strategy(record["strategy"], record["params"])
+        live = LiveSignal.restore(strategy, record["state"]) if record["state"] else LiveSignal(strategy)
+        # Подписка берётся сразу: ref-count хаба учитывает наблюдателя до первой свечи
+        subscription = await MarketDataHub().acquire(record["figi"])
+        task = asyncio.create_task(self._run(record, live, subscription))
+        self._watches[key] = (record["ticker"], task)
+        task.add_done_callback(lambda _: self._forget(key, task))
+        return True
+
+    def _forget(self, key: tuple, task: asyncio.Task):
+        entry = self._watches.get(key)
+        if entry is not None and entry[1] is task:
+            del self._watches[key]
+
+    async def _save(self, record: dict, live: LiveSignal):
+        record["state"] = live.snapshot()
+        if self._store is None:
+            return
+        try:
+            await self._store.save(record)
+        except Exception as e:
+            logger.warning(f"Failed to save live signals {record['ticker']} for user {record['user_id']}: {e}")
+
+    async def _forget_record(self, user_id: int, figi: str):
+        if self._store is None:
+            return
+        try:
+            await self._store.delete(user_id, figi)
+        except Exception as e:
+            logger.warning(f"Failed to delete live signals {figi} for user {user_id}: {e}")
+
+    async def _run(self, record: dict, live: LiveSignal, subscription: Subscription):
+        ticker, user_id = record["ticker"], record["user_id"]
+        try:
+            # Через класс: функция в атрибуте экземпляра стала бы методом
+            history = LiveSignalRunner._history
+            if history is not None:
+                # Восстановленный снимок догоняется только свечами после него
+                since = 0 if record["time"] is None else record["time"] + 60
+                times, closes = await history(ticker, since)
+                for close in closes:
+                    live.update(close)
+                if len(times):
+                    record["time"] = int(times[-1])
+            await self._save(record, live)
+
+            current = None  # (время, цена) формирующейся свечи
+            async for update in subscription:
+                if update.kind != "candle":
+                    continue
+                candle = update.data
+                if current is not None and candle.time < current[0]:
+                    continue
+                if current is not None and candle.time > current[0]:
+                    await self._on_close(record, live, *current)
+                current = (candle.time, float(quotation_to_decimal(candle.close)))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Live signals {ticker} for user {user_id} failed: {e}", exc_info=True)
+        finally:
+            await MarketDataHub().release(subscription)
+
+    async def _on_close(self, record: dict, live: LiveSignal, candle_time, close: float):
+        if record["time"] is not None and candle_time.timestamp() <= record["time"]:
+            return  # свеча уже учтена при разогреве по истории
+        self._stats["candles"] += 1
+        position = live.position
+        live.update(close)
+        record["time"] = int(candle_time.timestamp())
+        await self._save(record, live)
+        if live.position == position or self._bot is None:
+            return
+        ticker, user_id = record["ticker"], record["user_id"]
+        try:
+            await self._bot.send_message(
+                chat_id=user_id,
+                text=f"📶 {ticker} ({record['strategy']}): {POSITION_NAMES[live.position]} по {close:.2f}"
+            )
+            self._stats["notifications"] += 1
+        except Exception as e:
+            logger.warning(f"Failed to send live signal {ticker} to user {user_id}: {e}")
@@ -0,0 +1,223 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from tinkoff.invest import (
+    Candle,
+    CandleInstrument,
+    LastPriceInstrument,
+    MarketDataResponse,
+    OrderBookInstrument,
+    SubscriptionInterval,
+)
+from tinkoff.invest.utils import quotation_to_decimal
+
+from config import TINKOFF_TOKEN
+from tinkoff_api.connection import TinkoffConnectionManager
+from utils.logger import logger
+
+# Размер очереди одного подписчика: при переполнении отбрасываем старые события
+SUBSCRIBER_QUEUE_SIZE = 100
+# Пауза перед переподключением упавшего стрима (удваивается до максимума)
+RECONNECT_DELAY = 1.0
+RECONNECT_DELAY_MAX = 30.0
+
+
+@dataclass
+class InstrumentSnapshot:
+    """Последнее известное состояние рынка по инструменту"""
+    figi: str
+    last_price: float | None = None
+    best_bid: float | None = None
+    best_ask: float | None = None
+    candle: Candle | None = None
+    updated_at: datetime | None = None
+
+
+@dataclass
+class MarketDataUpdate:
+    """Событие для подписчиков: что изменилось и актуальный снимок"""
+    figi: str
+    kind: str  # last_price / orderbook / candle
+    snapshot: InstrumentSnapshot
+    # Само событие (LastPrice / OrderBook / Candle): снимок к моменту чтения мог уже измениться
+    data: Any = None
+
+
+@dataclass(eq=False)
+class Subscription:
+    figi: str
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(SUBSCRIBER_QUEUE_SIZE))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> MarketDataUpdate:
+        return await self.queue.get()
+
+
+class MarketDataHub:
+    """
+    Единый фоновый MarketDataStream на весь процесс.
+
+    На каждый инструмент держится одна подписка независимо от числа
+    потребителей; подписки считаются по ссылкам и снимаются, когда
+    инструмент больше никому не нужен. Последняя цена, верх стакана и
+    формирующаяся минутная свеча хранятся в памяти и рассылаются
+    подписчикам (хендлерам, стратегиям, алертам).
+    """
+    _instance = None
+    _snapshots: dict = {}
+    _subscribers: dict = {}
+    _lock = asyncio.Lock()
+    _stream = None
+    _task = None
+    _stats = {"updates": 0, "dropped": 0, "reconnects": 0}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    async def start(self, token: str = TINKOFF_TOKEN):
+        if self._task is None or self._task.done():
+            MarketDataHub._task = asyncio.create_task(self._run(token))
+
+    async def stop(self):
+        task, MarketDataHub._task = self._task, None
+        if self._stream is not None:
+            self._stream.stop()
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def snapshot(self, figi: str) -> InstrumentSnapshot | None:
+        return self._snapshots.get(figi)
+
+    async def acquire(self, figi: str) -> Subscription:
+        """Подписывает потребителя на инструмент"""
+        subscription = Subscription(figi)
+        async with self._lock:
+            subscribers = self._subscribers.setdefault(figi, set())
+            subscribers.add(subscription)
+            if len(subscribers) == 1:
+                self._snapshots.setdefault(figi, InstrumentSnapshot(figi))
+                self._subscribe_stream([figi])
+        return subscription
+
+    async def release(self, subscription: Subscription):
+        """Отписывает потребителя; последний уход снимает подписку стрима"""
+        figi = subscription.figi
+        async with self._lock:
+            subscribers = self._subscribers.get(figi)
+            if not subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[figi]
+                self._snapshots.pop(figi, None)
+                self._unsubscribe_stream([figi])
+
+    @asynccontextmanager
+    async def subscribe(self, figi: str):
+        """`async with hub.subscribe(figi) as updates: async for update in updates`"""
+        subscription = await self.acquire(figi)
+        try:
+            yield subscription
+        finally:
+            await self.release(subscription)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "instruments": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
+
+    def _subscribe_stream(self, figis: list[str]):
+        if self._stream is None or not figis:
+            return
+        self._stream.candles.subscribe([
+            CandleInstrument(figi=figi, interval=SubscriptionInterval.SUBSCRIPTION_INTERVAL_ONE_MINUTE)
+            for figi in figis
+        ])
+        self._stream.order_book.subscribe([OrderBookInstrument(figi=figi, depth=1) for figi in figis])
+        self._stream.last_price.subscribe([LastPriceInstrument(figi=figi) for figi in figis])
+
+    def _unsubscribe_stream(self, figis: list[str]):
+        if self._stream is None or not figis:
+            return
+        self._stream.candles.unsubscribe([
+            CandleInstrument(figi=figi, interval=SubscriptionInterval.SUBSCRIPTION_INTERVAL_ONE_MINUTE)
+            for figi in figis
+        ])
+        self._stream.order_book.unsubscribe([OrderBookInstrument(figi=figi, depth=1) for figi in figis])
+        self._stream.last_price.unsubscribe([LastPriceInstrument(figi=figi) for figi in figis])
+
+    async def _run(self, token: str):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                services = await TinkoffConnectionManager().get_services(token)
+                async with self._lock:
+                    MarketDataHub._stream = services.create_market_data_stream()
+                    # После переподключения восстанавливаем все активные подписки
+                    self._subscribe_stream(list(self._subscribers))
+                async for response in self._stream:
+                    self._apply(response)
+                    delay = RECONNECT_DELAY
+                if self._task is None:
+                    logger.info("Market data stream stopped")
+                    return
+                raise ConnectionError("stream closed by server")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["reconnects"] += 1
+                logger.error(f"Market data stream failed: {e}; reconnecting in {delay:.0f}s")
+                MarketDataHub._stream = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    def _apply(self, response: MarketDataResponse):
+        if response.last_price:
+            data, kind = response.last_price, "last_price"
+        elif response.orderbook:
+            data, kind = response.orderbook, "orderbook"
+        elif response.candle:
+            data, kind = response.candle, "candle"
+        else:
+            return
+        figi = data.figi
+
+        snapshot = self._snapshots.get(figi)
+        if snapshot is None:
+            return
+
+        if kind == "last_price":
+            snapshot.last_price = float(quotation_to_decimal(response.last_price.price))
+            snapshot.updated_at = response.last_price.time
+        elif kind == "orderbook":
+            book = response.orderbook
+            snapshot.best_bid = float(quotation_to_decimal(book.bids[0].price)) if book.bids else None
+            snapshot.best_ask = float(quotation_to_decimal(book.asks[0].price)) if book.asks else None
+            snapshot.updated_at = book.time
+        else:
+            snapshot.candle = response.candle
+            snapshot.last_price = float(quotation_to_decimal(response.candle.close))
+            snapshot.updated_at = response.candle.last_trade_ts or response.candle.time
+
+        self._stats["updates"] += 1
+        self._publish(MarketDataUpdate(figi, kind, snapshot, data))
+
+    def _publish(self, update: MarketDataUpdate):
+        for subscription in self._subscribers.get(update.figi, ()):
+            queue = subscription.queue
+            if queue.full():
+                # Медленный потребитель получает только свежие события
+                queue.get_nowait()
+                self._stats["dropped"] += 1
+            queue.put_nowait(update)
@@ -0,0 +1,174 @@
+import asyncio
+import datetime
+from contextlib import suppress
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from tinkoff.invest import GetOperationsByCursorRequest, OperationItem
+from tinkoff.invest.utils import now, quotation_to_decimal
+
+from config import TINKOFF_TOKEN, USE_SANDBOX
+from db.models import Operation, SyncCursor
+from db.session import async_session
+from tinkoff_api.accounts import AccountRegistry
+from tinkoff_api.connection import tinkoff_client
+from tinkoff_api.quota import Priority, Service
+from utils.logger import logger
+
+OPERATIONS_SYNC_SECONDS = 300
+OPERATIONS_PAGE_SIZE = 1000
+# Операции в процессе могут поменять состояние — перечитываем последние сутки
+OPERATIONS_SYNC_OVERLAP = datetime.timedelta(days=1)
+OPERATIONS_HISTORY_START = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+CURSOR_KIND = "operations"
+
+
+def _utc_naive(value: datetime.datetime) -> datetime.datetime:
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _aware(value: datetime.datetime) -> datetime.datetime:
+    return value.replace(tzinfo=datetime.timezone.utc)
+
+
+def _money(value) -> float:
+    return float(quotation_to_decimal(value)) if value else 0.0
+
+
+def _row(account_id: str, item: OperationItem) -> dict:
+    return {
+        "account_id": account_id,
+        "operation_id": item.id,
+        "parent_operation_id": item.parent_operation_id or None,
+        "type": item.type.name,
+        "state": item.state.name,
+        "figi": item.figi or None,
+        "instrument_type": item.instrument_type or None,
+        "currency": item.payment.currency if item.payment else None,
+        "payment": _money(item.payment),
+        "price": _money(item.price),
+        "commission": _money(item.commission),
+        "quantity": item.quantity,
+        "quantity_done": item.quantity_done,
+        "description": item.description or None,
+        "date": _utc_naive(item.date),
+    }
+
+
+class OperationsSync:
+    """
+    Инкрементальная выгрузка операций брокера в таблицу operations.
+
+    Каждый проход запрашивает GetOperationsByCursor только с момента прошлой
+    синхронизации (с небольшим перекрытием) и листает страницы курсором.
+    Курсор страницы сохраняется в той же транзакции, что и её операции, так
+    что прерванный проход продолжается со следующей страницы, а повторно
+    полученные операции просто перезаписываются по operation_id.
+    """
+    _instance = None
+    _task = None
+    _stats = {"runs": 0, "pages": 0, "operations": 0}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    async def start(self, token: str = TINKOFF_TOKEN, sandbox: bool = USE_SANDBOX):
+        if self._task is None or self._task.done():
+            OperationsSync._task = asyncio.create_task(self._run(token, sandbox))
+
+    async def stop(self):
+        task, OperationsSync._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+    async def _run(self, token: str, sandbox: bool):
+        while True:
+            try:
+                for account_id in await AccountRegistry(token, sandbox).get_accounts():
+                    await self.sync(account_id, token, sandbox)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Operations sync failed: {e}")
+            await asyncio.sleep(OPERATIONS_SYNC_SECONDS)
+
+    async def sync(self, account_id: str, token: str = TINKOFF_TOKEN, sandbox: bool = USE_SANDBOX) -> int:
+        """Догружает новые операции счёта; возвращает число полученных операций"""
+        state = await self._load_cursor(account_id)
+        if state.synced_until is not None:
+            from_ = _aware(state.synced_until) - OPERATIONS_SYNC_OVERLAP
+        else:
+            from_ = OPERATIONS_HISTORY_START
+        if state.cursor:
+            # Продолжаем прерванный проход тем же запросом
+            to, cursor = _aware(state.window_end), state.cursor
+        else:
+            to, cursor = now(), ""
+
+        total = 0
+        while True:
+            response = await self._fetch_page(token, sandbox, account_id, from_, to, cursor)
+            rows = [_row(account_id, item) for item in response.items]
+            async with async_session() as session:
+                if rows:
+                    stmt = insert(Operation).values(rows)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["operation_id"],
+                        set_={column: stmt.excluded[column] for column in rows[0] if column != "operation_id"}
+                    )
+                    await session.execute(stmt)
+                state = await session.merge(state)
+                state.cursor = response.next_cursor if response.has_next else None
+                state.window_end = _utc_naive(to)
+                if not response.has_next:
+                    state.synced_until = _utc_naive(to)
+                state.updated_at = datetime.datetime.utcnow()
+                await session.commit()
+
+            total += len(rows)
+            self._stats["pages"] += 1
+            if not response.has_next:
+                break
+            cursor = response.next_cursor
+
+        self._stats["runs"] += 1
+        self._stats["operations"] += total
+        if total:
+            logger.info(f"Synced {total} operation(s) for account {account_id}")
+        return total
+
+    @staticmethod
+    async def _load_cursor(account_id: str) -> SyncCursor:
+        async with async_session() as session:
+            result = await session.execute(
+                select(SyncCursor).where(SyncCursor.account_id == account_id, SyncCursor.kind == CURSOR_KIND)
+            )
+            state = result.scalar_one_or_none()
+            if state is None:
+                state = SyncCursor(account_id=account_id, kind=CURSOR_KIND)
+                session.add(state)
+                await session.commit()
+            return state
+
+    @staticmethod
+    async def _fetch_page(token, sandbox, account_id, from_, to, cursor):
+        request = GetOperationsByCursorRequest(
+            account_id=account_id,
+            from_=from_,
+            to=to,
+            cursor=cursor,
+            limit=OPERATIONS_PAGE_SIZE
+        )
+        # Фоновая синхронизация уступает пользовательским запросам
+        service = Service.SANDBOX if sandbox else Service.OPERATIONS
+        async with tinkoff_client(token, service, Priority.CATALOGUE) as client:
+            if sandbox:
+                return await client.sandbox.get_sandbox_operations_by_cursor(request)
+            return await client.operations.get_operations_by_cursor(request)
@@ -0,0 +1,342 @@
+import asyncio
+import datetime
+from contextlib import suppress
+
+from sqlalchemy import func, select
+from tinkoff.invest import OrderDirection, OrderExecutionReportStatus, OrderState, OrderTrade, OrderTrades
+from tinkoff.invest.utils import quotation_to_decimal
+
+from config import TINKOFF_TOKEN, USE_SANDBOX
+from db.models import BrokerOrder, BrokerTrade, Order
+from db.session import async_session
+from tinkoff_api.accounts import AccountRegistry
+from tinkoff_api.connection import TinkoffConnectionManager, tinkoff_client
+from tinkoff_api.instruments import InstrumentCache
+from tinkoff_api.quota import Priority, Service
+from utils.logger import logger
+
+# Сверка с брокером ловит отмены и всё, что стрим мог пропустить
+ORDER_RECONCILE_SECONDS = 60
+RECONNECT_DELAY = 1.0
+RECONNECT_DELAY_MAX = 30.0
+EXECUTED_ORDERS_DAYS = 7
+
+STATUS_NAMES = {
+    OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_NEW: "NEW",
+    OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_PARTIALLYFILL: "PARTIALLYFILL",
+    OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_FILL: "FILL",
+    OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_CANCELLED: "CANCELLED",
+    OrderExecutionReportStatus.EXECUTION_REPORT_STATUS_REJECTED: "REJECTED",
+}
+ACTIVE_STATUSES = ("NEW", "PARTIALLYFILL")
+TERMINAL_STATUSES = ("FILL", "CANCELLED", "REJECTED")
+
+# Статус брокера -> статус локального db.models.Order
+LOCAL_STATUSES = {
+    "NEW": "NEW",
+    "PARTIALLYFILL": "PARTIALLY_FILLED",
+    "FILL": "FILLED",
+    "CANCELLED": "CANCELLED",
+    "REJECTED": "REJECTED",
+}
+
+
+def direction_name(direction) -> str:
+    return "BUY" if direction in (OrderDirection.ORDER_DIRECTION_BUY, "BUY") else "SELL"
+
+
+def _utc_naive(value: datetime.datetime) -> datetime.datetime:
+    """Время брокера -> наивное UTC, как во всех DateTime-колонках БД"""
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def trade_key(trade: OrderTrade) -> str:
+    """
+    Идентификатор сделки для дедупликации: trade_id брокера, а если его
+    нет — время, количество и цена (несколько сделок в одну секунду —
+    обычное дело при частичном исполнении)
+    """
+    if getattr(trade, "trade_id", ""):
+        return trade.trade_id
+    return f"{_utc_naive(trade.date_time).isoformat()}:{trade.quantity}:{quotation_to_decimal(trade.price)}"
+
+
+async def record_order(
+    account_id: str,
+    response,
+    figi: str,
+    direction,
+    lots: int,
+    price: float | None = None,
+    user_id: int | None = None,
+    order_id: int | None = None,
+    client_order_id: str | None = None
+) -> BrokerOrder:
+    """Заводит выставленную заявку в локальную таблицу, чтобы трекер вёл её статус"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(BrokerOrder).where(BrokerOrder.broker_order_id == response.order_id)
+        )
+        row = result.scalar_one_or_none()
+        if row is None:
+            # Сверка могла завести заявку раньше нас — тогда только дополняем её
+            row = BrokerOrder(
+                account_id=account_id,
+                broker_order_id=response.order_id,
+                figi=figi,
+                direction=direction_name(direction),
+                lots_requested=lots,
+                lots_executed=response.lots_executed,
+                price=price,
+                status=STATUS_NAMES.get(response.execution_report_status, "NEW")
+            )
+            session.add(row)
+        row.user_id = user_id if user_id is not None else row.user_id
+        row.order_id = order_id if order_id is not None else row.order_id
+        row.client_order_id = client_order_id or row.client_order_id
+        await session.commit()
+    return row
+
+
+async def tracked_orders(account_id: str) -> tuple[list[BrokerOrder], list[BrokerOrder]]:
+    """Активные заявки и исполненные за неделю — из локальной таблицы, без запросов к API"""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=EXECUTED_ORDERS_DAYS)
+    async with async_session() as session:
+        active = await session.execute(
+            select(BrokerOrder)
+            .where(BrokerOrder.account_id == account_id, BrokerOrder.status.in_(ACTIVE_STATUSES))
+            .order_by(BrokerOrder.created_at.desc())
+        )
+        executed = await session.execute(
+            select(BrokerOrder)
+            .where(
+                BrokerOrder.account_id == account_id,
+                BrokerOrder.status == "FILL",
+                BrokerOrder.updated_at >= cutoff
+            )
+            .order_by(BrokerOrder.updated_at.desc())
+        )
+        return active.scalars().all(), executed.scalars().all()
+
+
+class OrderStateTracker:
+    """
+    Фоновое отслеживание заявок по стриму сделок.
+
+    Исполнения из TradesStream сразу применяются к broker_orders и связанным
+    локальным Order, владельцу уходит уведомление. Раз в минуту идёт сверка
+    с GetOrders: она ловит отмены, заявки, выставленные вне бота, и всё, что
+    стрим мог пропустить при переподключении. В песочнице стрима сделок нет —
+    работает только сверка.
+    """
+    _instance = None
+    _bot = None
+    _tasks: list = []
+    _stats = {"trades": 0, "updates": 0, "notifications": 0, "reconnects": 0}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    async def start(self, bot=None, token: str = TINKOFF_TOKEN, sandbox: bool = USE_SANDBOX):
+        OrderStateTracker._bot = bot
+        if self._tasks:
+            return
+        if not sandbox:
+            self._tasks.append(asyncio.create_task(self._run_stream(token)))
+        self._tasks.append(asyncio.create_task(self._run_reconcile(token, sandbox)))
+
+    async def stop(self):
+        tasks, OrderStateTracker._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+    async def _run_stream(self, token: str):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                accounts = await AccountRegistry(token, sandbox=False).get_accounts()
+                services = await TinkoffConnectionManager().get_services(token)
+                async for response in services.orders_stream.trades_stream(accounts=accounts):
+                    if response.order_trades:
+                        await self._apply_trades(response.order_trades)
+                    delay = RECONNECT_DELAY
+                raise ConnectionError("stream closed by server")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["reconnects"] += 1
+                logger.error(f"Trades stream failed: {e}; reconnecting in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    async def _run_reconcile(self, token: str, sandbox: bool):
+        while True:
+            try:
+                await self.reconcile(token, sandbox)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Order reconcile failed: {e}")
+            await asyncio.sleep(ORDER_RECONCILE_SECONDS)
+
+    async def _apply_trades(self, order_trades: OrderTrades):
+        self._stats["trades"] += len(order_trades.trades)
+        async with async_session() as session:
+            result = await session.execute(
+                select(BrokerOrder).where(BrokerOrder.broker_order_id == order_trades.order_id)
+            )
+            row = result.scalar_one_or_none()
+            if row is None:
+                # Заявка выставлена не через бота — её заведёт ближайшая сверка
+                return
+            # После переподключения стрим может повторить уже учтённые сделки
+            seen = set((await session.execute(
+                select(BrokerTrade.trade_key).where(BrokerTrade.broker_order_id == row.broker_order_id)
+            )).scalars().all())
+            trades = {}
+            for trade in order_trades.trades:
+                key = trade_key(trade)
+                if key not in seen:
+                    trades.setdefault(key, trade)
+            if not trades:
+                return
+            for key, trade in trades.items():
+                session.add(BrokerTrade(
+                    broker_order_id=row.broker_order_id,
+                    trade_key=key,
+                    date_time=_utc_naive(trade.date_time),
+                    quantity=trade.quantity,
+                    price=float(quotation_to_decimal(trade.price))
+                ))
+            await session.flush()
+
+            instrument = await InstrumentCache().get_by_figi(row.figi)
+            lot = instrument["lot"] if instrument else 1
+            quantity = (await session.execute(
+                select(func.sum(BrokerTrade.quantity)).where(BrokerTrade.broker_order_id == row.broker_order_id)
+            )).scalar_one()
+            # Сверка могла уже учесть часть сделок — берём большее из двух
+            executed = max(row.lots_executed, quantity // lot)
+            status = "FILL" if executed >= row.lots_requested else "PARTIALLYFILL"
+            last_trade_at = max(_utc_naive(trade.date_time) for trade in trades.values())
+            row.last_trade_at = max(last_trade_at, row.last_trade_at or last_trade_at)
+            changed = await self._update(session, row, status, executed)
+            await session.commit()
+
+        if changed:
+            await self._notify(row)
+
+    async def reconcile(self, token: str = TINKOFF_TOKEN, sandbox: bool = USE_SANDBOX):
+        """Сверяет незавершённые заявки с брокером"""
+        for account_id in await AccountRegistry(token, sandbox).get_accounts():
+            active = {state.order_id: state for state in await self._get_orders(token, sandbox, account_id)}
+
+            async with async_session() as session:
+                result = await session.execute(
+                    select(BrokerOrder).where(
+                        BrokerOrder.account_id == account_id,
+                        BrokerOrder.status.in_(ACTIVE_STATUSES)
+                    )
+                )
+                rows = {row.broker_order_id: row for row in result.scalars().all()}
+
+            # Пропавшие из активных завершились: узнаём, чем именно
+            finished = {
+                broker_order_id: await self._get_order_state(token, sandbox, account_id, broker_order_id)
+                for broker_order_id in rows.keys() - active.keys()
+            }
+
+            changed_rows = []
+            async with async_session() as session:
+                for state in [*active.values(), *finished.values()]:
+                    row = rows.get(state.order_id)
+                    if row is None:
+                        row = await self._adopt(session, account_id, state)
+                        if row is None:
+                            continue
+                    else:
+                        row = await session.merge(row)
+                    status = STATUS_NAMES.get(state.execution_report_status, row.status)
+                    if await self._update(session, row, status, state.lots_executed):
+                        changed_rows.append(row)
+                await session.commit()
+
+            for row in changed_rows:
+                await self._notify(row)
+
+    async def _adopt(self, session, account_id: str, state: OrderState) -> BrokerOrder | None:
+        """Заявка, о которой бот не знал (выставлена в терминале или приложении)"""
+        result = await session.execute(
+            select(BrokerOrder).where(BrokerOrder.broker_order_id == state.order_id)
+        )
+        if result.scalar_one_or_none() is not None:
+            return None
+        row = BrokerOrder(
+            account_id=account_id,
+            broker_order_id=state.order_id,
+            figi=state.figi,
+            direction=direction_name(state.direction),
+            lots_requested=state.lots_requested,
+            lots_executed=state.lots_executed,
+            status=STATUS_NAMES.get(state.execution_report_status, "NEW")
+        )
+        session.add(row)
+        return row
+
+    async def _update(self, session, row: BrokerOrder, status: str, lots_executed: int) -> bool:
+        """Применяет отчёт об исполнении; True — если владельцу есть о чём сообщить"""
+        if row.status == status and row.lots_executed == lots_executed:
+            return False
+        row.status = status
+        row.lots_executed = lots_executed
+        row.updated_at = datetime.datetime.utcnow()
+        if row.order_id is not None:
+            order = await session.get(Order, row.order_id)
+            if order is not None:
+                order.status = LOCAL_STATUSES[status]
+        self._stats["updates"] += 1
+        return True
+
+    async def _notify(self, row: BrokerOrder):
+        if self._bot is None or row.user_id is None:
+            return
+        action = "Покупка" if row.direction == "BUY" else "Продажа"
+        texts = {
+            "FILL": f"✅ Заявка исполнена: {action} {row.lots_executed} лот. {row.figi}",
+            "PARTIALLYFILL": f"🟡 Частичное исполнение: {action} {row.lots_executed}/{row.lots_requested} лот. {row.figi}",
+            "CANCELLED": f"❌ Заявка отменена: {action} {row.lots_requested} лот. {row.figi}",
+            "REJECTED": f"⛔ Заявка отклонена: {action} {row.lots_requested} лот. {row.figi}",
+        }
+        if row.status not in texts:
+            return
+        try:
+            await self._bot.send_message(chat_id=row.user_id, text=texts[row.status])
+            self._stats["notifications"] += 1
+        except Exception as e:
+            logger.warning(f"Failed to notify user {row.user_id} about order {row.broker_order_id}: {e}")
+
+    @staticmethod
+    async def _get_orders(token: str, sandbox: bool, account_id: str) -> list[OrderState]:
+        service = Service.SANDBOX if sandbox else Service.ORDERS
+        async with tinkoff_client(token, service, Priority.PORTFOLIO) as client:
+            if sandbox:
+                response = await client.sandbox.get_sandbox_orders(account_id=account_id)
+            else:
+                response = await client.orders.get_orders(account_id=account_id)
+        return response.orders
+
+    @staticmethod
+    async def _get_order_state(token: str, sandbox: bool, account_id: str, order_id: str) -> OrderState:
+        service = Service.SANDBOX if sandbox else Service.ORDERS
+        async with tinkoff_client(token, service, Priority.PORTFOLIO) as client:
+            if sandbox:
+                return await client.sandbox.get_sandbox_order_state(account_id=account_id, order_id=order_id)
+            return await client.orders.get_order_state(account_id=account_id, order_id=order_id)
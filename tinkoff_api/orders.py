@@ -1,8 +1,74 @@
-from tinkoff.invest import AsyncClient
+import uuid
 from config import TINKOFF_TOKEN, USE_SANDBOX
+from tinkoff_api.connection import tinkoff_client
+from tinkoff_api.portfolio_cache import portfolio_cache
+from tinkoff_api.quota import Priority, Service
+from tinkoff_api.order_state import record_order
+from utils.logger import logger
 
-async def place_order(account_id: str, figi: str, quantity: int, direction: str, price=None):
-    async with AsyncClient(TINKOFF_TOKEN) as client:
+# Пространство имён для детерминированных ключей идемпотентности
+ORDER_KEY_NAMESPACE = uuid.UUID("6f1c2a4e-3b7d-4c55-9a8e-2d0f5b7c9e11")
+
+
+def idempotency_key(*parts) -> str:
+    """order_id для PostOrder: одни и те же части всегда дают один и тот же ключ"""
+    return str(uuid.uuid5(ORDER_KEY_NAMESPACE, ":".join(str(part) for part in parts)))
+
+
+def client_order_key(
+    client_order_id: str | None,
+    user_id: int | None,
+    order_id: int | None,
+    account_id: str,
+    figi: str,
+    direction,
+    quantity: int,
+    price=None
+) -> str:
+    """
+    Ключ идемпотентности одиночной заявки: переданный вызывающим или
+    выведенный из (пользователь, локальный ордер, намерение). Случайный
+    ключ не годится — повтор вызова отправил бы вторую заявку.
+    """
+    if client_order_id:
+        return client_order_id
+    if order_id is None:
+        raise ValueError("Нужен client_order_id или локальный order_id: без стабильного ключа повтор создаст вторую заявку")
+    return idempotency_key("order", user_id, order_id, account_id, figi, direction, quantity, price)
+
+
+async def place_order(
+    account_id: str,
+    figi: str,
+    quantity: int,
+    direction: str,
+    price=None,
+    user_id: int | None = None,
+    order_id: int | None = None,
+    client_order_id: str | None = None
+):
+    # Ключ стабилен для одного и того же ордера: повтор вызова с теми же
+    # аргументами брокер не исполнит второй раз. Для пакетов — tinkoff_api.batch_orders
+    client_order_id = client_order_key(
+        client_order_id, user_id, order_id, account_id, figi, direction, quantity, price
+    )
+    try:
+        response = await _post_order(account_id, figi, quantity, direction, price, client_order_id)
+        try:
+            # Дальше статус заявки ведёт OrderStateTracker; user_id — кому слать уведомления
+            await record_order(
+                account_id, response, figi, direction, quantity, price, user_id, order_id, client_order_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to record order {response.order_id}: {e}")
+        return response
+    finally:
+        # Ордер мог дойти до биржи даже при ошибке — не показываем старый снимок
+        portfolio_cache.invalidate(account_id)
+
+async def _post_order(account_id: str, figi: str, quantity: int, direction: str, price=None, client_order_id=None):
+    service = Service.SANDBOX if USE_SANDBOX else Service.ORDERS
+    async with tinkoff_client(TINKOFF_TOKEN, service, Priority.ORDER) as client:
         if USE_SANDBOX:
             return await client.sandbox.post_sandbox_order(
                 account_id=account_id,
@@ -10,7 +76,8 @@ async def place_order(account_id: str, figi: str, quantity: int, direction: str,
                 quantity=quantity,
                 direction=direction,
                 order_type="limit" if price else "market",
-                price=price
+                price=price,
+                order_id=client_order_id
             )
         else:
             return await client.orders.post_order(
@@ -19,5 +86,6 @@ async def place_order(account_id: str, figi: str, quantity: int, direction: str,
                 quantity=quantity,
                 direction=direction,
                 order_type="limit" if price else "market",
-                price=price
+                price=price,
+                order_id=client_order_id
             )
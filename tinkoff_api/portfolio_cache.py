@@ -0,0 +1,99 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+from utils.logger import logger
+
+# Снимок считается свежим и отдаётся без обновления
+PORTFOLIO_FRESH_SECONDS = 5.0
+# Дольше этого устаревший снимок не показываем — ждём ответа API
+PORTFOLIO_MAX_AGE_SECONDS = 60.0
+
+
+class _Entry:
+    __slots__ = ("value", "loaded_at", "refreshing")
+
+    def __init__(self, value, loaded_at: float):
+        self.value = value
+        self.loaded_at = loaded_at
+        self.refreshing = False
+
+
+class SnapshotCache:
+    """
+    Кэш снимков по схеме stale-while-revalidate.
+
+    В пределах `fresh_for` снимок отдаётся сразу. После — отдаётся
+    устаревший снимок, а обновление идёт в фоне. Старше `max_age`
+    снимок не используется, вызывающий ждёт загрузки.
+    """
+
+    def __init__(
+        self,
+        fresh_for: float = PORTFOLIO_FRESH_SECONDS,
+        max_age: float = PORTFOLIO_MAX_AGE_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.fresh_for = fresh_for
+        self.max_age = max_age
+        self.clock = clock
+        self._entries: dict[Hashable, _Entry] = {}
+        self._generations: dict[Hashable, int] = {}
+        self._tasks = set()
+        self.stats = {"fresh": 0, "stale": 0, "miss": 0, "refresh_errors": 0}
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = self.clock() - entry.loaded_at
+            if age <= self.fresh_for:
+                self.stats["fresh"] += 1
+                return entry.value
+            if age <= self.max_age:
+                self.stats["stale"] += 1
+                if not entry.refreshing:
+                    self._refresh_in_background(key, entry, loader)
+                return entry.value
+
+        self.stats["miss"] += 1
+        return await self._load(key, loader)
+
+    def peek(self, key: Hashable):
+        """Последний загруженный снимок любой давности (None — если его нет)"""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def invalidate(self, key: Hashable):
+        """Сбрасывает снимок (например, сразу после выставления ордера)"""
+        self._entries.pop(key, None)
+        # Загрузки, начатые до сброса, не должны вернуть старые данные в кэш
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    async def _load(self, key: Hashable, loader, generation: int | None = None):
+        if generation is None:
+            generation = self._generations.get(key, 0)
+        value = await loader()
+        if self._generations.get(key, 0) == generation:
+            self._entries[key] = _Entry(value, self.clock())
+        return value
+
+    def _refresh_in_background(self, key: Hashable, entry: _Entry, loader):
+        entry.refreshing = True
+        generation = self._generations.get(key, 0)
+
+        async def refresh():
+            try:
+                await self._load(key, loader, generation)
+            except Exception as e:
+                self.stats["refresh_errors"] += 1
+                logger.warning(f"Background snapshot refresh failed for {key}: {e}")
+            finally:
+                entry.refreshing = False
+
+        task = asyncio.ensure_future(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+# Снимки портфелей по account_id
+portfolio_cache = SnapshotCache()
@@ -0,0 +1,166 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+from utils.logger import logger
+
+
+class Priority(IntEnum):
+    """Классы приоритета: меньше — важнее"""
+    ORDER = 0
+    PORTFOLIO = 1
+    MARKET_DATA = 2
+    CATALOGUE = 3
+
+
+class Service:
+    MARKET_DATA = "market_data"
+    ORDERS = "orders"
+    OPERATIONS = "operations"
+    INSTRUMENTS = "instruments"
+    SANDBOX = "sandbox"
+    USERS = "users"
+
+
+# Лимиты Tinkoff Invest API, запросов в минуту
+SERVICE_LIMITS = {
+    Service.MARKET_DATA: 600,
+    Service.ORDERS: 100,
+    Service.OPERATIONS: 200,
+    Service.INSTRUMENTS: 200,
+    Service.SANDBOX: 200,
+    Service.USERS: 100,
+}
+
+# Доля лимита на всплеск и на равномерный поток: вместе меньше 100%,
+# поэтому ни в одном минутном окне лимит не достигается
+BURST_SHARE = 0.1
+RATE_SHARE = 0.85
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, rate: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = rate
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, cost: float) -> bool:
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def wait_time(self, cost: float) -> float:
+        self._refill()
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+
+class _ServiceQueue:
+    def __init__(self, limit_per_minute: int, clock):
+        self.bucket = TokenBucket(
+            capacity=max(1.0, limit_per_minute * BURST_SHARE),
+            rate=limit_per_minute * RATE_SHARE / 60,
+            clock=clock
+        )
+        self.waiters = []
+        self.dispatcher = None
+
+
+class QuotaScheduler:
+    """
+    Клиентский планировщик квот Tinkoff API.
+
+    На каждый сервис API — token bucket с запасом до лимита. Если токенов
+    нет, запрос встаёт в очередь и ждёт; очередь обслуживается по классу
+    приоритета (ордера > портфель > рыночные данные > каталог), внутри
+    класса — по порядку поступления.
+    """
+
+    def __init__(self, limits: dict = SERVICE_LIMITS, clock=time.monotonic):
+        self.clock = clock
+        self._queues = {service: _ServiceQueue(limit, clock) for service, limit in limits.items()}
+        self._seq = itertools.count()
+        self._metrics = {
+            priority: {"waiting": 0, "granted": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for priority in Priority
+        }
+
+    async def acquire(self, service: str, priority: Priority, cost: float = 1):
+        queue = self._queues[service]
+        cost = min(cost, queue.bucket.capacity)
+        started = self.clock()
+
+        if not queue.waiters and queue.bucket.try_take(cost):
+            self._record(priority, 0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiters, (priority, next(self._seq), cost, future))
+        self._metrics[priority]["waiting"] += 1
+        if queue.dispatcher is None or queue.dispatcher.done():
+            queue.dispatcher = asyncio.ensure_future(self._dispatch(service, queue))
+        try:
+            await future
+        finally:
+            self._metrics[priority]["waiting"] -= 1
+
+        waited = self.clock() - started
+        self._record(priority, waited)
+        if waited > 1:
+            logger.info(f"Quota: {service} request ({priority.name}) waited {waited:.1f}s")
+
+    @asynccontextmanager
+    async def slot(self, service: str, priority: Priority, cost: float = 1):
+        await self.acquire(service, priority, cost)
+        yield
+
+    async def _dispatch(self, service: str, queue: _ServiceQueue):
+        while queue.waiters:
+            priority, _, cost, future = queue.waiters[0]
+            if future.done():
+                # Ожидающий отменён
+                heapq.heappop(queue.waiters)
+                continue
+            if queue.bucket.try_take(cost):
+                heapq.heappop(queue.waiters)
+                future.set_result(None)
+                continue
+            await asyncio.sleep(queue.bucket.wait_time(cost))
+
+    def _record(self, priority: Priority, waited: float):
+        metrics = self._metrics[priority]
+        metrics["granted"] += 1
+        metrics["wait_total"] += waited
+        metrics["wait_max"] = max(metrics["wait_max"], waited)
+
+    def stats(self) -> dict:
+        return {
+            "classes": {
+                priority.name: {
+                    "queue_depth": m["waiting"],
+                    "granted": m["granted"],
+                    "avg_wait": m["wait_total"] / m["granted"] if m["granted"] else 0.0,
+                    "max_wait": m["wait_max"],
+                }
+                for priority, m in self._metrics.items()
+            },
+            "services": {
+                service: {"queue_depth": len(queue.waiters), "tokens": round(queue.bucket.tokens, 2)}
+                for service, queue in self._queues.items()
+            },
+        }
+
+
+# Общий планировщик процесса
+quota = QuotaScheduler()
@@ -0,0 +1,68 @@
+"""Агрегация свечей базового интервала в более крупные (OHLCV)."""
+from collections import OrderedDict
+
+import numpy as np
+
+from tinkoff_api.candle_codec import CandleArrays
+
+
+def resample_ohlcv(arrays: CandleArrays, step: int) -> CandleArrays:
+    """
+    Векторная агрегация отсортированных по времени свечей в бакеты
+    длиной `step` секунд, выровненные по UTC.
+    """
+    if not len(arrays):
+        return CandleArrays.empty()
+
+    buckets = arrays.time - arrays.time % step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    return CandleArrays(
+        buckets[starts],
+        arrays.open[starts],
+        np.maximum.reduceat(arrays.high, starts),
+        np.minimum.reduceat(arrays.low, starts),
+        arrays.close[ends],
+        np.add.reduceat(arrays.volume, starts)
+    )
+
+
+class ResampleCache:
+    """
+    Кэш агрегированных рядов, дополняемый инкрементально.
+
+    Хранит только завершённые бакеты — те, что целиком лежат до границы
+    `covered_to` базового ряда. При продвижении границы агрегируется
+    лишь новый участок базы.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def final_buckets(self, key, base: CandleArrays, covered_to: int, step: int) -> tuple[CandleArrays, int]:
+        """(завершённые бакеты, граница) для базового ряда"""
+        boundary = covered_to - covered_to % step
+        base_start = int(base.time[0]) if len(base) else None
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == base_start and entry[1] <= boundary:
+            _, cached_boundary, cached = entry
+            if cached_boundary < boundary:
+                fresh = resample_ohlcv(base.slice(cached_boundary, boundary), step)
+                cached = cached.concat(fresh)
+        else:
+            cached = resample_ohlcv(base.slice(base_start or 0, boundary), step)
+
+        self._entries[key] = (base_start, boundary, cached)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return cached, boundary
+
+    def resample(self, key, base: CandleArrays, forming: CandleArrays, covered_to: int, step: int) -> CandleArrays:
+        """Полный агрегированный ряд: кэшированные бакеты + пересчитанный хвост"""
+        final, boundary = self.final_buckets(key, base, covered_to, step)
+        tail = resample_ohlcv(base.slice(boundary).concat(forming), step)
+        return final.concat(tail)
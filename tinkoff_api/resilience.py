@@ -0,0 +1,335 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import suppress
+from functools import wraps
+from typing import Any, Awaitable, Callable
+
+from utils.logger import logger
+
+# Порог ошибок подряд, после которого эндпоинт считается недоступным
+BREAKER_FAILURE_THRESHOLD = 5
+# Сколько секунд не ходить в недоступный эндпоинт до пробного запроса
+BREAKER_RESET_SECONDS = 30.0
+# Окно замеров задержки и минимум замеров для хеджирования
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+# Бюджет времени пользовательского запроса по умолчанию
+HANDLER_DEADLINE_SECONDS = 10.0
+# Ушедший в API запрос без ответа дольше этого — ошибка API, а не нашего дедлайна
+RPC_TIMEOUT_SECONDS = 5.0
+
+# Коды gRPC, говорящие о проблеме на стороне API, а не в запросе
+UPSTREAM_FAILURE_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "RESOURCE_EXHAUSTED", "UNKNOWN"}
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("tinkoff_deadline", default=None)
+
+
+class _Attempt:
+    """Один вызов Endpoint.call: момент, когда запрос прошёл квоту и ушёл в API"""
+    __slots__ = ("rpc_started",)
+
+    def __init__(self):
+        self.rpc_started = None
+
+
+_attempt: contextvars.ContextVar[_Attempt | None] = contextvars.ContextVar("tinkoff_attempt", default=None)
+
+
+def mark_rpc_started():
+    """Вызывается tinkoff_client после квоты, непосредственно перед запросом к API"""
+    attempt = _attempt.get()
+    if attempt is not None and attempt.rpc_started is None:
+        attempt.rpc_started = time.monotonic()
+
+
+def _log_orphan(name: str):
+    def callback(task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"{name}: запрос завершился после отмены вызывающего: {task.exception()}")
+    return callback
+
+
+class CircuitOpenError(Exception):
+    """Эндпоинт временно отключён: быстрый отказ вместо ожидания таймаута"""
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Бюджет времени пользовательского запроса исчерпан"""
+
+
+def remaining() -> float | None:
+    """Сколько секунд осталось до дедлайна текущего запроса (None — без дедлайна)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def with_deadline(seconds: float = HANDLER_DEADLINE_SECONDS):
+    """
+    Декоратор Telegram-хендлера: все вызовы API внутри него укладываются
+    в общий бюджет времени. Вложенный дедлайн не может быть позже внешнего.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            deadline = time.monotonic() + seconds
+            outer = _deadline.get()
+            token = _deadline.set(deadline if outer is None else min(outer, deadline))
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _deadline.reset(token)
+        return wrapper
+    return decorator
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    if callable(code):
+        with suppress(Exception):
+            return code().name in UPSTREAM_FAILURE_CODES
+    return False
+
+
+class LatencyTracker:
+    """Скользящее окно задержек эндпоинта"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        if len(self._samples) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def p95(self) -> float | None:
+        return self.percentile(0.95)
+
+
+class CircuitBreaker:
+    """
+    closed -> (N ошибок подряд) -> open -> (reset_timeout) -> half_open.
+    В half_open пропускается один пробный запрос: успех закрывает
+    выключатель, ошибка снова открывает его.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe = False
+
+    def allow(self):
+        if self.state == "open":
+            if self.clock() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"{self.name}: API временно недоступен")
+            self.state = "half_open"
+            self._probe = False
+        if self.state == "half_open":
+            if self._probe:
+                raise CircuitOpenError(f"{self.name}: идёт пробный запрос")
+            self._probe = True
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"Circuit {self.name} closed")
+        self.state = "closed"
+        self.failures = 0
+        self._probe = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"Circuit {self.name} opened after {self.failures} failure(s)")
+            self.state = "open"
+            self.opened_at = self.clock()
+            self._probe = False
+
+    def release_probe(self):
+        """Пробный запрос завершился не ошибкой API (например, ошибкой в запросе)"""
+        self._probe = False
+
+
+class Endpoint:
+    """Выключатель и статистика задержек одного метода API"""
+    _registry: dict = {}
+
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "hedged": 0, "hedge_wins": 0, "fallbacks": 0}
+
+    @classmethod
+    def get(cls, name: str) -> "Endpoint":
+        endpoint = cls._registry.get(name)
+        if endpoint is None:
+            endpoint = cls._registry[name] = cls(name)
+        return endpoint
+
+    async def call(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        hedge: bool = False,
+        fallback: Callable[[], Any] | None = None,
+        cancellable: bool = True
+    ):
+        """
+        Выполняет запрос с учётом выключателя и дедлайна.
+        hedge=True — только для идемпотентных чтений: если первый запрос
+        дольше p95, параллельно уходит второй, берётся первый ответ.
+        cancellable=False — для записей: дедлайн действует только до
+        отправки запроса в API, ушедший запрос дожидается ответа.
+        """
+        try:
+            self.breaker.allow()
+        except CircuitOpenError:
+            self.stats["rejected"] += 1
+            if fallback is not None:
+                self.stats["fallbacks"] += 1
+                return fallback()
+            raise
+
+        self.stats["calls"] += 1
+        started = time.monotonic()
+        attempt = _Attempt()
+        try:
+            timeout = remaining()
+            if timeout is not None and timeout <= 0:
+                raise DeadlineExceeded(f"{self.name}: дедлайн запроса истёк")
+            token = _attempt.set(attempt)
+            try:
+                task = asyncio.ensure_future(self._hedged(factory) if hedge else factory())
+            finally:
+                _attempt.reset(token)
+            result = await self._await(task, timeout, cancellable, attempt)
+        except Exception as e:
+            if self._is_failure(e, attempt):
+                self.stats["failures"] += 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.release_probe()
+            if isinstance(e, asyncio.TimeoutError) and not isinstance(e, DeadlineExceeded):
+                raise DeadlineExceeded(f"{self.name}: нет ответа за отведённое время") from e
+            raise
+        except BaseException:
+            # Отмена (таймаут хендлера, остановка бота) ничего не говорит об API,
+            # но пробный запрос должен освободиться, иначе выключатель не закроется
+            self.breaker.release_probe()
+            raise
+        # Задержка — от отправки в API: ожидание локальной квоты не в счёт
+        self.latency.record(time.monotonic() - (attempt.rpc_started or started))
+        self.breaker.record_success()
+        return result
+
+    async def _await(self, task: asyncio.Future, timeout: float | None, cancellable: bool, attempt: "_Attempt"):
+        def in_flight() -> bool:
+            return not cancellable and attempt.rpc_started is not None
+
+        try:
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+        except asyncio.CancelledError:
+            if in_flight():
+                # Запись уже в API: пусть завершится, ошибка только в лог
+                task.add_done_callback(_log_orphan(self.name))
+            else:
+                task.cancel()
+            raise
+        if done:
+            return task.result()
+        if in_flight():
+            # Состояние ушедшей записи иначе неизвестно — ждём ответ сверх дедлайна
+            return await asyncio.shield(task)
+        task.cancel()
+        with suppress(asyncio.CancelledError, Exception):
+            await task
+        raise DeadlineExceeded(f"{self.name}: нет ответа за отведённое время")
+
+    def _is_failure(self, error: Exception, attempt: "_Attempt") -> bool:
+        """
+        Дедлайн вызывающего — не ошибка API: запрос мог стоять в локальной
+        квоте или получить слишком короткий бюджет. Ошибкой API считается
+        только запрос, который уже ушёл и не ответил за RPC_TIMEOUT_SECONDS.
+        """
+        if isinstance(error, DeadlineExceeded):
+            return (
+                attempt.rpc_started is not None
+                and time.monotonic() - attempt.rpc_started >= RPC_TIMEOUT_SECONDS
+            )
+        return is_upstream_failure(error)
+
+    async def _hedged(self, factory):
+        delay = self.latency.p95()
+        attempt = _attempt.get()
+        first = asyncio.ensure_future(factory())
+        if delay is None:
+            return await first
+        try:
+            # p95 отсчитывается от отправки в API (mark_rpc_started): запрос,
+            # стоящий в локальной квоте, не повод тратить квоту на второй
+            while True:
+                sent = attempt.rpc_started if attempt is not None else None
+                wait = delay if sent is None else sent + delay - time.monotonic()
+                if sent is not None and wait <= 0:
+                    break
+                done, _ = await asyncio.wait({first}, timeout=wait)
+                if done:
+                    return first.result()
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+
+        self.stats["hedged"] += 1
+        second = asyncio.ensure_future(factory())
+        tasks = {first, second}
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+            # Оба запроса упали — отдаём ошибку первого
+            return first.result()
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "state": self.breaker.state, "p95": self.latency.p95()}
+
+
+def resilient(name: str, hedge: bool = False):
+    """Декоратор корутины-запроса к API: выключатель, дедлайн и хеджирование"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await Endpoint.get(name).call(lambda: func(*args, **kwargs), hedge=hedge)
+        return wrapper
+    return decorator
+
+
+def resilience_stats() -> dict:
+    return {name: endpoint.snapshot() for name, endpoint in Endpoint._registry.items()}
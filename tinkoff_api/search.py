@@ -0,0 +1,217 @@
+"""
+Поисковый индекс инструментов: префиксное дерево по тикеру и словам
+названия плюс нечёткий поиск по триграммам.
+
+Все строки приводятся к одному виду: нижний регистр, «ё» -> «е»,
+кириллица транслитерируется в латиницу. Поэтому «сбер», «sber» и «SBER»
+находят одни и те же инструменты.
+"""
+import heapq
+import re
+
+import numpy as np
+
+_TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "i", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "h", "ц": "c", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "",
+    "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+_TRANSLIT_TABLE = str.maketrans(_TRANSLIT)
+_WORD = re.compile(r"[0-9a-z]+")
+
+# При равной релевантности сначала показываем более ходовые типы
+TYPE_PRIORITY = {"share": 0, "etf": 1, "currency": 2, "bond": 3}
+
+
+def normalize(text: str) -> str:
+    return text.lower().translate(_TRANSLIT_TABLE)
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD.findall(normalize(text))
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {' '.join(tokenize(text))} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _TrieNode:
+    __slots__ = ("children", "keys")
+
+    def __init__(self):
+        self.children = {}
+        self.keys = set()
+
+
+class InstrumentSearchIndex:
+    """Индекс по ключу инструмента (FIGI), обновляемый инкрементально"""
+
+    def __init__(self):
+        self._tickers = _TrieNode()
+        self._names = _TrieNode()
+        # Триграмма -> номера инструментов; для нечёткого поиска списки
+        # кэшируются массивами и сбрасываются при изменении триграммы
+        self._trigrams = {}
+        self._posting_arrays = {}
+        self._ids = {}
+        self._keys = []
+        self._free_ids = []
+        # Число триграмм инструмента по номеру: при равной доле короче лучше
+        self._gram_counts = np.zeros(0, dtype=np.int32)
+        self._items = {}
+        self._tokens = {}
+        self._item_trigrams = {}
+        self._static_rank = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def update(self, instruments: dict[str, dict]):
+        """Приводит индекс к новому состоянию каталога, трогая только изменения"""
+        for key in self._items.keys() - instruments.keys():
+            self._remove(key)
+        for key, item in instruments.items():
+            current = self._items.get(key)
+            if current is None or any(current[f] != item[f] for f in ("ticker", "name", "type")):
+                self._remove(key)
+                self._add(key, item)
+            else:
+                self._items[key] = item
+
+    @staticmethod
+    def _insert(root: _TrieNode, token: str, key: str):
+        node = root
+        for char in token:
+            node = node.children.setdefault(char, _TrieNode())
+            node.keys.add(key)
+
+    @staticmethod
+    def _delete(root: _TrieNode, token: str, key: str):
+        node = root
+        path = []
+        for char in token:
+            child = node.children.get(char)
+            if child is None:
+                break
+            child.keys.discard(key)
+            path.append((node, char, child))
+            node = child
+        # Удаляем опустевшие ветви
+        for parent, char, child in reversed(path):
+            if child.keys:
+                break
+            del parent.children[char]
+
+    def _add(self, key: str, item: dict):
+        ticker = normalize(item["ticker"])
+        names = set(tokenize(item["name"]))
+        self._insert(self._tickers, ticker, key)
+        for token in names:
+            self._insert(self._names, token, key)
+
+        grams = trigrams(f"{item['ticker']} {item['name']}")
+        item_id = self._free_ids.pop() if self._free_ids else len(self._keys)
+        if item_id == len(self._keys):
+            self._keys.append(key)
+        else:
+            self._keys[item_id] = key
+        if item_id >= len(self._gram_counts):
+            self._gram_counts = np.resize(self._gram_counts, max(64, 2 * len(self._gram_counts)))
+        self._gram_counts[item_id] = len(grams)
+        self._ids[key] = item_id
+        for gram in grams:
+            self._trigrams.setdefault(gram, set()).add(item_id)
+            self._posting_arrays.pop(gram, None)
+
+        self._items[key] = item
+        self._tokens[key] = (ticker, names)
+        self._item_trigrams[key] = grams
+        # Ранг при равной релевантности: тип инструмента, затем длина названия
+        self._static_rank[key] = TYPE_PRIORITY.get(item["type"], len(TYPE_PRIORITY)) * 1000 + len(item["name"])
+
+    def _remove(self, key: str):
+        if key not in self._items:
+            return
+        ticker, names = self._tokens.pop(key)
+        self._delete(self._tickers, ticker, key)
+        for token in names:
+            self._delete(self._names, token, key)
+
+        item_id = self._ids.pop(key)
+        for gram in self._item_trigrams.pop(key):
+            postings = self._trigrams.get(gram)
+            if postings is not None:
+                postings.discard(item_id)
+                self._posting_arrays.pop(gram, None)
+                if not postings:
+                    del self._trigrams[gram]
+        self._keys[item_id] = None
+        self._free_ids.append(item_id)
+        del self._items[key]
+        del self._static_rank[key]
+
+    @staticmethod
+    def _prefix(root: _TrieNode, prefix: str) -> set[str]:
+        node = root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.keys
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        words = tokenize(query)
+        if not words:
+            return []
+        rank = self._static_rank.__getitem__
+
+        # 1. Тикер: точное совпадение, затем префикс
+        compact = "".join(words)
+        by_ticker = self._prefix(self._tickers, compact)
+        ranked = heapq.nsmallest(
+            limit, by_ticker,
+            key=lambda key: (self._tokens[key][0] != compact, rank(key))
+        )
+
+        # 2. Название: каждое слово запроса — префикс одного из слов названия
+        if len(ranked) < limit:
+            postings = sorted((self._prefix(self._names, word) for word in words), key=len)
+            by_name = postings[0].intersection(*postings[1:]) - by_ticker
+            ranked += heapq.nsmallest(limit - len(ranked), by_name, key=rank)
+
+        # 3. Нечёткий поиск по триграммам — только если точных совпадений нет
+        if not ranked:
+            ranked = self._fuzzy(query, limit)
+        return [self._items[key] for key in ranked]
+
+    def _fuzzy(self, query: str, limit: int, min_score: float = 0.5) -> list[str]:
+        """
+        Доля триграмм запроса, найденных у инструмента; при равенстве — короче лучше.
+
+        Общие триграммы считаются bincount по спискам номеров: у частых слов
+        каталога списки в тысячи инструментов, и подсчёт в Python не
+        укладывается в миллисекунду.
+        """
+        grams = trigrams(query)
+        arrays = [self._posting_array(gram) for gram in grams if gram in self._trigrams]
+        if not arrays:
+            return []
+        hits = np.bincount(np.concatenate(arrays))
+        candidates = np.flatnonzero(hits >= min_score * len(grams))
+        if len(candidates) > limit:
+            # Сначала limit лучших по (доля, длина), затем точная сортировка только их
+            score = self._gram_counts[candidates] - hits[candidates].astype(np.int64) * (1 << 32)
+            candidates = candidates[np.argpartition(score, limit - 1)[:limit]]
+        order = np.lexsort((candidates, self._gram_counts[candidates], -hits[candidates]))
+        return [self._keys[item_id] for item_id in candidates[order]]
+
+    def _posting_array(self, gram: str) -> np.ndarray:
+        array = self._posting_arrays.get(gram)
+        if array is None:
+            postings = self._trigrams[gram]
+            array = np.fromiter(postings, dtype=np.int64, count=len(postings))
+            self._posting_arrays[gram] = array
+        return array
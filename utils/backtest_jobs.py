@@ -0,0 +1,349 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+
+from config import BACKTEST_QUEUE_SIZE, BACKTEST_STATS_LOG_SECONDS, BACKTEST_USER_JOBS, BACKTEST_WORKERS
+from db.backtest_cache import BacktestCache, summarize
+from utils.logger import logger
+
+# Как часто обновлять сообщение о ходе выполнения (лимиты Telegram на правки)
+PROGRESS_EDIT_SECONDS = 5.0
+# Окно замеров ожидания и выполнения для статистики
+LATENCY_WINDOW = 200
+
+
+class JobLimitError(Exception):
+    """Очередь заполнена или у пользователя слишком много задач"""
+
+
+def run_job(strategy_key: str, params: dict, source: tuple) -> tuple[dict, bytes]:
+    """Выполняется в процессе-исполнителе: бэктест и график"""
+    from strategies.registry import make_strategy
+    from utils.charts import plot_equity_curve
+
+    df = load_source(source)
+    strategy = make_strategy(strategy_key, params)
+    results = strategy.backtest(df)
+    buf = plot_equity_curve(results)
+    return summarize(strategy, results), buf.getvalue()
+
+
+def load_source(source: tuple):
+    """
+    Данные задачи в процессе-исполнителе:
+    ("store", figi, interval) | ("mock", rows) | ("frame", DataFrame)
+    """
+    import pandas as pd
+    from db.candle_files import CandleFileStore
+    from utils.mocks import generate_mock_candles
+
+    kind = source[0]
+    if kind == "store":
+        # Процесс сам открывает memmap-файлы: данные не передаются через pickle
+        arrays = CandleFileStore().read(source[1], source[2])
+        return pd.DataFrame({"close": arrays.close}, copy=False)
+    if kind == "mock":
+        return generate_mock_candles(source[1])
+    return source[1]
+
+
+@dataclass(kw_only=True)
+class ComputeJob:
+    """
+    Тяжёлый расчёт в очереди: task(*args) выполняется в процессе-исполнителе
+    (функция модуля и пиклящиеся аргументы), результат отправляет ответом
+    на сообщение задачи on_done(bot, job, result) в event loop.
+    """
+    user_id: int
+    chat_id: int
+    message_id: int
+    title: str
+    label: str
+    task: Callable | None = None
+    args: tuple = ()
+    on_done: Callable[[Any, "ComputeJob", Any], Awaitable] | None = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "queued"  # queued / running / done / failed / cancelled
+    created_at: float = field(default_factory=time.monotonic)
+    started_at: float | None = None
+    # Отмена запущенной задачи: процесс не прервать, статус меняется по его завершении
+    cancel_requested: bool = False
+
+    async def deliver(self, bot, result):
+        await self.on_done(bot, self, result)
+
+
+@dataclass(kw_only=True)
+class BacktestJob(ComputeJob):
+    strategy_key: str
+    params: dict
+    # ("store", figi, interval) | ("mock", rows) | ("frame", DataFrame)
+    source: tuple
+    cache_key: str
+    dataset_id: str
+    dataset_version: str
+    title: str = ""
+
+    def __post_init__(self):
+        self.title = self.title or f"Бэктест {self.strategy_key}"
+        self.task = run_job
+        self.args = (self.strategy_key, self.params, self.source)
+
+    async def deliver(self, bot, result):
+        payload, chart = result
+        await bot.send_photo(
+            chat_id=self.chat_id,
+            photo=chart,
+            caption=f"📈 Результаты бэктеста {self.strategy_key} ({self.label})\n"
+                    f"Доходность: {payload['returns']:.2%}",
+            reply_to_message_id=self.message_id
+        )
+        # Кэш — после отправки: сбой записи не лишает пользователя результата
+        await BacktestCache().put(
+            self.cache_key, self.user_id, self.strategy_key, self.dataset_id, self.dataset_version, payload, chart
+        )
+
+
+def cancel_markup(job_id: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("✖️ Отменить", callback_data=f"btcancel:{job_id}")]])
+
+
+async def enqueue(message, job: ComputeJob) -> bool:
+    """Ставит задачу и показывает её позицию в message; False — отказ по лимиту"""
+    try:
+        position = BacktestJobs().submit(job)
+    except JobLimitError as e:
+        await message.edit_text(f"⚠️ {e}")
+        return False
+    await message.edit_text(
+        f"⏳ {job.title} в очереди: позиция {position} ({job.label})",
+        reply_markup=cancel_markup(job.id)
+    )
+    return True
+
+
+class BacktestJobs:
+    """
+    Очередь бэктестов и других тяжёлых расчётов (оптимизация, walk-forward,
+    корзины) вне event loop.
+
+    Хендлер только ставит задачу и сразу отвечает; задачи выполняются на
+    общем пуле из BACKTEST_WORKERS процессов, по одной на исполнителя, и
+    сами дочерних процессов не заводят. На пользователя — не больше
+    BACKTEST_USER_JOBS задач в очереди и в работе. Ход выполнения и результат отправляются правкой исходного
+    сообщения. Отмена снимает задачу из очереди; у уже запущенной задачи
+    результат отбрасывается, но процесс не прерывается, и до его
+    завершения задача продолжает занимать лимиты.
+
+    Если процесс-исполнитель падает, пул пересоздаётся: ошибкой завершаются
+    только задачи, выполнявшиеся на сломанном пуле, очередь идёт дальше.
+    Статистика пишется в лог раз в BACKTEST_STATS_LOG_SECONDS.
+    """
+    _instance = None
+    _bot = None
+    _pool = None
+    _workers = 0
+    _queue = None
+    _dispatchers: list = []
+    _reporter = None
+    _jobs: OrderedDict = OrderedDict()
+    _stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0, "pool_restarts": 0}
+    _waits = deque(maxlen=LATENCY_WINDOW)
+    _runs = deque(maxlen=LATENCY_WINDOW)
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    async def start(self, bot, workers: int = BACKTEST_WORKERS):
+        if self._pool is not None:
+            return
+        BacktestJobs._bot = bot
+        BacktestJobs._queue = asyncio.Queue()
+        BacktestJobs._workers = workers
+        BacktestJobs._pool = ProcessPoolExecutor(max_workers=workers)
+        BacktestJobs._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(workers)]
+        if BACKTEST_STATS_LOG_SECONDS > 0:
+            BacktestJobs._reporter = asyncio.create_task(self._report())
+        logger.info(f"Backtest jobs: {workers} worker process(es)")
+
+    async def stop(self):
+        dispatchers, BacktestJobs._dispatchers = self._dispatchers, []
+        if self._reporter is not None:
+            dispatchers.append(self._reporter)
+            BacktestJobs._reporter = None
+        for task in dispatchers:
+            task.cancel()
+        for task in dispatchers:
+            with suppress(asyncio.CancelledError):
+                await task
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            BacktestJobs._pool = None
+
+    def submit(self, job: ComputeJob) -> int:
+        """Ставит задачу в очередь; возвращает её позицию (1 — следующая)"""
+        if self._queue is None:
+            raise RuntimeError("BacktestJobs не запущен")
+        active = [j for j in self._jobs.values() if j.user_id == job.user_id and j.status in ("queued", "running")]
+        if len(active) >= BACKTEST_USER_JOBS:
+            self._stats["rejected"] += 1
+            raise JobLimitError(f"Не больше {BACKTEST_USER_JOBS} расчётов одновременно")
+        if self.queue_depth() >= BACKTEST_QUEUE_SIZE:
+            self._stats["rejected"] += 1
+            raise JobLimitError("Очередь расчётов заполнена, попробуйте позже")
+
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        self._stats["submitted"] += 1
+        self._forget_finished()
+        return self.position(job.id)
+
+    def position(self, job_id: str) -> int:
+        queued = [j.id for j in self._jobs.values() if j.status == "queued"]
+        return queued.index(job_id) + 1 if job_id in queued else 0
+
+    def queue_depth(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == "queued")
+
+    async def cancel(self, job_id: str, user_id: int) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id or job.status not in ("queued", "running"):
+            return False
+        if job.status == "queued":
+            job.status = "cancelled"
+            self._stats["cancelled"] += 1
+            await self._edit(job, f"🚫 Отменено: {job.title}")
+            return True
+        # Процесс-исполнитель занят, пока задача не досчитается: до этого она
+        # остаётся «running» и занимает лимит пользователя и слот пула
+        job.cancel_requested = True
+        await self._edit(job, f"🚫 Отменяется: {job.title}, результат не будет отправлен")
+        return True
+
+    def user_jobs(self, user_id: int) -> list[ComputeJob]:
+        return [job for job in self._jobs.values() if job.user_id == user_id and job.status in ("queued", "running")]
+
+    def stats(self) -> dict:
+        def summary(samples):
+            return {
+                "avg": round(sum(samples) / len(samples), 3) if samples else None,
+                "max": round(max(samples), 3) if samples else None,
+            }
+        return {
+            **self._stats,
+            "queued": self.queue_depth(),
+            "running": sum(1 for job in self._jobs.values() if job.status == "running"),
+            "wait": summary(self._waits),
+            "run": summary(self._runs),
+        }
+
+    async def _dispatch(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == "queued":
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Например, не удалось отправить фото — задача не должна занимать лимит пользователя
+                if job.status in ("queued", "running"):
+                    job.status = "failed"
+                    self._stats["failed"] += 1
+                logger.error(f"Backtest job {job.id} dispatch failed: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: ComputeJob):
+        job.status = "running"
+        job.started_at = time.monotonic()
+        self._waits.append(job.started_at - job.created_at)
+        await self._edit(job, f"⚙️ {job.title} выполняется ({job.label})", cancel_markup(job.id))
+
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        try:
+            future = loop.run_in_executor(pool, job.task, *job.args)
+        except BrokenProcessPool:
+            # Пул сломался на чужой задаче и ещё не пересоздан — эта задача не виновата
+            pool = self._restart_pool(pool)
+            future = loop.run_in_executor(pool, job.task, *job.args)
+        error = None
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=PROGRESS_EDIT_SECONDS)
+                if done:
+                    break
+                if job.cancel_requested:
+                    continue
+                elapsed = time.monotonic() - job.started_at
+                await self._edit(
+                    job, f"⚙️ {job.title} выполняется {elapsed:.0f} с ({job.label})",
+                    cancel_markup(job.id)
+                )
+            result = future.result()
+        except BrokenProcessPool as e:
+            # Процесс-исполнитель упал (например, нехватка памяти): без нового
+            # пула ошибкой завершались бы и все следующие задачи
+            error = "процесс расчёта аварийно завершился"
+            logger.error(f"Backtest job {job.id}: worker process died ({e}), restarting pool")
+            self._restart_pool(pool)
+        except Exception as e:
+            error = e
+        finally:
+            self._runs.append(time.monotonic() - job.started_at)
+
+        if job.cancel_requested:
+            job.status = "cancelled"
+            self._stats["cancelled"] += 1
+            await self._edit(job, f"🚫 Отменено: {job.title}")
+            return
+        if error is not None:
+            job.status = "failed"
+            self._stats["failed"] += 1
+            logger.error(f"Backtest job {job.id} failed: {error}")
+            await self._edit(job, f"❌ {job.title}: {error}")
+            return
+        await self._edit(job, f"✅ {job.title}: готово за {time.monotonic() - job.created_at:.1f} с")
+        await job.deliver(self._bot, result)
+        job.status = "done"
+        self._stats["completed"] += 1
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Заменяет сломанный пул новым; пул пересоздаётся один раз на поломку"""
+        if self._pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            BacktestJobs._pool = ProcessPoolExecutor(max_workers=self._workers)
+            self._stats["pool_restarts"] += 1
+        return self._pool
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(BACKTEST_STATS_LOG_SECONDS)
+            logger.info(f"Backtest jobs: {self.stats()}")
+
+    async def _edit(self, job: ComputeJob, text: str, markup=None):
+        try:
+            await self._bot.edit_message_text(
+                text, chat_id=job.chat_id, message_id=job.message_id, reply_markup=markup
+            )
+        except BadRequest as e:
+            # «Message is not modified» и удалённые сообщения — не повод ронять задачу
+            logger.debug(f"Backtest job {job.id}: edit skipped ({e})")
+
+    def _forget_finished(self):
+        """Держим историю завершённых задач ограниченной"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ("queued", "running")]
+        for job_id in finished[:max(0, len(finished) - LATENCY_WINDOW)]:
+            del self._jobs[job_id]
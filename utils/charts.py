@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+
+from config import CHART_CACHE_SIZE, CHART_WORKERS
+from utils.logger import logger
+
+# Размер картинки: 10×6 дюймов при 100 dpi
+CHART_SIZE = (10, 6)
+CHART_DPI = 100
+# Точек линии — примерно по одной на пиксель ширины области графика
+CHART_POINTS = 800
+# Свеча должна быть шире нескольких пикселей, иначе тело не различить
+CANDLE_PIXELS = 5
+# Меняется при изменении оформления — старые PNG в кэше не находятся
+CHART_STYLE_VERSION = 1
+
+# Фигура процесса: создаётся один раз и переиспользуется для всех графиков
+_canvas = {}
+_canvas_lock = threading.Lock()
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Индексы точек, отобранных алгоритмом Largest-Triangle-Three-Buckets.
+
+    Первая и последняя точки сохраняются; из каждой корзины берётся точка,
+    образующая наибольший треугольник с предыдущей выбранной и средним
+    следующей корзины, поэтому пики и провалы кривой не теряются.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.int64), n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        lo, hi, next_hi = edges[bucket], edges[bucket + 1], edges[bucket + 2]
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[bucket + 1] = a
+    return selected
+
+
+def downsample_equity(equity: pd.Series, points: int = CHART_POINTS) -> tuple[np.ndarray, np.ndarray]:
+    """(x, y) кривой капитала не длиннее points точек; NaN отбрасываются"""
+    values = equity.to_numpy(dtype=np.float64)
+    finite = np.flatnonzero(np.isfinite(values))
+    if isinstance(equity.index, pd.DatetimeIndex):
+        # Время в UTC без часового пояса: datetime64 пиклуется и хешируется как массив
+        x = equity.index.tz_convert(None).to_numpy() if equity.index.tz else equity.index.to_numpy()
+        x = x[finite]
+        position = x.astype("datetime64[ns]").astype(np.int64)
+    else:
+        x = finite
+        position = finite
+    keep = lttb(position, values[finite], points)
+    return x[keep], values[finite][keep]
+
+
+def downsample_candles(candles, width: int = CHART_POINTS // CANDLE_PIXELS) -> dict:
+    """
+    OHLC-свечи не длиннее width: соседние свечи объединяются в одну
+    (open первой, close последней, экстремумы high/low группы), так что
+    размах цены на графике сохраняется.
+    """
+    time = np.asarray(candles.time, dtype=np.int64)
+    n = len(time)
+    if n <= width:
+        starts = np.arange(n)
+    else:
+        starts = np.linspace(0, n, width, endpoint=False).astype(np.int64)
+    ends = np.append(starts[1:], n) - 1
+    return {
+        "time": time[starts],
+        "open": np.asarray(candles.open, dtype=np.float64)[starts],
+        "high": np.maximum.reduceat(np.asarray(candles.high, dtype=np.float64), starts) if n else np.empty(0),
+        "low": np.minimum.reduceat(np.asarray(candles.low, dtype=np.float64), starts) if n else np.empty(0),
+        "close": np.asarray(candles.close, dtype=np.float64)[ends],
+    }
+
+
+def _figure():
+    if "figure" not in _canvas:
+        figure = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+        FigureCanvasAgg(figure)
+        _canvas["figure"] = figure
+        _canvas["ax"] = figure.add_subplot()
+    return _canvas["figure"], _canvas["ax"]
+
+
+def _png(figure) -> bytes:
+    buf = io.BytesIO()
+    figure.savefig(buf, format="png", dpi=CHART_DPI)
+    return buf.getvalue()
+
+
+def render_equity(x: np.ndarray, y: np.ndarray, title: str = "Backtest Results") -> bytes:
+    with _canvas_lock:
+        figure, ax = _figure()
+        ax.clear()
+        ax.plot(x, y, label="Equity")
+        ax.set_title(title)
+        ax.set_xlabel("Period")
+        ax.set_ylabel("Value")
+        ax.legend()
+        ax.grid(True)
+        return _png(figure)
+
+
+def render_candles(candles: dict, title: str) -> bytes:
+    """Свечной график: тени — LineCollection, тела — PolyCollection (по одному объекту на график)"""
+    with _canvas_lock:
+        figure, ax = _figure()
+        ax.clear()
+        n = len(candles["time"])
+        x = np.arange(n, dtype=np.float64)
+        up = candles["close"] >= candles["open"]
+        colors = np.where(up, "tab:green", "tab:red")
+
+        wicks = np.stack([np.column_stack([x, candles["low"]]), np.column_stack([x, candles["high"]])], axis=1)
+        ax.add_collection(LineCollection(wicks, colors=colors, linewidths=0.8))
+        bottom = np.minimum(candles["open"], candles["close"])
+        top = np.maximum(candles["open"], candles["close"])
+        left, right = x - 0.35, x + 0.35
+        bodies = np.stack([
+            np.column_stack([left, bottom]), np.column_stack([left, top]),
+            np.column_stack([right, top]), np.column_stack([right, bottom]),
+        ], axis=1)
+        ax.add_collection(PolyCollection(bodies, facecolors=colors, edgecolors=colors, linewidths=0.5))
+
+        if n:
+            ax.set_xlim(-1, n)
+            low, high = candles["low"].min(), candles["high"].max()
+            pad = (high - low) * 0.05 or 1.0
+            ax.set_ylim(low - pad, high + pad)
+            ticks = np.linspace(0, n - 1, min(n, 6)).astype(np.int64)
+            labels = pd.to_datetime(candles["time"][ticks], unit="s", utc=True).strftime("%d.%m %H:%M")
+            ax.set_xticks(ticks, labels)
+        ax.set_title(title)
+        ax.set_ylabel("Price")
+        ax.grid(True)
+        return _png(figure)
+
+
+def _warm_up():
+    """Инициализатор процесса-рендерера: фигура, шрифты и PNG-кодек загружаются заранее"""
+    render_equity(np.arange(3), np.ones(3))
+
+
+def _digest(kind: str, title: str, *arrays: np.ndarray) -> str:
+    digest = hashlib.sha256(f"{kind}:{CHART_STYLE_VERSION}:{title}".encode())
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class ChartRenderer:
+    """
+    Сервис отрисовки графиков.
+
+    Ряды прореживаются до ширины картинки (LTTB для линий, объединение
+    свечей для OHLC), готовые PNG кэшируются по хешу прореженных данных —
+    одинаковый график повторно не рисуется. После start() отрисовка идёт
+    в заранее прогретых процессах, иначе — в потоке текущего процесса.
+    """
+    _instance = None
+    _pool = None
+    _cache: OrderedDict = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {"hits": 0, "renders": 0}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def start(self, workers: int = CHART_WORKERS):
+        if self._pool is not None or workers <= 0:
+            return
+        ChartRenderer._pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up)
+        # Процессы стартуют сразу, а не при первом графике
+        for _ in range(workers):
+            self._pool.submit(int)
+        logger.info(f"Chart renderer: {workers} worker process(es)")
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            ChartRenderer._pool = None
+
+    def stats(self) -> dict:
+        return {**self._stats, "entries": len(self._cache)}
+
+    def equity_png(self, equity: pd.Series, title: str = "Backtest Results") -> bytes:
+        """Синхронная отрисовка в текущем процессе (для процессов-исполнителей)"""
+        x, y = downsample_equity(equity)
+        key = _digest("equity", title, x, y)
+        return self._cached(key) or self._remember(key, render_equity(x, y, title))
+
+    def candles_png(self, candles, title: str) -> bytes:
+        data = downsample_candles(candles)
+        key = _digest("candles", title, *data.values())
+        return self._cached(key) or self._remember(key, render_candles(data, title))
+
+    async def equity(self, equity: pd.Series, title: str = "Backtest Results") -> bytes:
+        x, y = downsample_equity(equity)
+        key = _digest("equity", title, x, y)
+        return self._cached(key) or self._remember(key, await self._render(render_equity, x, y, title))
+
+    async def candles(self, candles, title: str) -> bytes:
+        data = downsample_candles(candles)
+        key = _digest("candles", title, *data.values())
+        return self._cached(key) or self._remember(key, await self._render(render_candles, data, title))
+
+    async def _render(self, render, *args) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, render, *args)
+
+    def _cached(self, key: str) -> bytes | None:
+        with self._lock:
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+            return png
+
+    def _remember(self, key: str, png: bytes) -> bytes:
+        with self._lock:
+            self._stats["renders"] += 1
+            self._cache[key] = png
+            self._cache.move_to_end(key)
+            while len(self._cache) > CHART_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return png
+
+
+def plot_equity_curve(results):
+    """Синхронная функция построения графика"""
+    return io.BytesIO(ChartRenderer().equity_png(results['equity_curve']))
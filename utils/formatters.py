@@ -105,6 +105,32 @@ def format_orders(active_orders: list, executed_orders: list) -> str:
     text += "\n🔍 Используйте: /orders"
     return text
 
+def format_tracked_orders(active_orders: list, executed_orders: list) -> str:
+    """Форматирование заявок из локальной таблицы broker_orders"""
+    text = "🧾 *Ваши ордера*\n\n"
+
+    if active_orders:
+        text += "🔄 *Активные заявки:*\n"
+        for order in active_orders:
+            direction = "📤 Покупка" if order.direction == "BUY" else "📥 Продажа"
+            status = "⏳ В ожидании" if order.status == "NEW" else f"🟡 Исполнено {order.lots_executed}/{order.lots_requested}"
+            price = f" по {order.price:,.2f} ₽" if order.price else ""
+            text += f"{direction} {order.lots_requested} шт {order.figi}{price} — {status}\n"
+        text += "\n"
+
+    if executed_orders:
+        text += "✅ *Завершённые сделки:*\n"
+        for order in executed_orders[:5]:  # Последние 5
+            direction = "📤 Покупка" if order.direction == "BUY" else "📥 Продажа"
+            price = f" по {order.price:,.2f} ₽" if order.price else ""
+            text += f"{direction} {order.lots_executed} шт {order.figi}{price} — Исполнен ✅\n"
+
+    if not active_orders and not executed_orders:
+        text += "У вас пока нет активных или завершённых ордеров.\n"
+
+    text += "\n🔍 Используйте: /orders"
+    return text
+
 def format_strategy_params(params: dict) -> str:
     """Форматирование параметров стратегии"""
     return "\n".join([f"{k}: {v}" for k, v in params.items()])
@@ -0,0 +1,76 @@
+import asyncio
+from enum import Enum
+from functools import wraps
+from typing import Any, Awaitable, Callable, Hashable
+
+from utils.logger import logger
+
+
+def make_key(*args, **kwargs) -> tuple:
+    """Нормализованный ключ вызова: регистр строк и порядок kwargs не важны"""
+    def normalize(value):
+        if isinstance(value, Enum):
+            return value.value
+        if isinstance(value, str):
+            return value.upper()
+        return value
+    return tuple(map(normalize, args)) + tuple(sorted((k, normalize(v)) for k, v in kwargs.items()))
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых одновременных запросов в рамках одного event loop.
+
+    Первый вызов с ключом запускает работу отдельной задачей, остальные
+    ждут её же результат. Результат и исключение получают все ожидающие;
+    отмена одного из них не отменяет общую задачу.
+    """
+    _registry: dict = {}
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        SingleFlight._registry[name] = self
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Забираем исключение, чтобы не было предупреждений, если все ожидающие отменены
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"singleflight {self.name}: {task.exception()!r}")
+
+    def stats(self) -> dict:
+        coalesced = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": coalesced,
+            "ratio": coalesced / self.calls if self.calls else 0.0,
+            "inflight": len(self._inflight),
+        }
+
+
+def coalesce(flight: SingleFlight, key: Callable[..., Hashable] = make_key):
+    """Декоратор корутины: одинаковые одновременные вызовы выполняются один раз"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await flight.do(key(*args, **kwargs), lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def singleflight_stats() -> dict:
+    return {name: flight.stats() for name, flight in SingleFlight._registry.items()}